@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark de bout en bout des commandes ci_test sur des projets synthétiques
+
+Génère des projets C (Makefile avec NAME, tests Criterion) de --units unités de
+compilation et de --commits commits d'historique, publiés dans un dépôt bare local,
+puis enchaîne le workflow push, update dev, finish (issue puis module) et release.
+Chaque commande est lancée avec --profile dans un processus séparé: la durée de
+chaque phase et le pic de mémoire (RSS) sont enregistrés dans --output pour
+comparer deux versions de ci_test (--compare).
+
+Par défaut, la vérification est remplacée par un runner factice (pas de Docker):
+seul le coût côté git (archive, rebase, push...) est mesuré. --runner docker utilise
+le runner configuré normalement.
+
+Usage: python3 benchmarks/end_to_end.py [--units 10,500,5000] [--commits 1,10000,100000]
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+from ci_test.utils import docker_utils  # noqa: E402
+
+# Nombre maximal de tests Criterion générés, quel que soit le nombre d'unités
+MAX_TESTS = 200
+
+# Unités par sous-répertoire de src/: chaque commit ne réécrit que de petits arbres
+UNITS_PER_DIR = 100
+
+BENCH_ENV = {
+    "GIT_AUTHOR_NAME": "Bench",
+    "GIT_AUTHOR_EMAIL": "bench@example.com",
+    "GIT_COMMITTER_NAME": "Bench",
+    "GIT_COMMITTER_EMAIL": "bench@example.com",
+    "GIT_CONFIG_NOSYSTEM": "1",
+}
+
+MAKEFILE = """NAME = bench
+
+SRC = $(wildcard src/*.c src/*/*.c)
+OBJ = $(SRC:.c=.o)
+TESTS_SRC = $(wildcard tests/*.c) $(filter-out src/main.c, $(SRC))
+
+CFLAGS = -Wall -Wextra -Iinclude
+
+all: $(NAME)
+
+$(NAME): $(OBJ)
+\t$(CC) -o $(NAME) $(OBJ)
+
+clean:
+\trm -f $(OBJ)
+
+fclean: clean
+\trm -f $(NAME) unit_tests
+
+re: fclean all
+
+unit_tests:
+\t$(CC) $(CFLAGS) -o unit_tests $(TESTS_SRC) -lcriterion
+
+tests_run: unit_tests
+\t./unit_tests
+
+.PHONY: all clean fclean re tests_run unit_tests
+"""
+
+def unit_path(index):
+    """Chemin du fichier source d'une unité."""
+    return f"src/{index // UNITS_PER_DIR:03d}/unit_{index}.c"
+
+def unit_source(index, revision=0):
+    """Source d'une unité de compilation."""
+    return (f"#include \"bench.h\"\n\n/* revision {revision} */\n"
+            f"int unit_{index}(int value)\n{{\n    return value + {index};\n}}\n")
+
+def project_files(units):
+    """Fichiers initiaux du projet: {chemin: contenu}."""
+    files = {"Makefile": MAKEFILE}
+    files["include/bench.h"] = "#ifndef BENCH_H\n#define BENCH_H\n\n" + "".join(
+        f"int unit_{i}(int value);\n" for i in range(units)) + "\n#endif\n"
+    files["src/main.c"] = "#include \"bench.h\"\n\nint main(void)\n{\n    return unit_0(0);\n}\n"
+    for i in range(units):
+        files[unit_path(i)] = unit_source(i)
+    files["tests/test_units.c"] = "#include <criterion/criterion.h>\n#include \"bench.h\"\n\n" + "".join(
+        f"Test(units, unit_{i})\n{{\n    cr_assert_eq(unit_{i}(1), {i + 1});\n}}\n\n"
+        for i in range(min(units, MAX_TESTS)))
+    return files
+
+def generate_remote(path, units, commits):
+    """Crée le dépôt bare: `commits` commits sur main (chacun modifie une unité), dev au même point."""
+    subprocess.run(['git', 'init', '-q', '--bare', path], check=True)
+    subprocess.run(['git', 'symbolic-ref', 'HEAD', 'refs/heads/main'], cwd=path, check=True)
+    importer = subprocess.Popen(['git', 'fast-import', '--quiet'], stdin=subprocess.PIPE, cwd=path)
+    write = importer.stdin.write
+
+    def write_data(content):
+        data = content.encode()
+        write(f"data {len(data)}\n".encode() + data + b"\n")
+
+    for i in range(1, commits + 1):
+        write(b"commit refs/heads/main\n")
+        write(f"mark :{i}\n".encode())
+        write(f"committer Bench <bench@example.com> {1500000000 + i} +0000\n".encode())
+        write_data(f"Commit {i}\n")
+        if i == 1:
+            for name, content in sorted(project_files(units).items()):
+                write(f"M 100644 inline {name}\n".encode())
+                write_data(content)
+        else:
+            write(f"from :{i - 1}\n".encode())
+            write(f"M 100644 inline {unit_path(i % units)}\n".encode())
+            write_data(unit_source(i % units, i))
+        write(b"\n")
+    write(f"reset refs/heads/dev\nfrom :{commits}\n\n".encode())
+    importer.stdin.close()
+    if importer.wait() != 0:
+        raise RuntimeError("git fast-import a échoué")
+
+def git(cwd, env, *args):
+    """Commande git de préparation (non mesurée)."""
+    subprocess.run(['git'] + list(args), cwd=cwd, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def edit_and_commit(cwd, env, path, message):
+    """Modifie un fichier du projet et crée un commit."""
+    with open(os.path.join(cwd, path), 'a') as f:
+        f.write(f"/* {message} */\n")
+    git(cwd, env, 'commit', '-q', '-am', message)
+
+def run_step(workdir, env, tmp, name, command, fake_delay, verbose):
+    """Lance une commande ci_test profilée. Retourne (code, durée, phases, RSS max en Ko)."""
+    trace_path = os.path.join(tmp, f"{name}.trace.json")
+    rusage_path = os.path.join(tmp, f"{name}.rusage.json")
+    cmd = [
+        sys.executable, os.path.abspath(__file__), '--child',
+        '--trace', trace_path, '--rusage', rusage_path, '--fake-delay', str(fake_delay),
+        '--',
+    ] + command
+    start = time.perf_counter()
+    result = subprocess.run(
+        cmd,
+        cwd=workdir,
+        env=env,
+        # Accepter le force push proposé après un rebase (update)
+        input="y\n" * 8,
+        stdout=None if verbose else subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        universal_newlines=True
+    )
+    elapsed = time.perf_counter() - start
+    if result.returncode != 0 and not verbose:
+        print(result.stdout)
+
+    phases = {}
+    try:
+        with open(trace_path) as f:
+            for event in json.load(f)["traceEvents"]:
+                if event.get("ph") == "X":
+                    phases[event["name"]] = phases.get(event["name"], 0.0) + event["dur"] / 1000.0
+    except (OSError, ValueError, KeyError):
+        pass
+    try:
+        with open(rusage_path) as f:
+            peak_rss = max(json.load(f).values())
+    except (OSError, ValueError):
+        peak_rss = None
+    return result.returncode, elapsed, phases, peak_rss
+
+def run_scenario(units, commits, args):
+    """Enchaîne le workflow complet sur un projet. Retourne la liste des mesures."""
+    measures = []
+    with tempfile.TemporaryDirectory(prefix="ci_test_bench_") as tmp:
+        remote = os.path.join(tmp, "project.git")
+        generate_remote(remote, units, commits)
+
+        home = os.path.join(tmp, "home")
+        os.makedirs(os.path.join(home, ".ci_test"))
+        with open(os.path.join(home, ".ci_test", "config.json"), 'w') as f:
+            json.dump({
+                "runner": "fake" if args.runner == "fake" else args.runner_setting,
+                "verify_cache": False,
+                "delete_merged_branches": True,
+            }, f)
+        env = dict(os.environ, HOME=home, PYTHONPATH=ROOT_DIR, **BENCH_ENV)
+
+        workdir = os.path.join(tmp, "project")
+        git(tmp, env, 'clone', '-q', remote, workdir)
+        git(workdir, env, 'checkout', '-q', 'dev')
+
+        def step(name, command):
+            code, elapsed, phases, peak_rss = run_step(workdir, env, tmp, name, command,
+                                                       args.fake_delay, args.verbose)
+            measures.append({
+                "units": units, "commits": commits, "step": name, "code": code,
+                "seconds": elapsed, "peak_rss_kb": peak_rss, "phases": phases,
+            })
+            status = "ok" if code == 0 else f"échec ({code})"
+            rss = f"{peak_rss / 1024:.0f}" if peak_rss else "?"
+            print(f"{units:>6} {commits:>8}  {name:<16} {elapsed * 1000:>10.0f} {rss:>9}  {status}", flush=True)
+            return code == 0
+
+        if not (step("mod", ['mod', 'bench']) and step("iss", ['iss', 'fix'])):
+            return measures
+        edit_and_commit(workdir, env, unit_path(0), "fix")
+        if not step("push", ['push']):
+            return measures
+
+        # dev avance pendant le travail sur l'issue
+        git(workdir, env, 'checkout', '-q', 'dev')
+        edit_and_commit(workdir, env, unit_path(units - 1), "dev")
+        git(workdir, env, 'push', '-q', 'origin', 'dev')
+        git(workdir, env, 'checkout', '-q', 'mod/bench/fix')
+        if not (step("update-dev", ['update', 'dev']) and step("finish-issue", ['finish'])
+                and step("finish-module", ['finish'])):
+            return measures
+
+        # Fusion de la PR du module dans dev
+        git(workdir, env, 'checkout', '-q', 'dev')
+        git(workdir, env, 'merge', '-q', '--ff-only', 'mod/bench/main')
+        git(workdir, env, 'push', '-q', 'origin', 'dev')
+        step("release", ['release'])
+    return measures
+
+def fake_runner(delay):
+    """Runner factice: consomme l'archive et rapporte le succès de chaque étape demandée."""
+    def run(archive, type, entrypoint_options, echo=False, heartbeat_label=None):
+        for _ in docker_utils.iter_archive_chunks(archive):
+            pass
+        time.sleep(delay)
+        stages = ['build', 'tests'] if type == 'all' else [type]
+        logs = []
+        for stage in stages:
+            logs.append(f"{docker_utils.MARKER_PREFIX}stage-begin {stage}")
+            logs.append(f"{docker_utils.MARKER_PREFIX}stage-end {stage} ok")
+        return True, "\n".join(logs)
+    return run
+
+def run_child(args):
+    """Exécute une commande ci_test profilée (processus lancé par run_step)."""
+    from ci_test import cli
+    docker_utils.register_runner("fake", fake_runner(args.fake_delay))
+    command = args.command[1:] if args.command[:1] == ['--'] else args.command
+    sys.argv = ['ci_test', '--profile-output', args.trace] + command
+    try:
+        return cli.main()
+    finally:
+        with open(args.rusage, 'w') as f:
+            json.dump({
+                "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+            }, f)
+
+def get_version():
+    """Commit de ci_test mesuré."""
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], cwd=ROOT_DIR, check=True,
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                              universal_newlines=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "inconnue"
+
+def compare(measures, reference_path):
+    """Affiche l'évolution de la durée de chaque étape par rapport à un fichier de résultats."""
+    with open(reference_path) as f:
+        reference = json.load(f)
+    previous = {(m["units"], m["commits"], m["step"]): m for m in reference["measures"]}
+    print(f"\nComparaison avec {reference.get('version', '?')}:")
+    print(f"{'unités':>6} {'commits':>8}  {'étape':<16} {'avant (ms)':>10} {'après (ms)':>10} {'ratio':>6}")
+    for m in measures:
+        old = previous.get((m["units"], m["commits"], m["step"]))
+        if old is None or not old["seconds"]:
+            continue
+        print(f"{m['units']:>6} {m['commits']:>8}  {m['step']:<16} {old['seconds'] * 1000:>10.0f} "
+              f"{m['seconds'] * 1000:>10.0f} {m['seconds'] / old['seconds']:>6.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de bout en bout de ci_test")
+    parser.add_argument('--units', default="10,500,5000",
+                        help="Nombres d'unités de compilation, séparés par des virgules")
+    parser.add_argument('--commits', default="1,10000,100000",
+                        help="Tailles d'historique (nombre de commits), séparées par des virgules")
+    parser.add_argument('--runner', choices=['fake', 'docker'], default='fake',
+                        help="fake: vérification simulée sans Docker | docker: runner configuré")
+    parser.add_argument('--runner-setting', default='cold',
+                        help="Valeur du paramètre runner avec --runner docker (cold ou warm)")
+    parser.add_argument('--fake-delay', type=float, default=0.0,
+                        help="Durée simulée (en secondes) de chaque vérification du runner factice")
+    parser.add_argument('--output', default=None, help="Fichier JSON des résultats")
+    parser.add_argument('--compare', default=None, metavar='FICHIER',
+                        help="Résultats d'une version précédente (--output) à comparer")
+    parser.add_argument('--verbose', action='store_true', help="Affiche la sortie des commandes")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--trace', help=argparse.SUPPRESS)
+    parser.add_argument('--rusage', help=argparse.SUPPRESS)
+    parser.add_argument('command', nargs=argparse.REMAINDER, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        return run_child(args)
+
+    if shutil.which('git') is None:
+        print("🚨  git est introuvable")
+        return 1
+
+    print(f"{'unités':>6} {'commits':>8}  {'étape':<16} {'durée (ms)':>10} {'RSS (Mo)':>9}  statut")
+    measures = []
+    for units in (int(value) for value in args.units.split(',')):
+        for commits in (int(value) for value in args.commits.split(',')):
+            measures.extend(run_scenario(units, commits, args))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"version": get_version(), "runner": args.runner, "measures": measures}, f, indent=2)
+    if args.compare:
+        compare(measures, args.compare)
+    return 0 if all(m["code"] == 0 for m in measures) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+
+"""
+Benchmark de la détermination de la version de release
+
+Génère des historiques synthétiques (git fast-import) de tailles croissantes, avec
+--releases releases taguées réparties sur l'historique, puis compare:
+- l'ancien parcours (git log --oneline complet + regex sur chaque ligne)
+- la résolution par les tags (version_utils.get_next_version)
+
+Usage: python3 benchmarks/release_version.py [--sizes 1000,10000,100000,500000]
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ci_test.utils import version_utils  # noqa: E402
+
+def generate_history(path, commits, release_every):
+    """Crée un dépôt dont main contient `commits` commits vides et des tags de release."""
+    subprocess.run(['git', 'init', '-q', '--bare', path], check=True)
+    importer = subprocess.Popen(['git', 'fast-import', '--quiet'], stdin=subprocess.PIPE, cwd=path)
+    write = importer.stdin.write
+    release = 0
+    for i in range(1, commits + 1):
+        if i % release_every == 0:
+            release += 1
+            message = f"Release {release}.0 - snapshot of dev\n".encode()
+        else:
+            message = f"Commit {i}\n".encode()
+        write(b"commit refs/heads/main\n")
+        write(f"mark :{i}\n".encode())
+        write(f"committer Bench <bench@example.com> {1500000000 + i} +0000\n".encode())
+        write(f"data {len(message)}\n".encode() + message)
+        if i > 1:
+            write(f"from :{i - 1}\n".encode())
+        write(b"\n")
+        if i % release_every == 0:
+            tag_message = f"Release {release}.0\n".encode()
+            write(f"tag {release}.0\nfrom :{i}\n".encode())
+            write(f"tagger Bench <bench@example.com> {1500000000 + i} +0000\n".encode())
+            write(f"data {len(tag_message)}\n".encode() + tag_message + b"\n")
+    importer.stdin.close()
+    if importer.wait() != 0:
+        raise RuntimeError("git fast-import a échoué")
+    return release
+
+def legacy_next_version():
+    """Ancienne implémentation: historique complet puis regex en Python."""
+    result = subprocess.run(
+        ['git', 'log', '--oneline', 'main'],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        check=True,
+        universal_newlines=True
+    )
+    for line in result.stdout.split('\n'):
+        match = re.search(r"Release (\d+)\.0 - snapshot of dev", line)
+        if match:
+            return f"{int(match.group(1)) + 1}.0"
+    return "1.0"
+
+def measure(function, repeat):
+    """Meilleur temps (en secondes) sur `repeat` exécutions, et le résultat."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, value
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de la détermination de version")
+    parser.add_argument('--sizes', default="1000,10000,100000,500000",
+                        help="Tailles d'historique (nombre de commits), séparées par des virgules")
+    parser.add_argument('--releases', type=int, default=100,
+                        help="Nombre de releases taguées, identique pour chaque taille")
+    parser.add_argument('--repeat', type=int, default=5, help="Répétitions par mesure")
+    args = parser.parse_args()
+
+    print(f"{'commits':>10} {'tags':>6} {'git log (ms)':>14} {'tags (ms)':>10}")
+    orig_dir = os.getcwd()
+    for size in (int(value) for value in args.sizes.split(',')):
+        with tempfile.TemporaryDirectory() as tmp:
+            repo = os.path.join(tmp, "repo.git")
+            releases = generate_history(repo, size, max(1, size // args.releases))
+            os.chdir(repo)
+            try:
+                legacy_time, legacy_version = measure(legacy_next_version, args.repeat)
+                tags_time, tags_version = measure(lambda: version_utils.get_next_version('main'), args.repeat)
+            finally:
+                os.chdir(orig_dir)
+            if legacy_version != tags_version:
+                print(f"🚨  Versions différentes: {legacy_version} != {tags_version}")
+                return 1
+            print(f"{size:>10} {releases:>6} {legacy_time * 1000:>14.1f} {tags_time * 1000:>10.1f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
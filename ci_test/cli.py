@@ -7,7 +7,8 @@ Interface CLI principale pour ci_test
 import argparse
 import os
 import sys
-from ci_test.commands import push, clone_init, module, issue, finish, config, release, update
+from ci_test.commands import push, clone_init, module, issue, finish, config, release, update, cache, pool, image, verify, bisect
+from ci_test.utils import ssh_utils, trace_utils
 
 
 def main():
@@ -16,14 +17,40 @@ def main():
         description='Utilitaire CI pour projets C/C++',
         prog='ci_test'
     )
+    parser.add_argument('--profile', action='store_true',
+                        help='Mesure la durée de chaque phase: résumé dans le terminal et trace Chrome '
+                             '(par défaut dans ~/.ci_test/traces/)')
+    parser.add_argument('--profile-output', default=None, metavar='FICHIER',
+                        help='Fichier de la trace Chrome (implique --profile)')
     subparsers = parser.add_subparsers(dest='command', help='Commandes disponibles')
 
     # Configuration du parseur pour la commande push
     push_parser = subparsers.add_parser('push', help='Vérifie la compilation et pousse le commit')
     push_parser.add_argument('--debug', action='store_true', help='Mode debug avec logs détaillés')
     push_parser.add_argument('--force', action='store_true', help='Ne lance pas les vérifications dans Docker')
+    push_parser.add_argument('--all-tests', action='store_true',
+                             help='Exécute tous les tests, même avec l\'analyse d\'impact (test_impact) ou un arbre déjà vérifié')
     push_parser.set_defaults(func=push.execute)
 
+    # Configuration du parseur pour la commande verify
+    verify_parser = subparsers.add_parser('verify', help='Vérifie chaque commit d\'une plage (ex: dev..HEAD)')
+    verify_parser.add_argument('range', help='Plage de commits à vérifier (syntaxe git, ex: origin/dev..HEAD)')
+    verify_parser.add_argument('--jobs', '-j', type=int, default=None,
+                               help='Nombre de vérifications simultanées (par défaut: verify_jobs)')
+    verify_parser.add_argument('--debug', action='store_true', help='Affiche les logs des commits en échec')
+    verify_parser.set_defaults(func=verify.execute)
+
+    # Configuration du parseur pour la commande bisect-failure
+    bisect_parser = subparsers.add_parser('bisect-failure',
+                                          help='Cherche le premier commit en échec depuis le dernier rebase')
+    bisect_parser.add_argument('--good', default=None,
+                               help='Dernier commit valide (par défaut: base de la branche avant le rebase, via ORIG_HEAD)')
+    bisect_parser.add_argument('--bad', default='HEAD', help='Commit en échec (par défaut: HEAD)')
+    bisect_parser.add_argument('--jobs', '-j', type=int, default=None,
+                               help='Commits vérifiés en parallèle à chaque tour (par défaut: verify_jobs)')
+    bisect_parser.add_argument('--debug', action='store_true', help='Mode debug avec logs détaillés')
+    bisect_parser.set_defaults(func=bisect.execute)
+
     # Configuration du parseur pour la commande clone/init
     clone_parser = subparsers.add_parser('clone', help='Clone le dépôt et initialise le projet')
     clone_parser.add_argument('url', help='URL du dépôt à cloner')
@@ -53,6 +80,8 @@ def main():
     config_group = config_parser.add_mutually_exclusive_group(required=True)
     config_group.add_argument('--delete', type=str, choices=['true', 'false'],
                              help='Active/désactive la suppression automatique des branches mergées')
+    config_group.add_argument('--set', type=str, metavar='CLE=VALEUR',
+                             help='Définit une valeur de configuration (ex: --set verify_cache=false)')
     config_group.add_argument('--list', action='store_true',
                              help='Affiche la configuration actuelle')
     config_parser.set_defaults(func=config.execute)
@@ -68,6 +97,24 @@ def main():
     update_parser.add_argument('--force', action='store_true', help='Ne lance pas les vérifications dans Docker')
     update_parser.set_defaults(func=update.execute)
 
+    # Configuration du parseur pour la commande cache
+    cache_parser = subparsers.add_parser('cache', help='Gère le cache des vérifications de build')
+    cache_parser.add_argument('action', choices=['stats', 'clear'],
+                              help='stats: affiche le taux de hit | clear: vide le cache')
+    cache_parser.set_defaults(func=cache.execute)
+
+    # Configuration du parseur pour la commande pool
+    pool_parser = subparsers.add_parser('pool', help='Gère le pool de conteneurs chauds')
+    pool_parser.add_argument('action', choices=['status', 'stop'],
+                             help='status: liste les conteneurs | stop: arrête les conteneurs')
+    pool_parser.set_defaults(func=pool.execute)
+
+    # Configuration du parseur pour la commande image
+    image_parser = subparsers.add_parser('image', help='Gère l\'image Docker ci_image')
+    image_parser.add_argument('action', choices=['status', 'build'],
+                              help='status: affiche l\'état de l\'image | build: reconstruit l\'image si nécessaire')
+    image_parser.set_defaults(func=image.execute)
+
     args = parser.parse_args()
 
 
@@ -79,7 +126,25 @@ def main():
         print(f"🚨  Erreur: La commande {args.command} n'est pas encore implémentée")
         return 1
 
-    return args.func(args)
+    if args.command in ssh_utils.REMOTE_COMMANDS:
+        # La connexion au remote s'établit pendant que la commande démarre
+        ssh_utils.start(getattr(args, 'url', None))
+
+    if not (args.profile or args.profile_output):
+        return args.func(args)
+
+    trace_utils.enable()
+    try:
+        with trace_utils.span(f"ci_test {args.command}"):
+            return args.func(args)
+    finally:
+        trace_path = args.profile_output or trace_utils.get_default_path(args.command)
+        trace_utils.print_summary()
+        try:
+            trace_utils.write_trace(trace_path)
+            print(f"📄  Trace: {trace_path} (chrome://tracing ou https://ui.perfetto.dev)")
+        except OSError as e:
+            print(f"⚠️   Warn: Impossible d'écrire la trace {trace_path}: {e}")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+
+"""
+Implémentation de la commande bisect-failure pour ci_test
+"""
+
+from ci_test.commands import push, verify
+from ci_test.utils import git_utils
+
+# Suggestion affichée lorsque la vérification échoue juste après un rebase
+HINT = "📝  Pour trouver le commit fautif parmi ceux intégrés par le rebase: ci_test bisect-failure"
+
+def execute(args):
+    """Exécute la commande bisect-failure."""
+    bad = git_utils.resolve_commit(args.bad)
+    if bad is None:
+        print(f"🚨  Erreur: Révision invalide ({args.bad})")
+        return 1
+    good = find_good_commit(args.good, bad)
+    if good is None:
+        print("🚨  Erreur: Impossible de déterminer le dernier commit valide")
+        print("📝  Après un rebase, ORIG_HEAD désigne l'ancienne branche; sinon précisez --good <révision>")
+        return 1
+
+    commits, error = git_utils.list_commits(f"{good}..{bad}")
+    if commits is None:
+        print(f"🚨  Erreur: Impossible de lister les commits\n{error}")
+        return 1
+    if not commits:
+        print(f"ℹ️  Aucun commit entre {good[:12]} et {bad[:12]}")
+        return 0
+
+    ways = verify.get_jobs(args)
+    print(f"🔍  Recherche du premier commit en échec parmi {len(commits)} commit(s) "
+          f"({good[:12]}..{bad[:12]}, {ways} vérification(s) par tour)...")
+    culprit, results = bisect(args, good, commits, ways)
+    if culprit is None:
+        return 0 if results is not None else 1
+
+    sha, tree, subject = culprit
+    status, logs = results[tree]
+    print(f"\n🎯  Premier commit en échec ({status}): {sha[:12]} {subject}")
+    push.report_verification(args, False, logs)
+    return 1
+
+def find_good_commit(good, bad):
+    """Dernier commit supposé valide: --good, sinon la base de la branche avant le dernier rebase."""
+    if good:
+        return git_utils.resolve_commit(good)
+    orig_head = git_utils.resolve_commit('ORIG_HEAD')
+    if orig_head is None or orig_head == bad:
+        return None
+    return git_utils.get_merge_base(orig_head, bad)
+
+def bisect(args, good, commits, ways):
+    """Recherche k-aire: chaque tour vérifie jusqu'à `ways` commits en parallèle.
+
+    Le premier tour vérifie aussi les deux extrémités (commit en échec et base valide).
+    Retourne (premier commit en échec, résultats par arbre), ou (None, résultats) si rien
+    n'est à chercher, (None, None) en cas d'erreur.
+    """
+    results = {}
+    good_commit = (good, git_utils.get_tree_hash(good), "base")
+    low, high = -1, len(commits) - 1
+    candidates = [commits[high], good_commit] + [commits[i] for i in pick_midpoints(low, high, ways)]
+    first_round = True
+    while True:
+        unknown = [commit for commit in candidates if commit[1] not in results]
+        if unknown:
+            results.update(verify.verify_trees(args, unknown, ways))
+
+        if first_round:
+            first_round = False
+            if not verify.is_failure(results[commits[high][1]][0]):
+                print(f"✅  {commits[high][0][:12]} compile et passe les tests: rien à chercher")
+                return None, results
+            if verify.is_failure(results[good_commit[1]][0]):
+                print(f"🚨  La base {good[:12]} échoue aussi: l'échec ne vient pas des commits intégrés")
+                push.report_verification(args, False, results[good_commit[1]][1])
+                return None, None
+
+        # Le premier échec connu borne la recherche, le dernier succès qui le précède aussi
+        for index in range(low + 1, high):
+            if commits[index][1] in results and verify.is_failure(results[commits[index][1]][0]):
+                high = index
+                break
+        for index in range(high - 1, low, -1):
+            if commits[index][1] in results:
+                low = index
+                break
+        if high - low <= 1:
+            return commits[high], results
+        print(f"🔍  Entre {commits[low][0][:12] if low >= 0 else good[:12]} et {commits[high][0][:12]}: "
+              f"{high - low - 1} commit(s) restant(s)")
+        candidates = [commits[i] for i in pick_midpoints(low, high, ways)]
+
+def pick_midpoints(low, high, ways):
+    """Découpe ]low, high[ en ways + 1 intervalles égaux et retourne leurs bornes intérieures."""
+    span = high - low
+    return sorted({low + max(1, min(span - 1, round(span * step / (ways + 1)))) for step in range(1, ways + 1)}
+                  if span > 1 else set())
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+"""
+Implémentation de la commande cache pour ci_test
+"""
+
+from ci_test.utils import cache_utils, config_utils
+
+def execute(args):
+    """Exécute la commande cache."""
+    if args.action == 'stats':
+        return show_stats()
+    elif args.action == 'clear':
+        return clear_cache()
+    else:
+        print("🚨  Erreur: Action inconnue")
+        print("Usage: ci_test cache stats|clear")
+        return 1
+
+def show_stats():
+    """Affiche les statistiques du cache de vérification."""
+    stats, entry_count, removed = cache_utils.get_stats()
+    hits = stats.get("hits", 0)
+    misses = stats.get("misses", 0)
+    total = hits + misses
+    hit_rate = (hits * 100.0 / total) if total else 0.0
+
+    print("📋  Cache de vérification:")
+    print(f"  • Fichier: {cache_utils.get_cache_file_path()}")
+    print(f"  • Entrées: {entry_count}/{config_utils.get_setting('verify_cache_max_entries', 500)}")
+    print(f"  • Âge maximal: {config_utils.get_setting('verify_cache_max_age_days', 30)} jours")
+    print(f"  • Hits: {hits} | Misses: {misses} | Taux de hit: {hit_rate:.1f}%")
+    if removed:
+        print(f"  • Entrées évincées: {removed}")
+    return 0
+
+def clear_cache():
+    """Vide le cache de vérification."""
+    if not cache_utils.clear():
+        print("🚨  Erreur: Impossible de vider le cache")
+        return 1
+    print("✅  Cache de vérification vidé")
+    return 0
@@ -5,7 +5,7 @@ Implémentation de la commande clone pour ci_test
 """
 
 import os
-from ci_test.utils import git_utils
+from ci_test.utils import git_utils, image_utils, state_utils
 
 def execute(args):
     orig_dir = os.getcwd()
@@ -17,13 +17,16 @@ def execute(args):
             return 1
         print("✅  Clonage réussi")
         os.chdir(os.path.join(orig_dir, args.url.split('/')[-1].replace('.git', '')))
+    if image_utils.prewarm():
+        print(f"🐳  Vérification de l'image {image_utils.IMAGE_NAME} en arrière-plan (logs: {image_utils.get_log_path()})")
     print("🔄  Initialisation du projet...")
 
-    if not git_utils.has_remote():
+    state = state_utils.RepoState.load()
+    if state is None or not state.has_remote():
         print("🚨  Erreur: Aucun remote configuré")
         return 1
 
-    if git_utils.has_head() or git_utils.has_remote_branches():
+    if state.head or state.remote_branches:
         print("ℹ️  Dépôt non vide. Aucune initialisation nécessaire.")
         return 1
 
@@ -10,11 +10,13 @@ def execute(args):
     """Exécute la commande config."""
     if hasattr(args, 'delete') and args.delete is not None:
         return set_delete_config(args.delete)
+    elif hasattr(args, 'set') and args.set:
+        return set_config(args.set)
     elif hasattr(args, 'list') and args.list:
         return list_config()
     else:
         print("🚨  Erreur: Option de configuration manquante")
-        print("Usage: ci_test config --delete=true|false ou ci_test config --list")
+        print("Usage: ci_test config --delete=true|false, ci_test config --set cle=valeur ou ci_test config --list")
         return 1
 
 def set_delete_config(delete_value):
@@ -39,6 +41,26 @@ def set_delete_config(delete_value):
         print(f"🚨  Erreur: {e}")
         return 1
 
+def set_config(assignment):
+    """Définit une valeur de configuration au format cle=valeur."""
+    if '=' not in assignment:
+        print("🚨  Erreur: Format attendu cle=valeur")
+        return 1
+
+    key, value = assignment.split('=', 1)
+    key = key.strip()
+    if not key:
+        print("🚨  Erreur: Clé de configuration vide")
+        return 1
+
+    parsed_value = config_utils.parse_value(value)
+    if not config_utils.set_setting(key, parsed_value):
+        print("🚨  Erreur: Impossible de sauvegarder la configuration")
+        return 1
+
+    print(f"✅  {key} = {parsed_value}")
+    return 0
+
 def list_config():
     """Affiche la configuration actuelle."""
     try:
@@ -6,8 +6,8 @@ Implémentation de la commande finish pour ci_test
 
 import os
 import sys
-from ci_test.utils import git_utils, config_utils
-from ci_test.commands import push
+from ci_test.utils import git_utils, config_utils, pipeline_utils, state_utils
+from ci_test.commands import bisect, push
 
 def execute(args):
     """Exécute la commande finish."""
@@ -16,8 +16,14 @@ def execute(args):
 
 def implement_finish(args):
     """Implémentation de la logique de finish."""
+    # État du dépôt lu une seule fois pour toute la commande
+    state = state_utils.RepoState.load()
+    if state is None:
+        print("🚨  Erreur: Vous n'êtes pas dans un dépôt git")
+        return 1
+
     # 1. Vérifier si un rebase est en cours
-    if git_utils.is_rebase_in_progress():
+    if state.rebase_in_progress:
         print("🔄  Continuation du rebase en cours...")
         print("📝  Résolvez les conflits et relancez 'ci_test finish'")
         return 1
@@ -26,20 +32,20 @@ def implement_finish(args):
             print(f"🚨  Erreur: Impossible de continuer le rebase\n{rebase_error}") """ # Pourrait fonctionner mais nécessite que l'user change le nom du commit, etc. Plus simple de continue par le merge editor de vscode.
 
     # 2. Détection du type de branche
-    branch_type = detect_branch_type()
+    branch_type = detect_branch_type(state)
     if branch_type is None:
         print("🚨  Erreur: Vous n'êtes pas sur une branche de travail (module ou issue)")
         return 1
 
     # 3. Exécution du workflow approprié selon le type de branche
     if branch_type == "issue":
-        return finish_issue(args)
+        return finish_issue(args, state)
     elif branch_type == "module":
-        return finish_module(args)
+        return finish_module(args, state)
 
-def detect_branch_type():
+def detect_branch_type(state=None):
     """Détecte le type de branche courante (module, issue ou autre)."""
-    current_branch = git_utils.get_current_branch()
+    current_branch = state.current_branch if state else git_utils.get_current_branch()
     if current_branch is None:
         return None
 
@@ -55,9 +61,9 @@ def detect_branch_type():
 
     return None
 
-def finish_issue(args):
+def finish_issue(args, state):
     """Termine une branche issue en la fusionnant dans sa branche module."""
-    current_branch = git_utils.get_current_branch()
+    current_branch = state.current_branch
     parts = current_branch.split("/")
     module_name = parts[1]
     issue_name = parts[2]
@@ -65,23 +71,31 @@ def finish_issue(args):
     # Branche cible (module)
     target_branch = f"mod/{module_name}/main"
 
+    # La vérification de l'arbre courant (cache, image, archive) se prépare pendant le fetch;
+    # elle est abandonnée si le rebase modifie l'arbre
+    force = hasattr(args, 'force') and args.force
+    prepared = pipeline_utils.Pipeline() if force else push.prepare(args)
+
     # 1. Mettre à jour la référence distante du module
     print(f"🔄  Mise à jour de la référence distante {target_branch}...")
     fetch_success, fetch_error = git_utils.fetch_branch("origin", target_branch)
     if not fetch_success:
+        prepared.close()
         print(f"🚨  Erreur: Impossible de mettre à jour la référence distante\n{fetch_error}")
         return 1
 
     # 2. Vérifier si un rebase est nécessaire
-    if not git_utils.is_ancestor(f"origin/{target_branch}", current_branch):
+    rebased = not git_utils.is_ancestor(f"origin/{target_branch}", current_branch)
+    if rebased:
         print(f"🔄  Rebase de {current_branch} sur origin/{target_branch}...")
         rebase_success, rebase_error = git_utils.rebase_branch(f"origin/{target_branch}")
         if not rebase_success:
+            prepared.close()
             print(f"🚨  Erreur: Impossible de rebase\n{rebase_error}")
             print("📝  Résolvez les conflits et relancez 'ci_test finish'")
             return 1
 
-    if hasattr(args, 'force') and args.force:
+    if force:
         print("⚠️  Mode force activé, les vérifications de build ne seront pas effectuées")
         push_args = type('Args', (), {'debug': getattr(args, 'debug', False), 'force': True})
         push_result = push.execute(push_args)
@@ -92,9 +106,11 @@ def finish_issue(args):
         # 3. Vérifier le build avant fusion
         print(f"🔍  Vérification du build sur {current_branch} avant fusion...")
         push_args = type('Args', (), {'debug': getattr(args, 'debug', False)})
-        push_result = push.execute(push_args)
+        push_result = push.execute(push_args, prepared)
         if push_result != 0:
             print("🚨  Erreur: La vérification du build a échoué")
+            if rebased and push_result == push.VERIFICATION_FAILED:
+                print(bisect.HINT)
             return push_result
 
     # 4. Checkout de la branche module
@@ -147,32 +163,40 @@ def finish_issue(args):
     print(f"✅  Issue {issue_name} fusionnée avec succès dans {target_branch}")
     return 0
 
-def finish_module(args):
+def finish_module(args, state):
     """Termine une branche module en la fusionnant dans dev."""
-    current_branch = git_utils.get_current_branch()
+    current_branch = state.current_branch
     parts = current_branch.split("/")
     module_name = parts[1]
 
     # Branche cible
     target_branch = "dev"
 
+    # La vérification de l'arbre courant (cache, image, archive) se prépare pendant le fetch;
+    # elle est abandonnée si le rebase modifie l'arbre
+    force = hasattr(args, 'force') and args.force
+    prepared = pipeline_utils.Pipeline() if force else push.prepare(args)
+
     # 1. Mettre à jour la référence distante de dev
     print(f"🔄  Mise à jour de la référence distante {target_branch}...")
     fetch_success, fetch_error = git_utils.fetch_branch("origin", target_branch)
     if not fetch_success:
+        prepared.close()
         print(f"🚨  Erreur: Impossible de mettre à jour la référence distante\n{fetch_error}")
         return 1
 
     # 2. Vérifier si un rebase est nécessaire
-    if not git_utils.is_ancestor(f"origin/{target_branch}", current_branch):
+    rebased = not git_utils.is_ancestor(f"origin/{target_branch}", current_branch)
+    if rebased:
         print(f"🔄  Rebase de {current_branch} sur origin/{target_branch}...")
         rebase_success, rebase_error = git_utils.rebase_branch(f"origin/{target_branch}")
         if not rebase_success:
+            prepared.close()
             print(f"🚨  Erreur: Impossible de rebase\n{rebase_error}")
             print("📝  Résolvez les conflits et relancez 'ci_test finish'")
             return 1
 
-    if hasattr(args, 'force') and args.force:
+    if force:
         print("⚠️  Mode force activé, les vérifications de build ne seront pas effectuées")
         push_args = type('Args', (), {'debug': getattr(args, 'debug', False), 'force': True})
         push_result = push.execute(push_args)
@@ -183,13 +207,15 @@ def finish_module(args):
         # 3. Vérifier le build avant fusion
         print(f"🔍  Vérification du build sur {current_branch}...")
         push_args = type('Args', (), {'debug': getattr(args, 'debug', False)})
-        push_result = push.execute(push_args)
+        push_result = push.execute(push_args, prepared)
         if push_result != 0:
             print("🚨  Erreur: La vérification du build a échoué")
+            if rebased and push_result == push.VERIFICATION_FAILED:
+                print(bisect.HINT)
             return push_result
 
     print(f"✅  Module {module_name} prêt à la fusion dans {target_branch} | N'oubliez pas de faire une PR sur github.")
-    git_url = git_utils.get_remote_url()
+    git_url = state.get_remote_url()
     if not git_url:
         print("🚨  Erreur: Impossible de récupérer l'URL du dépôt distant")
         return 1
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+"""
+Implémentation de la commande image pour ci_test
+"""
+
+from ci_test.utils import image_utils
+
+STATUS_LABELS = {
+    "fresh": "✅ à jour",
+    "retag": "✅ construite (ci_image sera retaguée)",
+    "stale": "⚠️  obsolète (Dockerfile ou entrypoint.py modifié)",
+    "missing": "⚠️  absente",
+    "unknown": "❔ fichiers de build introuvables",
+}
+
+def execute(args):
+    """Exécute la commande image."""
+    if args.action == 'status':
+        return show_status()
+    elif args.action == 'build':
+        return build()
+    else:
+        print("🚨  Erreur: Action inconnue")
+        print("Usage: ci_test image status|build")
+        return 1
+
+def show_status():
+    """Affiche l'état de l'image ci_image."""
+    inputs_hash = image_utils.get_inputs_hash()
+    print(f"📋  Image {image_utils.IMAGE_NAME}:")
+    print(f"  • Fichiers de build: {image_utils.get_build_context()} ({', '.join(image_utils.BUILD_INPUTS)})")
+    if inputs_hash is not None:
+        print(f"  • Tag attendu: {image_utils.get_image_tag(inputs_hash)}")
+    print(f"  • État: {STATUS_LABELS[image_utils.get_status(inputs_hash)]}")
+    print(f"  • Construction en cours: {'oui' if image_utils.is_build_running() else 'non'}")
+    print(f"  • Image obsolète lors d'une vérification: {image_utils.get_refresh_policy()}")
+    return 0
+
+def build():
+    """Construit l'image si ses fichiers de build ont changé."""
+    print(f"🐳  Construction de l'image {image_utils.IMAGE_NAME}...")
+    success, error = image_utils.build_image()
+    if not success:
+        print(f"🚨  Erreur: Impossible de construire l'image\n{error}")
+        return 1
+    print(f"✅  Image {image_utils.get_image_tag(image_utils.get_inputs_hash())} à jour")
+    return 0
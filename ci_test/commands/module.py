@@ -14,16 +14,19 @@ def execute(args):
         print("🚨  Erreur: Vous devez être sur la branche dev pour créer un module")
         return 1
 
-    # 2. Mettre à jour la branche dev locale par rapport à la référence distante
+    # 2. Mettre à jour la branche dev locale et la branche module éventuelle (un seul fetch)
     print("🔄  Mise à jour de la branche dev...")
-    fetch_success, fetch_error = git_utils.fetch_branch("origin", "dev")
-    if not fetch_success:
-        print(f"🚨  Erreur: Impossible de mettre à jour la branche dev\n{fetch_error}")
-        return 1
+    module_name = f"mod/{args.name}/main"
+    module_exists, _ = git_utils.fetch_branches("origin", ["dev", module_name])
+    if not module_exists:
+        # La branche module n'existe pas encore à distance: seule dev est récupérée
+        fetch_success, fetch_error = git_utils.fetch_branch("origin", "dev")
+        if not fetch_success:
+            print(f"🚨  Erreur: Impossible de mettre à jour la branche dev\n{fetch_error}")
+            return 1
 
     # 3. Vérifier si la branche module existe déjà
-    module_name = f"mod/{args.name}/main"
-    if git_utils.branch_exists("origin", module_name):
+    if module_exists or git_utils.resolve_commit(f"refs/heads/{module_name}"):
         print(f"ℹ️  La branche {module_name} existe déjà")
         return 0
 
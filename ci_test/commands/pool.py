@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+
+"""
+Implémentation de la commande pool pour ci_test
+"""
+
+from ci_test.utils import pool_utils, config_utils
+
+def execute(args):
+    """Exécute la commande pool."""
+    if args.action == 'status':
+        return show_status()
+    elif args.action == 'stop':
+        return stop_pool()
+    else:
+        print("🚨  Erreur: Action inconnue")
+        print("Usage: ci_test pool status|stop")
+        return 1
+
+def show_status():
+    """Affiche l'état du pool de conteneurs chauds."""
+    runner = config_utils.get_setting("runner", "cold")
+    containers = pool_utils.list_containers()
+    print("📋  Pool de conteneurs chauds:")
+    print(f"  • Runner configuré: {runner}")
+    print(f"  • Taille maximale: {config_utils.get_setting('warm_pool_size', 2)}")
+    print(f"  • Arrêt après inactivité: {config_utils.get_setting('warm_pool_idle_timeout', 900)}s")
+    if not containers:
+        print("  • Aucun conteneur démarré")
+    for name, status in containers:
+        print(f"  • {name}: {status}")
+    return 0
+
+def stop_pool():
+    """Arrête les conteneurs chauds de l'utilisateur courant."""
+    stopped = pool_utils.stop_all()
+    print(f"✅  {stopped} conteneur(s) arrêté(s)")
+    return 0
@@ -4,73 +4,115 @@
 Implémentation de la commande push pour ci_test
 """
 
-import os
-import sys
-import subprocess
-from ci_test.utils import docker_utils, git_utils
+import concurrent.futures
+import threading
+import time
+from ci_test.utils import docker_utils, git_utils, cache_utils, config_utils, workspace_utils, shard_utils, trace_utils
+from ci_test.utils import impact_utils, pipeline_utils, preflight_utils
 
-def execute(args):
-    """Exécute la commande push."""
+# Code de retour de execute lorsque le build ou les tests échouent (et non le push)
+VERIFICATION_FAILED = 2
+
+def execute(args, prepared=None):
+    """Exécute la commande push.
+
+    prepared: vérification lancée en avance par prepare (par exemple pendant le fetch de finish),
+    réutilisée si elle porte encore sur l'arbre de HEAD.
+    """
     if not (hasattr(args, 'force') and args.force):
         print("🔍  Vérification du dernier commit...")
 
         # Vérifier que HEAD existe
         if not git_utils.verify_head():
+            if prepared is not None:
+                prepared.close()
             print("🚨  Erreur: Aucun commit trouvé (HEAD invalide)")
             return 1
 
-        # Créer un tarball du dernier commit
-        print("📦  Création de l'archive du dernier commit...")
-        tarball_path = os.path.join(os.getcwd(), "project.tar")
-        if not git_utils.create_tarball(tarball_path):
-            print("🚨  Erreur: Impossible de créer l'archive du projet")
-            return 1
-        # Exécuter le conteneur Docker
-        print("🐳  Lancement de la vérification dans Docker...")
-        success, logs = docker_utils.run_container(os.getcwd(), args.debug)
+        # Une vérification préparée avant un rebase porte sur l'ancien arbre
+        tree_hash = git_utils.get_tree_hash()
+        if prepared is None or prepared.key != tree_hash:
+            if prepared is not None:
+                prepared.close()
+            prepared = prepare(args, tree_hash)
 
+        try:
+            # Réutiliser une vérification déjà effectuée sur le même arbre
+            cache_ready, cached = prepared.result('cache')
+            if not cache_ready:
+                # Recherche annulée ou en échec: les étapes préparées après elle le sont aussi
+                prepared.close()
+                prepared = None
+                _, cached = lookup_cache(tree_hash, getattr(args, 'all_tests', False))
+            cache_key, cache_hit = cached
+            if cache_hit:
+                print(f"♻️   Arbre {tree_hash[:12]} déjà vérifié, build et tests ignorés")
+            elif verify(args, cache_key, prepared) != 0:
+                return VERIFICATION_FAILED
+        finally:
+            if prepared is not None:
+                prepared.close()
 
-        if not success:
-            print("🚨  Échec de la compilation")
-            print("\nLogs de compilation:")
-            print(logs)
-            # Nettoyer le tarball temporaire
-            os.remove(tarball_path)
+        # Amender le commit
+        print("📝  Mise à jour du commit...")
+        if not git_utils.amend_commit():
+            print("🚨  Erreur: Impossible d'amender le commit")
             return 1
+    elif prepared is not None:
+        prepared.close()
 
-        print("✅  Compilation réussie")
+    return publish()
 
-        if args.debug:
-            print("\nLogs de compilation:")
-            print(logs)
+def prepare(args, tree_hash=None):
+    """Lance en arrière-plan les étapes indépendantes de la vérification d'un arbre (HEAD par défaut).
 
-        success, logs = docker_utils.run_container(os.getcwd(), args.debug, type='tests')
+    La recherche dans le cache est suivie, si l'arbre n'y est pas, de la mise à jour de l'image
+    et de la création de l'archive en parallèle. Retourne un pipeline_utils.Pipeline
+    à passer à execute, qui le ferme.
+    """
+    tree_hash = tree_hash or git_utils.get_tree_hash()
+    pipeline = pipeline_utils.Pipeline(tree_hash)
+    pipeline.add('cache', lookup_cache, tree_hash, getattr(args, 'all_tests', False))
+    pipeline.add('image', prepare_image, after=('cache',))
+    if not uses_workspace(git_utils.get_current_branch()):
+        pipeline.add('archive', prepare_archive, tree_hash, after=('cache',),
+                     cleanup=lambda prepared_archive: prepared_archive[0].close())
+    return pipeline
 
-        if not success:
-            print("🚨  Échec des tests")
-            print("\nLogs de tests:")
-            print(logs)
-            # Nettoyer le tarball temporaire
-            os.remove(tarball_path)
-            return 1
+@trace_utils.traced('cache.lookup')
+def lookup_cache(tree_hash, bypass=False):
+    """Cherche un arbre dans le cache des vérifications. Retourne (True, (clé, trouvé)).
 
-        if args.debug:
-            print("\nLogs des tests:")
-            print(logs)
+    bypass: l'arbre est vérifié à nouveau même s'il est dans le cache (--all-tests).
+    """
+    cache_key = cache_utils.get_cache_key(tree_hash)
+    return True, (cache_key, not bypass and cache_utils.lookup(cache_key))
 
-        print("✅  Tests réussis")
+def prepare_image(cached):
+    """Met à jour l'image du runner, sauf si l'arbre est déjà vérifié. Retourne (succès, erreur)."""
+    if cached[1]:
+        return True, None
+    return docker_utils.ensure_runner_image()
 
-        os.remove(tarball_path)  # Nettoyer le tarball temporaire
+def prepare_archive(tree_hash, cached):
+    """Crée l'archive d'un arbre, sauf s'il est déjà vérifié. Retourne (succès, (archive, compression))."""
+    if cached[1]:
+        return True, None
+    archive, compression = git_utils.create_archive(
+        tree_hash, config_utils.get_setting("archive_compression", "none"))
+    if archive is None:
+        return False, f"🚨  Erreur: Impossible de créer l'archive du projet\n{compression}"
+    return True, (archive, compression)
 
-        # Amender le commit
-        print("📝  Mise à jour du commit...")
-        if not git_utils.amend_commit():
-            print("🚨  Erreur: Impossible d'amender le commit")
-            return 1
+def uses_workspace(branch):
+    """Vérifie si la vérification d'une branche passe par son espace de travail persistant."""
+    return workspace_utils.is_enabled() and bool(branch) and branch != 'HEAD'
 
-    # Pousser les modifications
+@trace_utils.traced('push.publish')
+def publish(cwd=None):
+    """Pousse la branche courante (de cwd), avec proposition de force push si le push est refusé."""
     print("🚀  Envoi des modifications...")
-    push_success, push_error = git_utils.push()
+    push_success, push_error = git_utils.push(cwd)
 
     if not push_success:
         print(f"⚠️   Warn: Push impossible\n{push_error}")
@@ -78,7 +120,7 @@ def execute(args):
 
         if force_push:
             print("🔥  Force push en cours...")
-            force_success, force_error = git_utils.force_push()
+            force_success, force_error = git_utils.force_push(cwd)
 
             if not force_success:
                 print(f"🚨  Erreur lors du force push: {force_error}")
@@ -89,3 +131,165 @@ def execute(args):
 
     print("✅  Push réussi")
     return 0
+
+@trace_utils.traced('push.verify')
+def verify(args, cache_key=None, prepared=None):
+    """Vérifie la compilation et les tests du dernier commit dans Docker."""
+    branch = git_utils.get_current_branch()
+    impact_options, test_plan = impact_utils.plan(branch, git_utils.get_tree_hash('HEAD'),
+                                                  getattr(args, 'all_tests', False))
+    success, logs = run_verification(args, 'HEAD', branch, prepared=prepared,
+                                     extra_options=preflight_utils.get_entrypoint_options('HEAD') + impact_options)
+    if report_verification(args, success, logs, streamed=args.debug, branch=branch) != 0:
+        return 1
+    impact_utils.record(logs, test_plan)
+    # Seule une exécution de tous les tests vaut vérification de l'arbre
+    if impact_utils.is_full_run(test_plan):
+        cache_utils.record(cache_key, git_utils.get_head_hash(), branch)
+    return 0
+
+@trace_utils.traced('verification')
+def run_verification(args, rev, branch, quiet=False, prepared=None, extra_options=None):
+    """Lance le build et les tests d'un commit dans Docker. Retourne (succès, logs).
+
+    prepared: pipeline de prepare dont l'image et l'archive (déjà prêtes ou en cours) sont utilisées.
+    extra_options: arguments supplémentaires de l'entrypoint (pré-vérification syntaxique...).
+    """
+    if prepared is not None:
+        # Une image impossible à mettre à jour n'est pas reconstruite une seconde fois par le runner
+        image_ready, image_error = prepared.result('image')
+        if not image_ready and image_error is not None:
+            return False, image_error
+
+    if uses_workspace(branch):
+        # Espace de travail persistant de la branche: seuls les fichiers modifiés sont transmis
+        if not quiet:
+            print("🐳  Lancement de la vérification dans Docker...")
+        return workspace_utils.run_synced(branch, git_utils.get_tree_hash(rev), args.debug, type='all',
+                                          quiet=quiet, extra_options=extra_options)
+
+    # Créer l'archive du commit (en mémoire, rien n'est écrit dans le dépôt)
+    if not quiet:
+        print("📦  Création de l'archive du dernier commit...")
+    if prepared is not None:
+        archive_ready, prepared_archive = prepared.take('archive')
+        if not archive_ready:
+            return False, prepared_archive or "🚨  Erreur: Création de l'archive annulée"
+        archive, compression = prepared_archive
+    else:
+        archive, compression = git_utils.create_archive(
+            rev, config_utils.get_setting("archive_compression", "none"))
+        if archive is None:
+            return False, f"🚨  Erreur: Impossible de créer l'archive du projet\n{compression}"
+    try:
+        # Exécuter le build et les tests dans un seul conteneur (extraction et compilation uniques)
+        if not quiet:
+            print("🐳  Lancement de la vérification dans Docker...")
+        return docker_utils.run_container(archive, compression, args.debug, type='all', extra_options=extra_options,
+                                          quiet=quiet)
+    finally:
+        archive.close()
+
+def report_verification(args, success, logs, streamed=False, branch=None):
+    """Affiche le résultat d'une vérification. Retourne 0 si le build et les tests ont réussi."""
+    stages = docker_utils.parse_stage_results(logs)
+
+    # Les logs déjà affichés en direct (mode debug) ne sont pas répétés
+    build_success, build_logs = stages.get('build', (False, logs))
+    if not build_success:
+        print("🚨  Échec de la compilation")
+        print_syntax_summary(logs)
+        if not streamed:
+            print("\nLogs de compilation:")
+            print(build_logs)
+        print_ccache_summary(logs)
+        return 1
+
+    print("✅  Compilation réussie")
+
+    # Résultats par test lorsque les tests ont été répartis en shards
+    markers = docker_utils.parse_markers(logs)
+    report_path = shard_utils.record_results(markers, branch)
+
+    tests_success, tests_logs = stages.get('tests', (False, logs))
+    if not (tests_success and success):
+        print("🚨  Échec des tests")
+        shard_utils.print_summary(markers, report_path)
+        if not streamed:
+            print("\nLogs de tests:")
+            print(tests_logs)
+        print_ccache_summary(logs)
+        return 1
+
+    print("✅  Tests réussis")
+    shard_utils.print_summary(markers, report_path)
+    print_ccache_summary(logs)
+    return 0
+
+def verify_many(args, targets):
+    """Vérifie plusieurs commits en parallèle, chacun dans son conteneur.
+
+    targets: liste de (branche, révision). Les arbres déjà vérifiés (cache) sont ignorés.
+    Les résultats sont affichés dans l'ordre de targets. Retourne la liste des codes (0 = succès).
+    """
+    jobs = []
+    codes = [0] * len(targets)
+    for index, (branch, rev) in enumerate(targets):
+        tree_hash = git_utils.get_tree_hash(rev)
+        cache_key = cache_utils.get_cache_key(tree_hash)
+        if cache_utils.lookup(cache_key):
+            print(f"♻️   {branch}: arbre {tree_hash[:12]} déjà vérifié")
+        else:
+            jobs.append((index, branch, rev, cache_key))
+    if not jobs:
+        return codes
+
+    print(f"🐳  Lancement de {len(jobs)} vérification(s) en parallèle dans Docker...")
+    results = run_many(args, [(branch, rev) for _, branch, rev, _ in jobs])
+
+    for (index, branch, rev, cache_key), (success, logs) in zip(jobs, results):
+        print(f"\n🔍  {branch}:")
+        codes[index] = report_verification(args, success, logs, branch=branch)
+        if codes[index] == 0:
+            cache_utils.record(cache_key, git_utils.resolve_commit(rev), branch)
+    return codes
+
+def run_many(args, targets, max_workers=None):
+    """Lance les vérifications de plusieurs (branche, révision), au plus max_workers à la fois.
+
+    Rien n'est affiché hormis la progression. Retourne les (succès, logs) dans l'ordre de targets.
+    """
+    stop_event = threading.Event()
+    progress = threading.Thread(
+        target=docker_utils.heartbeat,
+        args=(stop_event, f"{len(targets)} vérification(s) en cours", time.time()),
+        daemon=True
+    )
+    progress.start()
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or len(targets)) as executor:
+            futures = [executor.submit(run_verification, args, rev, branch, True)
+                       for branch, rev in targets]
+            return [future.result() for future in futures]
+    finally:
+        stop_event.set()
+        progress.join()
+
+def print_syntax_summary(logs):
+    """Signale une erreur détectée par la pré-vérification syntaxique (build complet non lancé)."""
+    stats = preflight_utils.get_stats(logs)
+    if stats is None or not stats[1]:
+        return
+    checked, failed, elapsed = stats
+    print(f"⚡  Pré-vérification syntaxique: {failed} source(s) en erreur sur {checked} vérifiée(s) "
+          f"en {elapsed:.2f}s, build complet non lancé")
+
+def print_ccache_summary(logs):
+    """Affiche le résumé des hits/misses ccache du conteneur, si ccache est activé."""
+    stats = docker_utils.get_ccache_stats(logs)
+    if stats is None:
+        return
+    hits, misses = stats
+    total = hits + misses
+    hit_rate = (hits * 100.0 / total) if total else 0.0
+    print(f"🗃️   ccache: {hits} hit(s), {misses} miss(es) ({hit_rate:.0f}% de hits)")
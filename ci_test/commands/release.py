@@ -4,8 +4,7 @@
 Implémentation de la commande release pour ci_test
 """
 
-import re
-from ci_test.utils import git_utils
+from ci_test.utils import git_utils, version_utils
 
 def execute(args):
     """Exécute la commande release."""
@@ -31,100 +30,62 @@ def implement_release():
         print(f"🚨  Erreur: Impossible de pull la branche dev\n{pull_error}")
         return 1
 
-    # 3. Checkout de la branche main
-    print("🔄  Checkout de la branche main...")
-    checkout_success, checkout_error = git_utils.checkout_branch("main")
-    if not checkout_success:
-        print(f"🚨  Erreur: Impossible de checkout main\n{checkout_error}")
+    # 3. Résoudre les arbres et commits sans changer de branche
+    dev_tree = git_utils.get_tree_hash("refs/heads/dev")
+    main_ref = "refs/heads/main"
+    main_commit = git_utils.resolve_commit(main_ref)
+    if main_commit is None:
+        # Pas encore de branche main locale: on part de la référence distante
+        main_commit = git_utils.resolve_commit("refs/remotes/origin/main")
+        main_old_value = ""
+    else:
+        main_old_value = main_commit
+    if dev_tree is None or main_commit is None:
+        print("🚨  Erreur: Impossible de résoudre les branches dev et main")
         return 1
 
     # 4. Déterminer le numéro de version suivant
     print("🔍  Détermination du numéro de version...")
-    next_version = get_next_version()
+    next_version = version_utils.get_next_version(main_commit)
     if next_version is None:
         print("🚨  Erreur: Impossible de déterminer le numéro de version")
         return 1
-    print(f"📦  Préparation de la release {next_version}.0...")
+    print(f"📦  Préparation de la release {next_version}...")
 
-    # 5. Nettoyer le répertoire de travail
-    print("🧹  Nettoyage du répertoire de travail...")
-    clean_success, clean_error = git_utils.remove_all_cached()
-    if not clean_success:
-        print(f"🚨  Erreur: Impossible de nettoyer le cache\n{clean_error}")
+    if git_utils.get_tree_hash(main_commit) == dev_tree:
+        print("🚨  Erreur: Impossible de créer le commit\nAucune modification depuis la dernière release")
         return 1
 
-    clean_wd_success, clean_wd_error = git_utils.clean_working_directory()
-    if not clean_wd_success:
-        print(f"🚨  Erreur: Impossible de nettoyer le répertoire de travail\n{clean_wd_error}")
-        return 1
-
-    # 6. Copier le contenu de dev
-    print("📋  Copie du contenu de dev...")
-    copy_success, copy_error = git_utils.checkout_files_from_branch("dev")
-    if not copy_success:
-        print(f"🚨  Erreur: Impossible de copier les fichiers de dev\n{copy_error}")
-        return 1
-
-    # 7. Ajouter tous les fichiers
-    print("➕  Ajout des fichiers...")
-    add_success, add_error = git_utils.add_all()
-    if not add_success:
-        print(f"🚨  Erreur: Impossible d'ajouter les fichiers\n{add_error}")
-        return 1
-
-    # 8. Créer le commit de release
-    commit_message = f"Release {next_version}.0 - snapshot of dev"
+    # 5. Créer le commit de release: arbre de dev, parent main
+    commit_message = f"Release {next_version} - snapshot of dev"
     print(f"💾  Création du commit: {commit_message}")
-    commit_success, commit_error = git_utils.commit(commit_message)
+    commit_success, release_commit = git_utils.commit_tree(dev_tree, [main_commit], commit_message)
     if not commit_success:
-        print(f"🚨  Erreur: Impossible de créer le commit\n{commit_error}")
+        print(f"🚨  Erreur: Impossible de créer le commit\n{release_commit}")
+        return 1
+
+    # 6. Avancer main sur le commit de release (échoue si main a bougé entre-temps)
+    ref_success, ref_error = git_utils.update_ref(main_ref, release_commit, main_old_value, commit_message)
+    if not ref_success:
+        print(f"🚨  Erreur: Impossible de mettre à jour la branche main\n{ref_error}")
         return 1
 
-    # 9. Créer le tag
-    tag_name = f"{next_version}.0"
-    tag_message = f"Release {next_version}.0"
+    # 7. Créer le tag
+    tag_name = f"{version_utils.get_tag_prefix()}{next_version}"
+    tag_message = f"Release {next_version}"
     print(f"🏷️  Création du tag {tag_name}...")
-    tag_success, tag_error = git_utils.create_tag(tag_name, tag_message)
+    tag_success, tag_error = git_utils.create_tag(tag_name, tag_message, release_commit)
     if not tag_success:
         print(f"🚨  Erreur: Impossible de créer le tag\n{tag_error}")
         return 1
 
-    # 10. Push de la branche et du tag
-    print("🚀  Push de la branche main...")
-    push_success, push_error = git_utils.push()
+    # 8. Push de la branche et du tag (un seul push)
+    print(f"🚀  Push de la branche main et du tag {tag_name}...")
+    push_success, push_error = git_utils.push_refs("origin", ["main", f"refs/tags/{tag_name}"])
     if not push_success:
-        print(f"🚨  Erreur: Impossible de push la branche main\n{push_error}")
+        print(f"🚨  Erreur: Impossible de push la branche main et le tag\n{push_error}")
         return 1
 
-    print(f"🚀  Push du tag {tag_name}...")
-    push_tag_success, push_tag_error = git_utils.push_tag(tag_name)
-    if not push_tag_success:
-        print(f"🚨  Erreur: Impossible de push le tag\n{push_tag_error}")
-        return 1
-
-    print(f"✅  Release {next_version}.0 créée avec succès !")
+    print(f"✅  Release {next_version} créée avec succès !")
     print(f"✅  Tag: {tag_name} créée avec succès 🏷️!")
     return 0
-
-def get_next_version():
-    """Détermine le numéro de version suivant en analysant l'historique des commits."""
-    try:
-        # Récupérer l'historique des commits de main
-        commits_success, commits_output = git_utils.get_commit_history()
-        if not commits_success:
-            # Si aucun commit n'existe, commencer à la version 1
-            return 1
-
-        # Chercher le dernier commit de release
-        release_pattern = r"Release (\d+)\.0 - snapshot of dev"
-
-        for line in commits_output.split('\n'):
-            match = re.search(release_pattern, line)
-            if match:
-                last_version = int(match.group(1))
-                return last_version + 1
-
-        # Si aucun commit de release trouvé, commencer à la version 1
-        return 1
-    except Exception:
-        return None
@@ -3,15 +3,16 @@
 Implémentation de la commande update pour ci_test
 """
 
-from ci_test.utils import git_utils
-from ci_test.commands import push
+from ci_test.utils import git_utils, state_utils
+from ci_test.commands import bisect, push
 
 def execute(args):
     """Exécute la commande update."""
     return implement_update(args)
 
 def implement_update(args):
-    current_branch = git_utils.get_current_branch()
+    state = state_utils.RepoState.load()
+    current_branch = state.current_branch if state else None
     if current_branch is None:
         print("🚨  Erreur: Impossible de déterminer la branche courante")
         return 1
@@ -30,6 +31,7 @@ def implement_update(args):
         if not fetch_success:
             print(f"🚨  Erreur: Impossible de mettre à jour la branche {target}\n{fetch_error}")
             return 1
+        rebased = not git_utils.is_ancestor(f"origin/{target}", current_branch)
         rebase_success, rebase_error = git_utils.rebase_branch(f"origin/{target}")
         if not rebase_success:
             print(f"🚨  Erreur: Impossible de rebase\n{rebase_error}")
@@ -47,6 +49,8 @@ def implement_update(args):
         push_result = push.execute(push_args)
         if push_result != 0:
             print("🚨  Erreur: La vérification du build ou le push a échoué")
+            if rebased and push_result == push.VERIFICATION_FAILED:
+                print(bisect.HINT)
             return push_result
 
         print(f"✅  Branche {current_branch} mise à jour sur {target}")
@@ -58,62 +62,7 @@ def implement_update(args):
         module_branch = f"mod/{parts[1]}/main"
         # Si un argument est donné, update module + issue
         if hasattr(args, 'dev') and args.dev and args.dev == "dev":
-            target = args.dev
-            print(f"🔄  Rebase de {module_branch} sur {target}...")
-            fetch_success, fetch_error = git_utils.fetch_branch("origin", target)
-            if not fetch_success:
-                print(f"🚨  Erreur: Impossible de mettre à jour la branche {target}\n{fetch_error}")
-                return 1
-            checkout_success, checkout_error = git_utils.checkout_branch(module_branch)
-            if not checkout_success:
-                print(f"🚨  Erreur: Impossible de checkout {module_branch}\n{checkout_error}")
-                return 1
-            rebase_success, rebase_error = git_utils.rebase_branch(f"origin/{target}")
-            if not rebase_success:
-                print(f"🚨  Erreur: Impossible de rebase {module_branch} sur {target}\n{rebase_error}")
-                print("📝  Résolvez les conflits et relancez 'ci_test update'")
-                return 1
-
-            # Vérifier le build et push de la branche module
-            if hasattr(args, 'force') and args.force:
-                print("⚠️  Mode force activé, les vérifications de build ne seront pas effectuées")
-                push_args = type('Args', (), {'debug': getattr(args, 'debug', False), 'force': True})
-            else:
-                print("🔍  Vérification du build...")
-                push_args = type('Args', (), {'debug': getattr(args, 'debug', False)})
-
-            push_result = push.execute(push_args)
-            if push_result != 0:
-                print("🚨  Erreur: La vérification du build ou le push de la branche module a échoué")
-                return push_result
-
-            # Retour sur la branche issue
-            checkout_success, checkout_error = git_utils.checkout_branch(current_branch)
-            if not checkout_success:
-                print(f"🚨  Erreur: Impossible de revenir sur {current_branch}\n{checkout_error}")
-                return 1
-            print(f"🔄  Rebase de {current_branch} sur {module_branch}...")
-            rebase_success, rebase_error = git_utils.rebase_branch(module_branch)
-            if not rebase_success:
-                print(f"🚨  Erreur: Impossible de rebase {current_branch} sur {module_branch}\n{rebase_error}")
-                print("📝  Résolvez les conflits et relancez 'ci_test update'")
-                return 1
-
-            # Vérifier le build et push de la branche issue
-            if hasattr(args, 'force') and args.force:
-                print("⚠️  Mode force activé, les vérifications de build ne seront pas effectuées")
-                push_args = type('Args', (), {'debug': getattr(args, 'debug', False), 'force': True})
-            else:
-                print("🔍  Vérification du build...")
-                push_args = type('Args', (), {'debug': getattr(args, 'debug', False)})
-
-            push_result = push.execute(push_args)
-            if push_result != 0:
-                print("🚨  Erreur: La vérification du build ou le push de la branche issue a échoué")
-                return push_result
-
-            print(f"✅  Branche {current_branch} mise à jour sur {module_branch} (et {module_branch} sur {target})")
-            return 0
+            return update_module_and_issue(args, current_branch, module_branch, args.dev)
         else:
             # Sinon, rebase issue sur module
             print(f"🔄  Rebase de {current_branch} sur {module_branch}...")
@@ -121,6 +70,7 @@ def implement_update(args):
             if not fetch_success:
                 print(f"🚨  Erreur: Impossible de mettre à jour la branche {module_branch}\n{fetch_error}")
                 return 1
+            rebased = not git_utils.is_ancestor(f"origin/{module_branch}", current_branch)
             rebase_success, rebase_error = git_utils.rebase_branch(f"origin/{module_branch}")
             if not rebase_success:
                 print(f"🚨  Erreur: Impossible de rebase\n{rebase_error}")
@@ -138,6 +88,8 @@ def implement_update(args):
             push_result = push.execute(push_args)
             if push_result != 0:
                 print("🚨  Erreur: La vérification du build ou le push a échoué")
+                if rebased and push_result == push.VERIFICATION_FAILED:
+                    print(bisect.HINT)
                 return push_result
 
             print(f"✅  Branche {current_branch} mise à jour sur {module_branch}")
@@ -145,3 +97,83 @@ def implement_update(args):
 
     print("🚨  Erreur: Vous n'êtes pas sur une branche module ou issue")
     return 1
+
+def update_module_and_issue(args, current_branch, module_branch, target):
+    """Rebase la branche module sur target et la branche issue sur le module.
+
+    La branche module est rebasée dans un worktree temporaire (le répertoire de travail
+    reste sur la branche issue), les deux branches sont vérifiées en parallèle et
+    ne sont poussées que si les deux vérifications réussissent.
+    """
+    print(f"🔄  Rebase de {module_branch} sur {target}...")
+    fetch_success, fetch_error = git_utils.fetch_branch("origin", target)
+    if not fetch_success:
+        print(f"🚨  Erreur: Impossible de mettre à jour la branche {target}\n{fetch_error}")
+        return 1
+
+    worktree, worktree_error = git_utils.add_worktree(module_branch)
+    if worktree is None:
+        print(f"🚨  Erreur: Impossible d'extraire {module_branch} dans un worktree\n{worktree_error}")
+        return 1
+
+    try:
+        rebased = not git_utils.is_ancestor(f"origin/{target}", module_branch) or \
+            not git_utils.is_ancestor(module_branch, current_branch)
+        rebase_success, rebase_error = git_utils.rebase_branch(f"origin/{target}", cwd=worktree)
+        if not rebase_success:
+            git_utils.rebase_abort(cwd=worktree)
+            print(f"🚨  Erreur: Impossible de rebase {module_branch} sur {target}\n{rebase_error}")
+            print(f"📝  Rebasez {module_branch} manuellement (git checkout {module_branch} && "
+                  f"git rebase origin/{target}) puis relancez 'ci_test update dev'")
+            return 1
+
+        print(f"🔄  Rebase de {current_branch} sur {module_branch}...")
+        rebase_success, rebase_error = git_utils.rebase_branch(module_branch)
+        if not rebase_success:
+            print(f"🚨  Erreur: Impossible de rebase {current_branch} sur {module_branch}\n{rebase_error}")
+            print("📝  Résolvez les conflits et relancez 'ci_test update'")
+            return 1
+
+        if hasattr(args, 'force') and args.force:
+            print("⚠️  Mode force activé, les vérifications de build ne seront pas effectuées")
+        else:
+            print("🔍  Vérification du build des deux branches...")
+            codes = push.verify_many(args, [(module_branch, module_branch), (current_branch, 'HEAD')])
+            if any(codes):
+                print("🚨  Erreur: La vérification du build a échoué, aucune branche n'a été poussée")
+                if rebased:
+                    print(bisect.HINT)
+                return 1
+
+            # Le commit amendé du module remplace l'ancien sous la branche issue (arbres identiques)
+            previous_module = git_utils.resolve_commit(module_branch)
+            print(f"📝  Mise à jour du commit de {module_branch}...")
+            if not git_utils.amend_commit(cwd=worktree):
+                print(f"🚨  Erreur: Impossible d'amender le commit de {module_branch}")
+                return 1
+            amended_module = git_utils.resolve_commit(module_branch)
+            if amended_module != previous_module:
+                rebase_success, rebase_error = git_utils.rebase_onto(amended_module, previous_module)
+                if not rebase_success:
+                    print(f"🚨  Erreur: Impossible de rebase {current_branch} sur {module_branch}\n{rebase_error}")
+                    return 1
+
+            print(f"📝  Mise à jour du commit de {current_branch}...")
+            if not git_utils.amend_commit():
+                print(f"🚨  Erreur: Impossible d'amender le commit de {current_branch}")
+                return 1
+
+        print(f"🚀  Publication de {module_branch}...")
+        if push.publish(cwd=worktree) != 0:
+            print("🚨  Erreur: Le push de la branche module a échoué")
+            return 1
+    finally:
+        git_utils.remove_worktree(worktree)
+
+    print(f"🚀  Publication de {current_branch}...")
+    if push.publish() != 0:
+        print("🚨  Erreur: Le push de la branche issue a échoué")
+        return 1
+
+    print(f"✅  Branche {current_branch} mise à jour sur {module_branch} (et {module_branch} sur {target})")
+    return 0
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+"""
+Implémentation de la commande verify pour ci_test
+"""
+
+from collections import OrderedDict
+from ci_test.commands import push
+from ci_test.utils import cache_utils, config_utils, docker_utils, git_utils
+
+STATUS_LABELS = {
+    "ok": "✅  ok   ",
+    "cached": "♻️   cache",
+    "build": "❌  build",
+    "tests": "❌  tests",
+}
+
+def execute(args):
+    """Exécute la commande verify."""
+    commits, error = git_utils.list_commits(args.range)
+    if commits is None:
+        print(f"🚨  Erreur: Plage de commits invalide ({args.range})\n{error}")
+        return 1
+    if not commits:
+        print(f"ℹ️  Aucun commit dans {args.range}")
+        return 0
+
+    results = verify_trees(args, commits, get_jobs(args))
+
+    failed_trees = OrderedDict()
+    for sha, tree, subject in commits:
+        if is_failure(results[tree][0]) and tree not in failed_trees:
+            failed_trees[tree] = (sha, subject)
+    if args.debug:
+        for tree, (sha, subject) in failed_trees.items():
+            print(f"\n🔍  {sha[:12]} {subject}:")
+            push.report_verification(args, False, results[tree][1])
+
+    print_table(args.range, commits, results)
+    if failed_trees:
+        failed = sum(1 for _, tree, _ in commits if tree in failed_trees)
+        sha, subject = next(iter(failed_trees.values()))
+        print(f"🚨  {failed} commit(s) en échec sur {len(commits)}, premier: {sha[:12]} {subject}")
+        if not args.debug:
+            print("📝  Relancez avec --debug pour afficher les logs des échecs")
+        return 1
+    print(f"✅  Les {len(commits)} commit(s) de {args.range} compilent et passent les tests")
+    return 0
+
+def get_jobs(args):
+    """Nombre de vérifications simultanées (--jobs, sinon verify_jobs)."""
+    jobs = getattr(args, 'jobs', None) or config_utils.get_setting("verify_jobs", 4)
+    try:
+        return max(1, int(jobs))
+    except (TypeError, ValueError):
+        return 1
+
+def get_status(success, logs):
+    """Résultat d'une vérification: "ok", ou l'étape en échec ("build" ou "tests")."""
+    stages = docker_utils.parse_stage_results(logs)
+    if not stages.get('build', (False, None))[0]:
+        return "build"
+    if not (success and stages.get('tests', (False, None))[0]):
+        return "tests"
+    return "ok"
+
+def is_failure(status):
+    """Vérifie si un résultat de verify_trees est un échec."""
+    return status not in ("ok", "cached")
+
+def verify_trees(args, commits, max_workers):
+    """Vérifie les arbres distincts de commits [(hash, arbre, sujet)] en parallèle.
+
+    Les arbres déjà validés (cache) ne sont pas revérifiés, et un arbre partagé par
+    plusieurs commits n'est vérifié qu'une fois. Les réussites sont enregistrées dans le cache.
+    Retourne {arbre: (statut, logs)}, statut valant "ok", "cached", "build" ou "tests".
+    """
+    environment_hash = cache_utils.get_environment_hash()
+    results = {}
+    pending = OrderedDict()
+    for sha, tree, _ in commits:
+        if tree in results or tree in pending:
+            continue
+        if cache_utils.lookup(cache_utils.get_cache_key(tree, environment_hash)):
+            results[tree] = ("cached", "")
+        else:
+            pending[tree] = sha
+    if not pending:
+        return results
+
+    print(f"🐳  Vérification de {len(pending)} arbre(s) distinct(s) "
+          f"({min(max_workers, len(pending))} en parallèle)...")
+    outcomes = push.run_many(args, [(None, sha) for sha in pending.values()], max_workers)
+    for (tree, sha), (success, logs) in zip(pending.items(), outcomes):
+        status = get_status(success, logs)
+        results[tree] = (status, logs)
+        if status == "ok":
+            cache_utils.record(cache_utils.get_cache_key(tree, environment_hash), sha)
+    return results
+
+def print_table(revision_range, commits, results):
+    """Affiche le résultat de chaque commit, du plus ancien au plus récent."""
+    print(f"\n📋  {revision_range}: {len(commits)} commit(s), {len(set(tree for _, tree, _ in commits))} arbre(s)")
+    first_commit = {}
+    for sha, tree, subject in commits:
+        status = results[tree][0]
+        note = ""
+        if tree in first_commit:
+            note = f" (même arbre que {first_commit[tree][:12]})"
+        else:
+            first_commit[tree] = sha
+        if len(subject) > 60:
+            subject = subject[:57] + "..."
+        print(f"   {STATUS_LABELS[status]}  {sha[:12]}  {subject}{note}")
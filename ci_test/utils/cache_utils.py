@@ -0,0 +1,149 @@
+"""
+Utilitaires pour le cache des vérifications de build
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from ci_test.utils import config_utils, image_utils
+
+_lock = threading.Lock()
+
+def get_cache_file_path():
+    """Récupère le chemin du fichier de cache des vérifications."""
+    return config_utils.get_config_dir() / "verify_cache.json"
+
+def get_entrypoint_path():
+    """Récupère le chemin de entrypoint.py à la racine du projet ci_test."""
+    package_dir = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return os.path.join(package_dir, "entrypoint.py")
+
+def hash_file(path):
+    """Calcule le hash sha256 d'un fichier, ou None s'il est introuvable."""
+    try:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+    except OSError:
+        return None
+
+def get_environment_hash():
+    """Calcule l'empreinte de l'environnement de vérification (image + entrypoint)."""
+    image_id = image_utils.get_image_id()
+    if image_id is None:
+        return None
+    entrypoint_hash = hash_file(get_entrypoint_path()) or ""
+    return hashlib.sha256(f"{image_id}:{entrypoint_hash}".encode()).hexdigest()[:16]
+
+def get_cache_key(tree_hash, environment_hash=None):
+    """Construit la clé de cache pour un arbre git donné.
+
+    On indexe par arbre et non par commit, car amend_commit réécrit le hash du commit.
+    """
+    if not tree_hash or not config_utils.get_setting("verify_cache", True):
+        return None
+    if environment_hash is None:
+        environment_hash = get_environment_hash()
+    if environment_hash is None:
+        return None
+    return f"{tree_hash}:{environment_hash}"
+
+def load_cache():
+    """Charge le cache depuis le fichier."""
+    cache_file = get_cache_file_path()
+    default_cache = {"entries": {}, "stats": {"hits": 0, "misses": 0}}
+
+    if not cache_file.exists():
+        return default_cache
+
+    try:
+        with open(cache_file, 'r') as f:
+            cache = json.load(f)
+        cache.setdefault("entries", {})
+        cache.setdefault("stats", {"hits": 0, "misses": 0})
+        return cache
+    except Exception:
+        return default_cache
+
+def save_cache(cache):
+    """Sauvegarde le cache de manière atomique."""
+    cache_file = get_cache_file_path()
+    tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_file, 'w') as f:
+            json.dump(cache, f, indent=2)
+        os.replace(str(tmp_file), str(cache_file))
+        return True
+    except Exception:
+        return False
+
+def prune(cache, now=None):
+    """Applique l'éviction par âge puis par taille (LRU). Retourne le nombre d'entrées supprimées."""
+    now = now or time.time()
+    entries = cache["entries"]
+    max_age = config_utils.get_setting("verify_cache_max_age_days", 30) * 86400
+    max_entries = config_utils.get_setting("verify_cache_max_entries", 500)
+    removed = 0
+
+    for key in list(entries):
+        if now - entries[key].get("last_used", 0) > max_age:
+            del entries[key]
+            removed += 1
+
+    if len(entries) > max_entries:
+        by_usage = sorted(entries, key=lambda k: entries[k].get("last_used", 0))
+        for key in by_usage[:len(entries) - max_entries]:
+            del entries[key]
+            removed += 1
+
+    return removed
+
+def lookup(key):
+    """Vérifie si une clé a déjà été validée et met à jour les statistiques."""
+    if key is None:
+        return False
+    with _lock:
+        cache = load_cache()
+        entry = cache["entries"].get(key)
+        if entry is None:
+            cache["stats"]["misses"] += 1
+        else:
+            cache["stats"]["hits"] += 1
+            entry["hits"] = entry.get("hits", 0) + 1
+            entry["last_used"] = time.time()
+        save_cache(cache)
+        return entry is not None
+
+def record(key, commit=None, branch=None):
+    """Enregistre une vérification réussie."""
+    if key is None:
+        return False
+    with _lock:
+        cache = load_cache()
+        now = time.time()
+        cache["entries"][key] = {
+            "commit": commit,
+            "branch": branch,
+            "verified_at": now,
+            "last_used": now,
+            "hits": 0
+        }
+        prune(cache, now)
+        return save_cache(cache)
+
+def get_stats():
+    """Applique l'éviction et retourne (statistiques, nombre d'entrées, entrées évincées)."""
+    with _lock:
+        cache = load_cache()
+        removed = prune(cache)
+        save_cache(cache)
+        return cache["stats"], len(cache["entries"]), removed
+
+def clear():
+    """Vide le cache et remet les statistiques à zéro."""
+    with _lock:
+        return save_cache({"entries": {}, "stats": {"hits": 0, "misses": 0}})
@@ -6,19 +6,51 @@ import os
 import json
 from pathlib import Path
 
-def get_config_file_path():
-    """Récupère le chemin du fichier de configuration."""
+def get_config_dir():
+    """Récupère le répertoire de données de ci_test."""
     # Utiliser le répertoire home de l'utilisateur
     home_dir = Path.home()
     config_dir = home_dir / ".ci_test"
     config_dir.mkdir(exist_ok=True)
-    return config_dir / "config.json"
+    return config_dir
+
+def get_config_file_path():
+    """Récupère le chemin du fichier de configuration."""
+    return get_config_dir() / "config.json"
 
 def load_config():
     """Charge la configuration depuis le fichier."""
     config_file = get_config_file_path()
     default_config = {
-        "delete_merged_branches": False  # Par défaut, ne pas supprimer les branches mergées
+        "delete_merged_branches": False,  # Par défaut, ne pas supprimer les branches mergées
+        "verify_cache": True,  # Réutiliser les vérifications d'un arbre déjà validé
+        "verify_cache_max_entries": 500,
+        "verify_cache_max_age_days": 30,
+        "runner": "cold",  # cold: docker run --rm par étape | warm: pool de conteneurs + docker exec | distributed: docker_hosts
+        "warm_pool_size": 2,
+        "warm_pool_idle_timeout": 900,  # Secondes d'inactivité avant l'arrêt d'un conteneur chaud
+        "docker_hosts": None,  # Hôtes du runner distributed: URL de démon, contexte docker, "local" ou "process"
+        "docker_host_timeout": 10,  # Secondes avant de considérer un hôte injoignable
+        "verify_jobs": 4,  # Vérifications simultanées de ci_test verify
+        "ccache": False,  # Cache de compilation persistant (volume Docker)
+        "ccache_volume": "ci_test_ccache",
+        "ccache_max_size": "5G",
+        "make_jobs": "auto",  # auto: CPU disponibles dans le conteneur (quota cgroup inclus)
+        "docker_cpus": None,  # Limite --cpus des conteneurs (ex: 4 ou "2.5")
+        "docker_memory": None,  # Limite --memory des conteneurs (ex: "8g")
+        "archive_compression": "none",  # none, gzip ou zstd pour l'archive envoyée au conteneur
+        "workspace_sync": "full",  # full: archive complète | delta: espace de travail persistant par branche
+        "workspace_tmpfs": False,  # Taille du tmpfs monté sur /workspace (ex: "2g"), false: disque du conteneur
+        "log_tail_kb": 256,  # Fin des logs conservée pour le rapport d'échec
+        "release_scheme": "major",  # major: X.0 | minor: X.Y | patch: X.Y.Z
+        "release_tag_prefix": "",  # Préfixe des tags de release (ex: "v")
+        "release_log_scan_limit": 1000,  # Commits de main parcourus si aucun tag de release n'existe
+        "test_shards": 0,  # Tests Criterion répartis sur N processus (0: désactivé, "auto": un par CPU)
+        "syntax_preflight": False,  # Compile en -fsyntax-only les fichiers modifiés avant le build complet
+        "test_impact": False,  # N'exécute que les tests dont les dépendances ont été modifiées
+        "test_impact_full_every": 10,  # Exécutions partielles avant une exécution complète (0: jamais)
+        "ssh_multiplexing": True,  # Une seule connexion SSH au remote, partagée par tous les git fetch/push d'une commande
+        "image_refresh": "auto"  # Image ci_image obsolète: auto (reconstruction), refuse ou off
     }
 
     if not config_file.exists():
@@ -53,6 +85,18 @@ def set_setting(key, value):
     config[key] = value
     return save_config(config)
 
+def parse_value(value):
+    """Convertit une valeur saisie en ligne de commande (booléen, entier ou chaîne)."""
+    lowered = value.strip().lower()
+    if lowered in ('true', 'yes', 'on'):
+        return True
+    if lowered in ('false', 'no', 'off'):
+        return False
+    try:
+        return int(lowered)
+    except ValueError:
+        return value.strip()
+
 def should_delete_merged_branches():
     """Vérifie si les branches mergées doivent être supprimées."""
     return get_setting("delete_merged_branches", False)
@@ -2,46 +2,375 @@
 Utilitaires pour interagir avec Docker
 """
 
+import hashlib
+import shutil
 import subprocess
-import os
 import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from ci_test.utils import config_utils, hosts_utils, image_utils, pool_utils, shard_utils, trace_utils
 
-def run_container(tarball_path, debug_mode, type='build'):
-    """Exécute le conteneur Docker avec le tarball monté."""
+# Préfixe des lignes de contrôle émises par entrypoint.py
+MARKER_PREFIX = '::ci_test::'
+
+# Volume Docker contenant un espace de travail persistant par dépôt et par branche
+WORKSPACES_VOLUME = "ci_test_workspaces"
+WORKSPACES_MOUNT = "/workspaces"
+
+# Taille du tmpfs /workspace lorsque workspace_tmpfs vaut true
+DEFAULT_TMPFS_SIZE = "2g"
+
+ARCHIVE_CHUNK_SIZE = 1024 * 1024
+HEARTBEAT_INTERVAL = 10
+_archive_lock = threading.Lock()
+
+# Runners enregistrés en plus de cold et warm (ex: runner factice des benchmarks)
+_runners = {}
+
+def get_run_options():
+    """Options docker run communes à tous les conteneurs de vérification (volumes, etc.)."""
+    options = []
+    # Limites de ressources: plusieurs développeurs partagent la même machine de build
+    cpus = config_utils.get_setting("docker_cpus", None)
+    if cpus:
+        options.extend(['--cpus', str(cpus)])
+    memory = config_utils.get_setting("docker_memory", None)
+    if memory:
+        options.extend(['--memory', str(memory)])
+    if config_utils.get_setting("ccache", False):
+        volume = config_utils.get_setting("ccache_volume", "ci_test_ccache")
+        options.extend(['-v', f"{volume}:/ccache"])
+    if uses_persistent_workspace():
+        options.extend(['-v', f"{WORKSPACES_VOLUME}:{WORKSPACES_MOUNT}"])
+    else:
+        tmpfs_size = get_tmpfs_size()
+        if tmpfs_size:
+            # exec: les binaires compilés et les tests sont exécutés depuis /workspace
+            options.extend(['--tmpfs', f"/workspace:rw,exec,size={tmpfs_size}"])
+    return options
+
+def uses_persistent_workspace():
+    """Vérifie si les vérifications utilisent un espace de travail persistant (workspace_sync=delta).
+
+    Le volume des espaces de travail est propre à chaque démon: la synchronisation delta
+    n'est pas utilisée avec le runner distributed.
+    """
+    return config_utils.get_setting("workspace_sync", "full") == "delta" and \
+        config_utils.get_setting("runner", "cold") != "distributed"
+
+def get_tmpfs_size():
+    """Taille du tmpfs monté sur /workspace (workspace_tmpfs), ou None s'il est désactivé."""
+    size = config_utils.get_setting("workspace_tmpfs", False)
+    if size is True:
+        return DEFAULT_TMPFS_SIZE
+    return str(size) if size else None
+
+def get_options_hash(run_options):
+    """Empreinte des options docker run, pour détecter les conteneurs chauds obsolètes."""
+    return hashlib.sha256("\0".join(run_options).encode()).hexdigest()[:12]
+
+def get_make_jobs():
+    """Nombre de jobs make (make_jobs), ou None pour auto (valeur invalide comprise)."""
+    jobs = config_utils.get_setting("make_jobs", "auto")
+    if jobs == "auto":
+        return None
+    try:
+        return max(1, int(jobs))
+    except (TypeError, ValueError):
+        return None
+
+def get_entrypoint_options(debug_mode, compression='none'):
+    """Arguments passés à entrypoint.py selon la configuration."""
+    options = [
+        f"--verbose={str(debug_mode).lower()}",
+        '--archive', '-',
+        '--compression', compression,
+        '--log-tail-kb', str(int(config_utils.get_setting("log_tail_kb", 256))),
+    ]
+    jobs = get_make_jobs()
+    if jobs is not None:
+        options.extend(['--jobs', str(jobs)])
+    if config_utils.get_setting("ccache", False):
+        options.extend([
+            '--ccache',
+            '--ccache-dir', '/ccache',
+            '--ccache-max-size', str(config_utils.get_setting("ccache_max_size", "5G")),
+        ])
+    # Le répertoire de travail est jetable (docker run --rm, ou vidé par --reset dans le pool), ou
+    # remis dans l'état synchronisé par l'entrypoint (workspace_sync=delta): make fclean est inutile
+    options.append('--skip-clean')
+    if trace_utils.is_enabled():
+        options.append('--trace')
+    return options + shard_utils.get_entrypoint_options()
+
+def register_runner(name, runner):
+    """Enregistre un runner sélectionnable avec le paramètre runner.
+
+    runner(archive, type, entrypoint_options, echo, heartbeat_label) retourne (succès, logs)
+    comme run_cold_container, avec les mêmes marqueurs d'étapes dans les logs.
+    """
+    _runners[name] = runner
+
+def ensure_runner_image():
+    """Vérifie l'image ci_image si le runner configuré l'utilise. Retourne (succès, erreur).
+
+    Avec le runner distributed, l'image n'est vérifiée que si l'hôte choisi utilise Docker
+    (voir run_distributed): l'hôte "process" fonctionne sans Docker.
+    """
+    if config_utils.get_setting("runner", "cold") in _runners or \
+            config_utils.get_setting("runner", "cold") == "distributed":
+        return True, ""
+    return image_utils.ensure_image()
+
+def run_container(archive, compression, debug_mode, type='build', extra_options=None, quiet=False):
+    """Exécute une étape de vérification avec le runner configuré (cold, warm, distributed ou enregistré).
+
+    L'archive (voir git_utils.create_archive) est transmise au conteneur sur stdin;
+    elle peut être réutilisée pour plusieurs étapes. Avec quiet, rien n'est affiché
+    pendant l'exécution (vérifications lancées en parallèle).
+    """
+    entrypoint_options = get_entrypoint_options(debug_mode, compression) + (extra_options or [])
+    echo = debug_mode and not quiet
+    heartbeat_label = None if quiet else "Vérification en cours"
+    runner = config_utils.get_setting("runner", "cold")
+    image_ready, image_error = ensure_runner_image()
+    if not image_ready:
+        return False, image_error
+    if runner in _runners:
+        return _runners[runner](archive, type, entrypoint_options, echo, heartbeat_label)
+    if runner == "distributed":
+        return run_distributed(archive, type, entrypoint_options, echo, heartbeat_label)
+    if runner == "warm":
+        image_id = image_utils.get_image_id()
+        run_options = get_run_options()
+        name, lock_file = pool_utils.acquire(image_id, run_options, get_options_hash(run_options)) \
+            if image_id else (None, None)
+        if name is not None:
+            try:
+                return run_with_archive(pool_utils.get_job_command(name, type, entrypoint_options), archive,
+                                        echo=echo, heartbeat_label=heartbeat_label)
+            finally:
+                pool_utils.release(lock_file)
+        # Aucun conteneur chaud disponible: repli sur un conteneur éphémère
+    return run_cold_container(archive, type, entrypoint_options, echo, heartbeat_label)
+
+def run_cold_container(archive, type, entrypoint_options, echo=False, heartbeat_label="Vérification en cours"):
+    """Exécute l'étape dans un conteneur éphémère (docker run --rm)."""
+    cmd = [
+        'docker', 'run', '-i', '--rm',
+    ] + get_run_options() + [
+        image_utils.IMAGE_NAME,
+        type,
+    ] + entrypoint_options
+    return run_with_archive(cmd, archive, echo=echo, heartbeat_label=heartbeat_label)
+
+def run_distributed(archive, type, entrypoint_options, echo=False, heartbeat_label="Vérification en cours"):
+    """Exécute l'étape sur l'hôte le moins chargé de docker_hosts, puis sur un autre s'il est injoignable."""
+    tried = set()
+    while True:
+        host = hosts_utils.acquire(exclude=tried)
+        if host is None:
+            return False, "🚨  Aucun hôte de build joignable (docker_hosts)"
+        tried.add(host)
+        try:
+            if host == hosts_utils.PROCESS_HOST:
+                return run_in_process(archive, type, entrypoint_options, echo, heartbeat_label)
+            image, image_error = get_host_image(host)
+            if image is None:
+                success, logs = False, image_error
+            else:
+                cmd = hosts_utils.get_docker_command(host) + [
+                    'run', '-i', '--rm', '--label', f"{hosts_utils.JOB_LABEL}=1",
+                ] + get_run_options() + [
+                    image,
+                    type,
+                ] + entrypoint_options
+                success, logs = run_with_archive(cmd, archive, echo=echo, heartbeat_label=heartbeat_label,
+                                                 label=host)
+        finally:
+            hosts_utils.release(host)
+        if success or not hosts_utils.is_connection_error(logs):
+            return success, logs
+        hosts_utils.mark_unreachable(host)
+        print(f"⚠️   Warn: Hôte {host} injoignable, nouvel essai sur un autre hôte")
+
+def get_host_image(host):
+    """Image à lancer sur un hôte Docker: l'image locale est vérifiée (une fois par commande),
+    puis transférée à l'hôte si besoin. Retourne (référence de l'image, erreur)."""
+    image_ready, image_error = image_utils.ensure_image()
+    if not image_ready:
+        return None, image_error
+    return hosts_utils.ensure_image(host)
+
+def run_in_process(archive, type, entrypoint_options, echo=False, heartbeat_label="Vérification en cours"):
+    """Exécute l'étape sans Docker, dans un processus local (hôte "process" de docker_hosts)."""
+    workdir = tempfile.mkdtemp(prefix="ci_test_process_")
     try:
-        # Construire la commande Docker
         cmd = [
-            'docker', 'run', '--rm',
-            '-v', f"{tarball_path}:/mnt/",
-            'ci_image',
+            sys.executable, image_utils.get_entrypoint_path(),
             type,
-            f"--verbose={str(debug_mode).lower()}",
-        ]
-        # Exécuter la commande
-        result = subprocess.run(
+        ] + entrypoint_options + ['--workdir', workdir]
+        return run_with_archive(cmd, archive, echo=echo, heartbeat_label=heartbeat_label,
+                                label=hosts_utils.PROCESS_HOST)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def iter_archive_chunks(archive, chunk_size=ARCHIVE_CHUNK_SIZE):
+    """Lit l'archive depuis le début, par morceaux; sûr si plusieurs étapes la lisent en parallèle."""
+    offset = 0
+    while True:
+        with _archive_lock:
+            archive.seek(offset)
+            chunk = archive.read(chunk_size)
+        if not chunk:
+            return
+        offset += len(chunk)
+        yield chunk
+
+def feed_archive(process, archive):
+    """Écrit l'archive sur le stdin du processus puis le ferme."""
+    try:
+        for chunk in iter_archive_chunks(archive):
+            process.stdin.write(chunk)
+    except (BrokenPipeError, OSError):
+        # Le conteneur s'est arrêté avant la fin de la lecture (erreur rapportée dans les logs)
+        pass
+    finally:
+        try:
+            process.stdin.close()
+        except OSError:
+            pass
+
+class LogTail:
+    """Conserve les derniers Ko de logs d'un conteneur (les lignes de contrôle ne sont jamais évincées)."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lines = deque()
+        self.size = 0
+        self.pinned = []
+        self.dropped = 0
+
+    def append(self, line):
+        self.lines.append(line)
+        self.size += len(line) + 1
+        while self.size > self.max_bytes and len(self.lines) > 1:
+            evicted = self.lines.popleft()
+            self.size -= len(evicted) + 1
+            if evicted.startswith(MARKER_PREFIX):
+                # Les marqueurs évincés sont tous antérieurs aux lignes restantes: l'ordre est conservé
+                self.pinned.append(evicted)
+            else:
+                self.dropped += 1
+
+    def getvalue(self):
+        lines = list(self.pinned)
+        if self.dropped:
+            lines.append(f"[... {self.dropped} ligne(s) de logs tronquée(s) ...]")
+        lines.extend(self.lines)
+        return "\n".join(lines)
+
+def heartbeat(stop_event, label, start_time, interval=HEARTBEAT_INTERVAL):
+    """Affiche périodiquement la durée écoulée tant que stop_event n'est pas positionné."""
+    interactive = sys.stdout.isatty()
+    printed = False
+    while not stop_event.wait(interval):
+        elapsed = int(time.time() - start_time)
+        if interactive:
+            print(f"\r⏳  {label}... {elapsed}s", end='', flush=True)
+        else:
+            print(f"⏳  {label}... {elapsed}s", flush=True)
+        printed = True
+    if printed and interactive:
+        print()
+
+def run_with_archive(cmd, archive, echo=False, heartbeat_label="Vérification en cours", label=None):
+    """Exécute une commande docker en lui fournissant l'archive sur stdin. Retourne (succès, logs).
+
+    Les logs sont lus au fil de l'eau: affichés en direct si echo est vrai, sinon une
+    indication de progression est affichée (sauf si heartbeat_label vaut None).
+    Seuls les derniers log_tail_kb Ko sont conservés pour le rapport d'échec.
+    """
+    tail = LogTail(int(config_utils.get_setting("log_tail_kb", 256)) * 1024)
+    stop_event = threading.Event()
+    start_time = time.time()
+    first_output = None
+    try:
+        process = subprocess.Popen(
             cmd,
+            stdin=subprocess.PIPE,
             stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=False,
-            universal_newlines=True
+            stderr=subprocess.STDOUT
         )
+        feeder = threading.Thread(target=feed_archive, args=(process, archive), daemon=True)
+        feeder.start()
+        if not echo and heartbeat_label is not None:
+            threading.Thread(
+                target=heartbeat, args=(stop_event, heartbeat_label, time.time()), daemon=True
+            ).start()
 
-        # Combiner stdout et stderr pour les logs
-        logs = result.stdout + "\n" + result.stderr
+        # stdout et stderr sont combinés dans l'ordre d'émission pour les logs
+        for raw_line in process.stdout:
+            if first_output is None:
+                # Démarrage du conteneur (ou du docker exec) jusqu'à la première sortie
+                first_output = time.time()
+                trace_utils.add_span('docker.startup', start_time, first_output, 'docker')
+            line = raw_line.decode(errors='replace').rstrip('\n')
+            tail.append(line)
+            if echo and not line.startswith(MARKER_PREFIX):
+                print(line, flush=True)
+        process.stdout.close()
+        feeder.join()
         # Retourner le succès (code 0) et les logs
-        return result.returncode == 0, logs
+        success = process.wait() == 0
+        logs = tail.getvalue()
+        trace_utils.add_container_spans(parse_markers(logs), label or cmd[1])
+        return success, logs
     except Exception as e:
         return False, str(e)
+    finally:
+        stop_event.set()
+        trace_utils.add_span('docker.run', start_time, time.time(), 'docker')
 
-def check_image_exists():
-    """Vérifie si l'image Docker existe déjà."""
-    try:
-        result = subprocess.run(
-            ['docker', 'image', 'inspect', 'ci_image'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=False
-        )
-        return result.returncode == 0
-    except Exception:
-        return False
+def parse_markers(logs):
+    """Extrait les lignes de contrôle des logs. Retourne une liste de (type, [champs])."""
+    markers = []
+    for line in logs.splitlines():
+        if line.startswith(MARKER_PREFIX):
+            fields = line[len(MARKER_PREFIX):].split()
+            if fields:
+                markers.append((fields[0], fields[1:]))
+    return markers
+
+def get_ccache_stats(logs):
+    """Récupère les statistiques ccache rapportées par l'entrypoint. Retourne (hits, misses) ou None."""
+    for kind, fields in parse_markers(logs):
+        if kind == 'ccache' and len(fields) == 2:
+            try:
+                return int(fields[0]), int(fields[1])
+            except ValueError:
+                return None
+    return None
+
+def parse_stage_results(logs):
+    """Découpe les logs par étape. Retourne un OrderedDict étape -> (succès, logs)."""
+    stages = OrderedDict()
+    current = None
+    buffer = []
+    for line in logs.splitlines():
+        if line.startswith(MARKER_PREFIX):
+            fields = line[len(MARKER_PREFIX):].split()
+            if len(fields) >= 2 and fields[0] == 'stage-begin':
+                current = fields[1]
+                buffer = []
+            elif len(fields) >= 3 and fields[0] == 'stage-end' and fields[1] == current:
+                stages[current] = (fields[2] == 'ok', "\n".join(buffer))
+                current = None
+            continue
+        buffer.append(line)
+    if current is not None:
+        # Étape interrompue sans marqueur de fin (crash du conteneur, timeout...)
+        stages[current] = (False, "\n".join(buffer))
+    return stages
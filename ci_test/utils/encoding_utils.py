@@ -0,0 +1,25 @@
+"""
+Utilitaires pour l'encodage des données échangées avec l'entrypoint
+
+Les listes et dictionnaires passés en argument de l'entrypoint (--syntax-check, --test-impact,
+--test-durations) ou rapportés dans ses marqueurs (test-deps) sont du JSON compressé zlib, en base64.
+"""
+
+import base64
+import json
+import zlib
+
+# Au-delà, la valeur n'est pas transmise (le noyau limite chaque argument de commande à 128 Kio)
+MAX_ENCODED_SIZE = 96 * 1024
+
+def encode(value, max_size=MAX_ENCODED_SIZE):
+    """Encode une valeur JSON pour un argument de l'entrypoint. Retourne None si elle dépasse max_size."""
+    encoded = base64.b64encode(zlib.compress(json.dumps(value).encode())).decode()
+    return encoded if len(encoded) <= max_size else None
+
+def decode(encoded):
+    """Décode une valeur transmise par l'entrypoint, ou None si elle est invalide."""
+    try:
+        return json.loads(zlib.decompress(base64.b64decode(encoded)).decode())
+    except Exception:
+        return None
@@ -2,37 +2,88 @@
 Utilitaires pour interagir avec Git
 """
 
+import shutil
 import subprocess
 import os
+import tempfile
+from ci_test.utils import session_utils, ssh_utils, trace_utils
+
+# Taille au-delà de laquelle l'archive du projet est écrite sur disque (hors du dépôt)
+ARCHIVE_SPOOL_SIZE = 64 * 1024 * 1024
 
 def verify_head():
     """Vérifie que HEAD existe."""
-    try:
-        result = subprocess.run(
-            ['git', 'rev-parse', '--verify', 'HEAD'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=False
-        )
-        return result.returncode == 0
-    except Exception:
-        return False
-
-def create_tarball(output_path):
-    """Crée un tarball du dernier commit."""
-    try:
-        with open(output_path, 'wb') as f:
-            result = subprocess.run(
-                ['git', 'archive', '--format=tar', 'HEAD'],
-                stdout=f,
-                stderr=subprocess.PIPE,
-                check=True
+    return get_head_hash() is not None
+
+def get_toplevel():
+    """Récupère la racine du dépôt courant."""
+    session = session_utils.get_session()
+    return session.toplevel if session else None
+
+def get_head_hash():
+    """Récupère le hash du commit HEAD."""
+    session = session_utils.get_session()
+    return session.resolve('HEAD^{commit}') if session else None
+
+def get_tree_hash(rev='HEAD'):
+    """Récupère le hash de l'arbre (tree) d'un commit."""
+    session = session_utils.get_session()
+    return session.resolve(f'{rev}^{{tree}}') if session else None
+
+def resolve_commit(rev):
+    """Résout une révision en hash de commit, ou None."""
+    session = session_utils.get_session()
+    return session.resolve(f'{rev}^{{commit}}') if session else None
+
+@trace_utils.traced('git.archive')
+def create_archive(rev='HEAD', compression='none'):
+    """Crée l'archive tar d'un commit (ou d'un arbre) en mémoire, sans écrire dans le répertoire de travail.
+
+    L'archive déborde dans un fichier temporaire au-delà de ARCHIVE_SPOOL_SIZE.
+    Retourne (archive positionnée au début, compression effective) ou (None, erreur).
+    """
+    archive = tempfile.SpooledTemporaryFile(max_size=ARCHIVE_SPOOL_SIZE)
+    try:
+        if compression == 'zstd' and shutil.which('zstd') is None:
+            # zstd absent sur l'hôte: gzip est toujours disponible via git archive
+            compression = 'gzip'
+
+        if compression == 'gzip':
+            cmd = ['git', 'archive', '--format=tar.gz', rev]
+        else:
+            cmd = ['git', 'archive', '--format=tar', rev]
+
+        archiver = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        output = archiver.stdout
+        compressor = None
+        if compression == 'zstd':
+            compressor = subprocess.Popen(
+                ['zstd', '-q', '-c', '-T0'],
+                stdin=archiver.stdout,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE
             )
-        return os.path.exists(output_path) and os.path.getsize(output_path) > 0
-    except Exception:
-        return False
+            archiver.stdout.close()
+            output = compressor.stdout
+
+        shutil.copyfileobj(output, archive)
+        output.close()
 
-def amend_commit():
+        if archiver.wait() != 0:
+            archive.close()
+            return None, archiver.stderr.read().decode(errors='replace').strip()
+        if compressor is not None and compressor.wait() != 0:
+            archive.close()
+            return None, compressor.stderr.read().decode(errors='replace').strip()
+
+        archive.seek(0)
+        return archive, compression if compression in ('gzip', 'zstd') else 'none'
+    except Exception as e:
+        archive.close()
+        return None, str(e)
+
+@trace_utils.traced('git.amend')
+def amend_commit(cwd=None):
     """Amende le dernier commit pour ajouter le tag CI:Ok."""
     try:
         # Récupérer le message du dernier commit
@@ -41,7 +92,8 @@ def amend_commit():
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             check=True,
-            universal_newlines=True
+            universal_newlines=True,
+            cwd=cwd
         )
         commit_msg = result.stdout.strip()
 
@@ -54,21 +106,25 @@ def amend_commit():
             ['git', 'commit', '--amend', '--allow-empty', '--only', '-m', new_msg],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            check=True
+            check=True,
+            cwd=cwd
         )
         return True
     except Exception:
         return False
 
-def push():
+@trace_utils.traced('git.push')
+def push(cwd=None):
     """Pousse les modifications vers le dépôt distant."""
     try:
+        ssh_utils.wait_ready()
         result = subprocess.run(
             ['git', 'push'],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             check=False,
-            universal_newlines=True
+            universal_newlines=True,
+            cwd=cwd
         )
 
         if result.returncode != 0:
@@ -77,15 +133,18 @@ def push():
     except Exception as e:
         return False, str(e)
 
-def force_push():
+@trace_utils.traced('git.push --force')
+def force_push(cwd=None):
     """Force le push des modifications vers le dépôt distant."""
     try:
+        ssh_utils.wait_ready()
         result = subprocess.run(
             ['git', 'push', '--force'],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             check=False,
-            universal_newlines=True
+            universal_newlines=True,
+            cwd=cwd
         )
 
         if result.returncode != 0:
@@ -94,9 +153,11 @@ def force_push():
     except Exception as e:
         return False, str(e)
 
+@trace_utils.traced('git.clone')
 def clone(url):
     """Clone le dépôt distant."""
     try:
+        ssh_utils.wait_ready()
         result = subprocess.run(
             ['git', 'clone', url],
             stdout=subprocess.PIPE,
@@ -113,29 +174,12 @@ def clone(url):
 
 def has_head():
     """Vérifie si HEAD existe dans le dépôt."""
-    try:
-        result = subprocess.run(
-            ['git', 'rev-parse', '--verify', 'HEAD'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=False
-        )
-        return result.returncode == 0
-    except Exception:
-        return False
+    return get_head_hash() is not None
 
 def has_remote():
     """Vérifie si le dépôt a un remote."""
-    try:
-        result = subprocess.run(
-            ['git', 'remote', '-v'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=False
-        )
-        return result.returncode == 0 and bool(result.stdout)
-    except Exception:
-        return False
+    session = session_utils.get_session()
+    return bool(session and session.remotes())
 
 def has_remote_branches():
     """Vérifie si le dépôt a des branches distantes."""
@@ -150,6 +194,7 @@ def has_remote_branches():
     except Exception:
         return False
 
+@trace_utils.traced('git.init_branch')
 def init_empty_branch(name):
     """Initialise une nouvelle branche vide"""
     try:
@@ -164,6 +209,7 @@ def init_empty_branch(name):
         if result.returncode != 0:
             return False, result.stderr.strip()
 
+        ssh_utils.wait_ready()
         result = subprocess.run(
             ['git', 'push'],
             stdout=subprocess.PIPE,
@@ -179,6 +225,7 @@ def init_empty_branch(name):
     except Exception as e:
         return False, str(e)
 
+@trace_utils.traced('git.create_branch')
 def create_branch(name, orphan=False):
     """Crée une nouvelle branche"""
     try:
@@ -205,31 +252,16 @@ def create_branch(name, orphan=False):
 
 def get_current_branch():
     """Récupère le nom de la branche courante."""
-    try:
-        result = subprocess.run(
-            ['git', 'rev-parse', '--abbrev-ref', 'HEAD'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=False,
-            universal_newlines=True
-        )
-        if result.returncode == 0:
-            return result.stdout.strip()
-        return None
-    except Exception:
-        return None
+    session = session_utils.get_session()
+    return session.current_branch() if session else None
 
+@trace_utils.traced('git.branch_exists')
 def branch_exists(remote, branch_name):
     """Vérifie si une branche existe localement ou à distance."""
     try:
         # Vérifier si la branche existe localement
-        local_result = subprocess.run(
-            ['git', 'show-ref', '--verify', f'refs/heads/{branch_name}'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=False
-        )
-        if local_result.returncode == 0:
+        session = session_utils.get_session()
+        if session and session.resolve(f'refs/heads/{branch_name}'):
             return True
 
         # Essayer de récupérer la branche distante
@@ -242,9 +274,18 @@ def branch_exists(remote, branch_name):
 
 def fetch_branch(remote, branch):
     """Met à jour une branche locale à partir d'une branche distante."""
+    return fetch_branches(remote, [branch])
+
+@trace_utils.traced('git.fetch')
+def fetch_branches(remote, branches):
+    """Met à jour plusieurs références distantes en un seul git fetch (une seule connexion).
+
+    Échoue entièrement si l'une des branches n'existe pas sur le remote.
+    """
     try:
+        ssh_utils.wait_ready()
         result = subprocess.run(
-            ['git', 'fetch', remote, branch],
+            ['git', 'fetch', remote] + list(branches),
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             check=False,
@@ -256,9 +297,11 @@ def fetch_branch(remote, branch):
     except Exception as e:
         return False, str(e)
 
+@trace_utils.traced('git.push')
 def push_branch(remote, branch, set_upstream=True):
     """Pousse une branche vers le dépôt distant."""
     try:
+        ssh_utils.wait_ready()
         cmd = ['git', 'push']
         if set_upstream:
             cmd.extend(['-u'])
@@ -277,22 +320,37 @@ def push_branch(remote, branch, set_upstream=True):
     except Exception as e:
         return False, str(e)
 
-def is_rebase_in_progress():
-    """Vérifie si un rebase est en cours."""
+@trace_utils.traced('git.push refs')
+def push_refs(remote, refs):
+    """Pousse plusieurs références (branches, tags) en un seul git push (une seule connexion)."""
     try:
-        git_dir = subprocess.run(
-            ['git', 'rev-parse', '--git-dir'],
+        ssh_utils.wait_ready()
+        result = subprocess.run(
+            ['git', 'push', remote] + list(refs),
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             check=False,
             universal_newlines=True
-        ).stdout.strip()
+        )
+        if result.returncode != 0:
+            return False, result.stderr.strip()
+        return True, ""
+    except Exception as e:
+        return False, str(e)
 
+def is_rebase_in_progress():
+    """Vérifie si un rebase est en cours."""
+    try:
+        session = session_utils.get_session()
+        if session is None:
+            return False
+        git_dir = session.git_dir
         return os.path.exists(os.path.join(git_dir, "rebase-apply")) or \
                os.path.exists(os.path.join(git_dir, "rebase-merge"))
     except Exception:
         return False
 
+@trace_utils.traced('git.rebase --continue')
 def rebase_continue():
     """Continue un rebase en cours."""
     try:
@@ -309,7 +367,8 @@ def rebase_continue():
     except Exception as e:
         return False, str(e)
 
-def rebase_branch(target_branch):
+@trace_utils.traced('git.rebase')
+def rebase_branch(target_branch, cwd=None):
     """Rebase la branche courante sur une branche cible."""
     try:
         result = subprocess.run(
@@ -317,6 +376,24 @@ def rebase_branch(target_branch):
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             check=False,
+            universal_newlines=True,
+            cwd=cwd
+        )
+        if result.returncode != 0:
+            return False, result.stderr.strip()
+        return True, ""
+    except Exception as e:
+        return False, str(e)
+
+@trace_utils.traced('git.rebase --onto')
+def rebase_onto(new_base, upstream):
+    """Rejoue les commits de la branche courante postérieurs à upstream sur new_base."""
+    try:
+        result = subprocess.run(
+            ['git', 'rebase', '--onto', new_base, upstream],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
             universal_newlines=True
         )
         if result.returncode != 0:
@@ -325,19 +402,65 @@ def rebase_branch(target_branch):
     except Exception as e:
         return False, str(e)
 
-def is_ancestor(potential_ancestor, branch):
-    """Vérifie si potential_ancestor est un ancêtre de branch."""
+def rebase_abort(cwd=None):
+    """Annule un rebase en cours."""
     try:
         result = subprocess.run(
-            ['git', 'merge-base', '--is-ancestor', potential_ancestor, branch],
+            ['git', 'rebase', '--abort'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+            cwd=cwd
+        )
+        return result.returncode == 0
+    except Exception:
+        return False
+
+@trace_utils.traced('git.worktree add')
+def add_worktree(branch):
+    """Extrait une branche dans un worktree temporaire, hors du dépôt.
+
+    Retourne (chemin du worktree, "") ou (None, erreur).
+    """
+    path = tempfile.mkdtemp(prefix="ci_test_worktree_")
+    try:
+        result = subprocess.run(
+            ['git', 'worktree', 'add', '--quiet', path, branch],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+            universal_newlines=True
+        )
+        if result.returncode != 0:
+            shutil.rmtree(path, ignore_errors=True)
+            return None, result.stderr.strip()
+        return path, ""
+    except Exception as e:
+        shutil.rmtree(path, ignore_errors=True)
+        return None, str(e)
+
+@trace_utils.traced('git.worktree remove')
+def remove_worktree(path):
+    """Supprime un worktree créé par add_worktree."""
+    try:
+        result = subprocess.run(
+            ['git', 'worktree', 'remove', '--force', path],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             check=False
         )
+        shutil.rmtree(path, ignore_errors=True)
         return result.returncode == 0
     except Exception:
         return False
 
+@trace_utils.traced('git.is_ancestor')
+def is_ancestor(potential_ancestor, branch):
+    """Vérifie si potential_ancestor est un ancêtre de branch."""
+    session = session_utils.get_session()
+    return session.is_ancestor(potential_ancestor, branch) if session else False
+
+@trace_utils.traced('git.checkout')
 def checkout_branch(branch):
     """Checkout une branche."""
     try:
@@ -354,6 +477,7 @@ def checkout_branch(branch):
     except Exception as e:
         return False, str(e)
 
+@trace_utils.traced('git.merge')
 def merge_branch(branch):
     """Merge une branche."""
     try:
@@ -372,20 +496,10 @@ def merge_branch(branch):
 
 def get_remote_url(remote='origin'):
     """Récupère l'URL du dépôt distant."""
-    try:
-        result = subprocess.run(
-            ['git', 'remote', 'get-url', remote],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            check=False,
-            universal_newlines=True
-        )
-        if result.returncode == 0:
-            return result.stdout.strip()
-        return None
-    except Exception:
-        return None
+    session = session_utils.get_session()
+    return session.remote_url(remote) if session else None
 
+@trace_utils.traced('git.branch -d')
 def delete_branch(branch_name, force=False):
     """Supprime une branche locale."""
     try:
@@ -409,9 +523,11 @@ def delete_branch(branch_name, force=False):
     except Exception as e:
         return False, str(e)
 
+@trace_utils.traced('git.push --delete')
 def delete_remote_branch(remote, branch_name):
     """Supprime une branche distante."""
     try:
+        ssh_utils.wait_ready()
         result = subprocess.run(
             ['git', 'push', remote, '--delete', branch_name],
             stdout=subprocess.PIPE,
@@ -425,9 +541,11 @@ def delete_remote_branch(remote, branch_name):
     except Exception as e:
         return False, str(e)
 
+@trace_utils.traced('git.pull')
 def pull_branch(branch):
     """Pull une branche depuis le remote."""
     try:
+        ssh_utils.wait_ready()
         result = subprocess.run(
             ['git', 'pull', 'origin', branch],
             stdout=subprocess.PIPE,
@@ -441,11 +559,12 @@ def pull_branch(branch):
     except Exception as e:
         return False, str(e)
 
-def remove_all_cached():
-    """Supprime tous les fichiers du cache git."""
+@trace_utils.traced('git.add')
+def add_all():
+    """Ajoute tous les fichiers au staging."""
     try:
         result = subprocess.run(
-            ['git', 'rm', '-r', '--cached', '.'],
+            ['git', 'add', '-A'],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             check=False,
@@ -457,11 +576,12 @@ def remove_all_cached():
     except Exception as e:
         return False, str(e)
 
-def clean_working_directory():
-    """Nettoie le répertoire de travail."""
+@trace_utils.traced('git.commit')
+def commit(message):
+    """Crée un commit avec le message donné."""
     try:
         result = subprocess.run(
-            ['git', 'clean', '-fdq'],
+            ['git', 'commit', '-m', message],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             check=False,
@@ -473,11 +593,19 @@ def clean_working_directory():
     except Exception as e:
         return False, str(e)
 
-def checkout_files_from_branch(branch):
-    """Checkout tous les fichiers depuis une branche."""
+@trace_utils.traced('git.commit-tree')
+def commit_tree(tree, parents, message):
+    """Crée un commit à partir d'un arbre sans toucher à l'index ni au répertoire de travail.
+
+    Retourne (True, hash du commit) ou (False, erreur).
+    """
     try:
+        cmd = ['git', 'commit-tree', tree]
+        for parent in parents:
+            cmd.extend(['-p', parent])
+        cmd.extend(['-m', message])
         result = subprocess.run(
-            ['git', 'checkout', branch, '--', '.'],
+            cmd,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             check=False,
@@ -485,15 +613,16 @@ def checkout_files_from_branch(branch):
         )
         if result.returncode != 0:
             return False, result.stderr.strip()
-        return True, ""
+        return True, result.stdout.strip()
     except Exception as e:
         return False, str(e)
 
-def add_all():
-    """Ajoute tous les fichiers au staging."""
+@trace_utils.traced('git.update-ref')
+def update_ref(ref, new_value, old_value, message):
+    """Déplace une référence si elle pointe toujours sur old_value (chaîne vide: ne doit pas exister)."""
     try:
         result = subprocess.run(
-            ['git', 'add', '-A'],
+            ['git', 'update-ref', '-m', message, ref, new_value, old_value],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             check=False,
@@ -505,11 +634,15 @@ def add_all():
     except Exception as e:
         return False, str(e)
 
-def commit(message):
-    """Crée un commit avec le message donné."""
+@trace_utils.traced('git.tag')
+def create_tag(tag_name, tag_message, target=None):
+    """Crée un tag annoté (sur HEAD par défaut)."""
     try:
+        cmd = ['git', 'tag', '-a', tag_name, '-m', tag_message]
+        if target:
+            cmd.append(target)
         result = subprocess.run(
-            ['git', 'commit', '-m', message],
+            cmd,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             check=False,
@@ -521,11 +654,13 @@ def commit(message):
     except Exception as e:
         return False, str(e)
 
-def create_tag(tag_name, tag_message):
-    """Crée un tag annoté."""
+@trace_utils.traced('git.push tag')
+def push_tag(tag_name):
+    """Push un tag vers le remote."""
     try:
+        ssh_utils.wait_ready()
         result = subprocess.run(
-            ['git', 'tag', '-a', tag_name, '-m', tag_message],
+            ['git', 'push', 'origin', tag_name],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             check=False,
@@ -537,11 +672,15 @@ def create_tag(tag_name, tag_message):
     except Exception as e:
         return False, str(e)
 
-def push_tag(tag_name):
-    """Push un tag vers le remote."""
+@trace_utils.traced('git.log')
+def get_commit_history(rev=None):
+    """Récupère l'historique des commits (de HEAD par défaut)."""
     try:
+        cmd = ['git', 'log', '--oneline']
+        if rev:
+            cmd.append(rev)
         result = subprocess.run(
-            ['git', 'push', 'origin', tag_name],
+            cmd,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             check=False,
@@ -549,22 +688,97 @@ def push_tag(tag_name):
         )
         if result.returncode != 0:
             return False, result.stderr.strip()
-        return True, ""
+        return True, result.stdout
     except Exception as e:
         return False, str(e)
 
-def get_commit_history():
-    """Récupère l'historique des commits."""
+@trace_utils.traced('git.rev-list')
+def list_commits(revision_range):
+    """Liste les commits d'une plage (ex: A..B), du plus ancien au plus récent.
+
+    Retourne (liste de (hash, arbre, sujet), erreur).
+    """
     try:
         result = subprocess.run(
-            ['git', 'log', '--oneline'],
+            ['git', 'log', '--reverse', '--format=%H%x00%T%x00%s', revision_range, '--'],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             check=False,
             universal_newlines=True
         )
         if result.returncode != 0:
-            return False, result.stderr.strip()
-        return True, result.stdout
+            return None, result.stderr.strip()
+        return [tuple(line.split('\0', 2)) for line in result.stdout.splitlines() if line], ""
     except Exception as e:
-        return False, str(e)
+        return None, str(e)
+
+@trace_utils.traced('git.merge-base')
+def get_merge_base(first, second):
+    """Récupère le meilleur ancêtre commun de deux révisions, ou None."""
+    try:
+        result = subprocess.run(
+            ['git', 'merge-base', first, second],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+            universal_newlines=True
+        )
+        if result.returncode != 0:
+            return None
+        return result.stdout.strip() or None
+    except Exception:
+        return None
+
+@trace_utils.traced('git.upstream')
+def get_upstream():
+    """Récupère la branche distante suivie par la branche courante (ex: origin/mod/x/main), ou None."""
+    try:
+        result = subprocess.run(
+            ['git', 'rev-parse', '--abbrev-ref', '--symbolic-full-name', '@{upstream}'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+            universal_newlines=True
+        )
+        if result.returncode != 0:
+            return None
+        return result.stdout.strip() or None
+    except Exception:
+        return None
+
+@trace_utils.traced('git.diff --name-only')
+def get_changed_files(base, rev='HEAD'):
+    """Liste les fichiers ajoutés ou modifiés par rev depuis son ancêtre commun avec base.
+
+    Retourne (liste de chemins relatifs à la racine du dépôt, erreur).
+    """
+    try:
+        result = subprocess.run(
+            ['git', 'diff', '--name-only', '--no-renames', '--diff-filter=d', '-z', f"{base}...{rev}", '--'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+            universal_newlines=True
+        )
+        if result.returncode != 0:
+            return None, result.stderr.strip()
+        return [path for path in result.stdout.split('\0') if path], ""
+    except Exception as e:
+        return None, str(e)
+
+@trace_utils.traced('git.diff-tree')
+def diff_trees(old_tree, new_tree):
+    """Liste les fichiers ajoutés, modifiés ou supprimés entre deux arbres. Retourne (chemins, erreur)."""
+    try:
+        result = subprocess.run(
+            ['git', 'diff-tree', '-r', '--name-only', '--no-renames', '-z', old_tree, new_tree],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+            universal_newlines=True
+        )
+        if result.returncode != 0:
+            return None, result.stderr.strip()
+        return [path for path in result.stdout.split('\0') if path], ""
+    except Exception as e:
+        return None, str(e)
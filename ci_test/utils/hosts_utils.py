@@ -0,0 +1,191 @@
+"""
+Utilitaires pour répartir les vérifications sur plusieurs hôtes Docker (runner distributed)
+"""
+
+import concurrent.futures
+import os
+import re
+import subprocess
+import threading
+from ci_test.utils import config_utils, image_utils, trace_utils
+
+# Démon Docker local (docker sans -H ni --context)
+LOCAL_HOST = "local"
+
+# Substitut sans Docker: l'entrypoint est exécuté dans un processus local
+PROCESS_HOST = "process"
+
+# Label des conteneurs de vérification, pour mesurer la charge de chaque hôte
+JOB_LABEL = "ci_test.job"
+
+# Erreurs du client docker signalant un hôte injoignable (et non un échec du build)
+CONNECTION_ERRORS = re.compile(
+    r"Cannot connect to the Docker daemon|error during connect|connection refused|"
+    r"context \S+ (?:does not exist|not found)|ssh: |no such host|i/o timeout",
+    re.IGNORECASE
+)
+
+_lock = threading.Lock()
+_cpus = {}
+_unreachable = set()
+_in_flight = {}
+_images = {}
+_image_locks = {}
+
+def get_hosts():
+    """Hôtes configurés (docker_hosts): liste ou chaîne séparée par des virgules."""
+    hosts = config_utils.get_setting("docker_hosts", None) or [LOCAL_HOST]
+    if isinstance(hosts, str):
+        hosts = hosts.split(',')
+    return [host.strip() for host in hosts if host and host.strip()]
+
+def get_docker_command(host):
+    """Commande docker ciblant un hôte: URL de démon (-H) ou nom de contexte (--context)."""
+    if host == LOCAL_HOST:
+        return ['docker']
+    if '://' in host:
+        return ['docker', '-H', host]
+    return ['docker', '--context', host]
+
+def get_timeout():
+    """Délai (en secondes) des requêtes adressées aux hôtes."""
+    return config_utils.get_setting("docker_host_timeout", 10)
+
+def _docker(host, args):
+    """Exécute une commande docker sur un hôte. Retourne (succès, sortie)."""
+    try:
+        result = subprocess.run(
+            get_docker_command(host) + args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+            universal_newlines=True,
+            timeout=get_timeout()
+        )
+        if result.returncode != 0:
+            return False, result.stderr.strip()
+        return True, result.stdout.strip()
+    except Exception as e:
+        return False, str(e)
+
+@trace_utils.traced('hosts.probe')
+def get_cpus(host):
+    """Nombre de CPU d'un hôte (mémorisé), ou None s'il est injoignable."""
+    if host in _cpus:
+        return _cpus[host]
+    if host == PROCESS_HOST:
+        cpus = os.cpu_count() or 1
+    else:
+        success, output = _docker(host, ['info', '--format', '{{.NCPU}}'])
+        cpus = int(output) if success and output.isdigit() else None
+    _cpus[host] = cpus
+    return cpus
+
+def count_running_jobs(host):
+    """Vérifications en cours sur un hôte, tous utilisateurs confondus."""
+    if host == PROCESS_HOST:
+        return 0
+    success, output = _docker(host, ['ps', '-q', '--filter', f"label={JOB_LABEL}"])
+    return len(output.split()) if success else 0
+
+def probe(host):
+    """Retourne (CPU, vérifications en cours) pour un hôte, ou None s'il est injoignable."""
+    cpus = get_cpus(host)
+    if cpus is None:
+        return None
+    return cpus, count_running_jobs(host)
+
+def acquire(exclude=()):
+    """Choisit l'hôte joignable le moins chargé et y réserve une place. Retourne None si aucun.
+
+    La charge est le nombre de vérifications en cours par CPU. Nos propres vérifications
+    apparaissent dans docker ps dès que leur conteneur démarre: le maximum avec les places
+    réservées évite de les compter deux fois tout en tenant compte de celles en cours de lancement.
+    """
+    hosts = [host for host in get_hosts() if host not in exclude and host not in _unreachable]
+    if not hosts:
+        return None
+    # Les hôtes sont interrogés en parallèle (latence ssh/tcp)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(hosts)) as executor:
+        probes = list(executor.map(probe, hosts))
+    with _lock:
+        candidates = []
+        for position, (host, result) in enumerate(zip(hosts, probes)):
+            if result is None:
+                _unreachable.add(host)
+                continue
+            cpus, running = result
+            candidates.append((max(running, _in_flight.get(host, 0)) / float(cpus), position, host))
+        if not candidates:
+            return None
+        # Choix et réservation sous le même verrou: des vérifications parallèles se répartissent
+        _, _, host = min(candidates)
+        _in_flight[host] = _in_flight.get(host, 0) + 1
+        return host
+
+def release(host):
+    """Libère la place réservée par acquire."""
+    with _lock:
+        _in_flight[host] = max(0, _in_flight.get(host, 0) - 1)
+
+def mark_unreachable(host):
+    """Écarte un hôte pour le reste de la commande."""
+    with _lock:
+        _unreachable.add(host)
+
+def is_connection_error(logs):
+    """Vérifie si l'échec vient de la connexion à l'hôte (aucune étape n'a démarré)."""
+    return '::ci_test::' not in logs and CONNECTION_ERRORS.search(logs) is not None
+
+def ensure_image(host):
+    """Image à lancer sur un hôte, transférée depuis l'hôte local une seule fois.
+
+    L'image est désignée par son tag d'empreinte (ci_image:<empreinte>): un hôte qui l'a déjà
+    n'est pas resynchronisé. Sans ce tag en local (image_refresh=off, image construite à la main),
+    l'image ci_image locale est désignée par son identifiant. Retourne (référence de l'image, erreur).
+    """
+    if host == LOCAL_HOST:
+        return image_utils.IMAGE_NAME, ""
+    inputs_hash = image_utils.get_inputs_hash()
+    image = source = image_utils.get_image_tag(inputs_hash) if inputs_hash else None
+    if image is None or image_utils.get_image_id(image) is None:
+        source = image_utils.IMAGE_NAME
+        image = image_utils.get_image_id(source)
+        if image is None:
+            return None, f"🚨  Image {source} absente de l'hôte local, impossible de la transférer vers {host}"
+    with _lock:
+        host_lock = _image_locks.setdefault(host, threading.Lock())
+    with host_lock:
+        if _images.get(host) == image:
+            return image, ""
+        present, _ = _docker(host, ['image', 'inspect', '--format', '{{.Id}}', image])
+        if not present:
+            print(f"📦  Transfert de l'image {source} vers {host}...")
+            success, error = transfer_image(source, host)
+            if not success:
+                return None, error
+        _images[host] = image
+        return image, ""
+
+@trace_utils.traced('hosts.transfer_image')
+def transfer_image(image, host):
+    """Copie une image locale vers un hôte (docker save | docker load). Retourne (succès, erreur)."""
+    try:
+        save = subprocess.Popen(['docker', 'save', image], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        load = subprocess.Popen(
+            get_docker_command(host) + ['load', '--quiet'],
+            stdin=save.stdout,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        # Seul docker load lit la sortie de docker save
+        save.stdout.close()
+        _, load_error = load.communicate()
+        _, save_error = save.communicate()
+        if save.returncode != 0:
+            return False, save_error.decode(errors='replace').strip()
+        if load.returncode != 0:
+            return False, load_error.decode(errors='replace').strip()
+        return True, ""
+    except Exception as e:
+        return False, str(e)
@@ -0,0 +1,227 @@
+"""
+Utilitaires pour gérer l'image ci_image, taguée par l'empreinte de ses fichiers de build
+"""
+
+import fcntl
+import hashlib
+import os
+import shutil
+import subprocess
+import sys
+import threading
+from ci_test.utils import config_utils, trace_utils
+
+IMAGE_NAME = "ci_image"
+
+# Fichiers (à la racine du projet ci_test) dont dépend le contenu de l'image
+BUILD_INPUTS = ("Dockerfile", "entrypoint.py")
+
+INPUTS_LABEL = "ci_test.inputs"
+
+_ensure_lock = threading.Lock()
+_ensure_result = None
+
+def get_build_context():
+    """Répertoire de build de l'image (racine du projet ci_test)."""
+    return os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def get_entrypoint_path():
+    """Chemin de entrypoint.py (exécuté directement par l'hôte "process" du runner distributed)."""
+    return os.path.join(get_build_context(), "entrypoint.py")
+
+def get_inputs_hash():
+    """Empreinte des fichiers de build, ou None si l'un d'eux est introuvable."""
+    digest = hashlib.sha256()
+    for name in BUILD_INPUTS:
+        try:
+            with open(os.path.join(get_build_context(), name), 'rb') as f:
+                content = f.read()
+        except OSError:
+            return None
+        digest.update(f"{name}\0{len(content)}\0".encode())
+        digest.update(content)
+    return digest.hexdigest()[:12]
+
+def get_image_tag(inputs_hash):
+    """Tag de l'image construite à partir de fichiers de build donnés."""
+    return f"{IMAGE_NAME}:{inputs_hash}"
+
+def get_refresh_policy():
+    """Comportement face à une image obsolète (image_refresh): auto, refuse ou off."""
+    policy = config_utils.get_setting("image_refresh", "auto")
+    # config --set convertit off/no/false en booléen
+    if policy is False:
+        return "off"
+    if policy not in ("auto", "refuse", "off"):
+        print(f"⚠️   Warn: image_refresh={policy} inconnu (auto, refuse ou off), auto utilisé")
+        return "auto"
+    return policy
+
+def get_lock_path():
+    """Verrou empêchant deux constructions simultanées de l'image."""
+    return config_utils.get_config_dir() / "image_build.lock"
+
+def get_log_path():
+    """Logs de la dernière construction en arrière-plan."""
+    return config_utils.get_config_dir() / "image_build.log"
+
+@trace_utils.traced('docker.inspect')
+def get_image_id(image=IMAGE_NAME):
+    """Récupère l'identifiant (hash de contenu) de l'image Docker."""
+    try:
+        result = subprocess.run(
+            ['docker', 'image', 'inspect', '--format', '{{.Id}}', image],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+            universal_newlines=True
+        )
+        if result.returncode == 0:
+            return result.stdout.strip()
+        return None
+    except Exception:
+        return None
+
+def get_status(inputs_hash=None):
+    """État de l'image: "fresh" (à jour), "retag" (construite mais ci_image pointe ailleurs),
+    "stale" (obsolète), "missing" (absente) ou "unknown" (fichiers de build introuvables)."""
+    inputs_hash = inputs_hash or get_inputs_hash()
+    if inputs_hash is None:
+        return "unknown"
+    current_id = get_image_id(IMAGE_NAME)
+    tagged_id = get_image_id(get_image_tag(inputs_hash))
+    if tagged_id is not None:
+        return "fresh" if tagged_id == current_id else "retag"
+    return "stale" if current_id is not None else "missing"
+
+def is_build_running():
+    """Vérifie si une construction est en cours (en arrière-plan ou dans un autre terminal)."""
+    try:
+        with open(get_lock_path(), 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return False
+    except BlockingIOError:
+        return True
+    except OSError:
+        return False
+
+def tag_image(inputs_hash):
+    """Fait pointer ci_image sur l'image déjà construite pour ces fichiers de build."""
+    try:
+        result = subprocess.run(
+            ['docker', 'tag', get_image_tag(inputs_hash), IMAGE_NAME],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+            universal_newlines=True
+        )
+        if result.returncode != 0:
+            return False, result.stderr.strip()
+        return True, ""
+    except Exception as e:
+        return False, str(e)
+
+@trace_utils.traced('docker.build')
+def build_image(echo=True):
+    """Construit l'image si ses fichiers de build ont changé. Retourne (succès, erreur).
+
+    Les couches de l'image précédente sont réutilisées (--cache-from): seules les
+    étapes du Dockerfile postérieures au premier fichier modifié sont rejouées.
+    Si une autre construction est en cours, attend sa fin au lieu de recommencer.
+    """
+    inputs_hash = get_inputs_hash()
+    if inputs_hash is None:
+        return False, f"Fichiers de build introuvables dans {get_build_context()}"
+
+    with open(get_lock_path(), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        status = get_status(inputs_hash)
+        if status == "fresh":
+            return True, ""
+        if status == "retag":
+            return tag_image(inputs_hash)
+
+        cmd = [
+            'docker', 'build',
+            '--tag', get_image_tag(inputs_hash),
+            '--tag', IMAGE_NAME,
+            '--label', f"{INPUTS_LABEL}={inputs_hash}",
+            '--build-arg', 'BUILDKIT_INLINE_CACHE=1',
+        ]
+        if status == "stale":
+            cmd.extend(['--cache-from', IMAGE_NAME])
+        cmd.append(get_build_context())
+        env = dict(os.environ, DOCKER_BUILDKIT="1")
+        try:
+            if echo:
+                result = subprocess.run(cmd, env=env, check=False)
+                return (True, "") if result.returncode == 0 else (False, "docker build a échoué")
+            result = subprocess.run(
+                cmd,
+                env=env,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                check=False,
+                universal_newlines=True
+            )
+            if result.returncode != 0:
+                return False, result.stdout.strip()[-4000:]
+            return True, ""
+        except Exception as e:
+            return False, str(e)
+
+def ensure_image():
+    """Vérifie que ci_image correspond aux fichiers de build avant une vérification.
+
+    Selon image_refresh, une image obsolète est reconstruite (auto) ou refusée (refuse).
+    Le résultat est mémorisé pour toute la commande (vérifications parallèles comprises).
+    Retourne (succès, erreur).
+    """
+    global _ensure_result
+    with _ensure_lock:
+        if _ensure_result is not None:
+            return _ensure_result
+        _ensure_result = _check_image()
+        return _ensure_result
+
+def _check_image():
+    policy = get_refresh_policy()
+    if policy == "off":
+        return True, ""
+    inputs_hash = get_inputs_hash()
+    status = get_status(inputs_hash)
+    if status in ("fresh", "unknown"):
+        return True, ""
+    if status == "retag":
+        return tag_image(inputs_hash)
+    if policy == "refuse":
+        return False, (f"🚨  L'image {IMAGE_NAME} est {'absente' if status == 'missing' else 'obsolète'} "
+                       f"(Dockerfile ou entrypoint.py modifié). Lancez 'ci_test image build'.")
+
+    if is_build_running():
+        print(f"⏳  Construction de l'image {IMAGE_NAME} en cours en arrière-plan, attente de sa fin...")
+    else:
+        print(f"🐳  Mise à jour de l'image {IMAGE_NAME} (Dockerfile ou entrypoint.py modifié)...")
+    success, error = build_image(echo=False)
+    if not success:
+        return False, f"🚨  Impossible de construire l'image {IMAGE_NAME}:\n{error}"
+    print(f"✅  Image {get_image_tag(inputs_hash)} prête")
+    return True, ""
+
+def prewarm():
+    """Lance en arrière-plan la construction de l'image si elle est obsolète. Retourne True si lancée."""
+    if get_refresh_policy() == "off" or shutil.which('docker') is None or get_inputs_hash() is None:
+        return False
+    try:
+        with open(get_log_path(), 'w') as log_file:
+            subprocess.Popen(
+                [sys.executable, '-m', 'ci_test.cli', 'image', 'build'],
+                stdin=subprocess.DEVNULL,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                cwd=get_build_context(),
+                start_new_session=True
+            )
+        return True
+    except Exception:
+        return False
@@ -0,0 +1,175 @@
+"""
+Utilitaires pour l'analyse d'impact des tests (test_impact)
+
+L'entrypoint transmet, pour chaque fichier de tests, la fermeture de ses dépendances
+(sources liées et headers inclus), enregistrée par arbre vérifié. Au push suivant, seuls
+les fichiers de tests dont la fermeture contient un fichier modifié depuis le dernier arbre
+vérifié de la branche sont exécutés.
+"""
+
+import json
+import os
+import time
+from ci_test.utils import config_utils, docker_utils, encoding_utils, git_utils, shard_utils
+
+# Fichiers dont la modification n'a aucun effet sur les tests
+NEUTRAL_EXTENSIONS = ('.md', '.rst')
+NEUTRAL_NAMES = ('.gitignore', 'LICENSE')
+
+# Arbres dont les dépendances sont conservées, par dépôt
+MAX_TREES = 20
+
+def is_enabled():
+    """Vérifie si l'analyse d'impact des tests est activée (test_impact)."""
+    return bool(config_utils.get_setting("test_impact", False))
+
+def get_full_run_interval():
+    """Nombre d'exécutions partielles entre deux exécutions complètes (test_impact_full_every, 0: jamais)."""
+    try:
+        return max(0, int(config_utils.get_setting("test_impact_full_every", 10)))
+    except (TypeError, ValueError):
+        return 10
+
+def get_data_file_path():
+    """Récupère le chemin du fichier des dépendances de tests."""
+    return config_utils.get_config_dir() / "test_impact.json"
+
+def load_data():
+    """Charge les dépendances de tests de tous les dépôts."""
+    data_file = get_data_file_path()
+    if not data_file.exists():
+        return {}
+    try:
+        with open(data_file, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def save_data(data):
+    """Sauvegarde les dépendances de tests de manière atomique."""
+    data_file = get_data_file_path()
+    tmp_file = data_file.with_name(f"{data_file.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_file, 'w') as f:
+            json.dump(data, f)
+        os.replace(str(tmp_file), str(data_file))
+        return True
+    except Exception:
+        return False
+
+def get_base_tree(repo, branch):
+    """Dernier arbre vérifié de la branche (à défaut, celui de la branche distante suivie), ou None."""
+    tree = repo["branches"].get(branch, {}).get("tree")
+    if tree in repo["trees"]:
+        return tree
+    upstream = git_utils.get_upstream()
+    tree = git_utils.get_tree_hash(upstream) if upstream else None
+    return tree if tree in repo["trees"] else None
+
+def is_neutral(path):
+    """Vérifie si un fichier modifié est sans effet sur les tests (documentation)."""
+    name = os.path.basename(path)
+    return name in NEUTRAL_NAMES or name.endswith(NEUTRAL_EXTENSIONS)
+
+def select(closures, changed):
+    """Fichiers de tests concernés par des fichiers modifiés.
+
+    Retourne (fichiers de tests, None), ou (None, raison) si tous les tests doivent être
+    exécutés: un fichier modifié inconnu des fermetures (Makefile, nouvelle source,
+    données de tests...) peut concerner n'importe quel test.
+    """
+    known = set()
+    for files in closures.values():
+        known.update(files)
+    for path in changed:
+        if path not in known and not is_neutral(path):
+            return None, f"{path} hors des dépendances enregistrées"
+    changed = set(changed)
+    return sorted(test for test, files in closures.items() if changed.intersection(files)), None
+
+def plan(branch, tree_hash, force_full=False):
+    """Choisit les tests à exécuter pour un arbre.
+
+    Retourne (options de l'entrypoint, plan à passer à record), ou ([], None) si l'analyse
+    d'impact est désactivée. Les dépendances sont enregistrées à chaque exécution.
+    """
+    if not is_enabled():
+        return [], None
+    repo = load_data().get(shard_utils.get_repo_key(), {"trees": {}, "branches": {}})
+    base = get_base_tree(repo, branch)
+    interval = get_full_run_interval()
+    selected = None
+    if force_full:
+        reason = "demandée"
+    elif base is None:
+        reason = "aucune dépendance enregistrée"
+    elif interval and repo["branches"].get(branch, {}).get("partial_runs", 0) >= interval:
+        reason = f"périodique, après {interval} exécution(s) partielle(s)"
+    else:
+        closures = repo["trees"][base]["closures"]
+        changed, error = git_utils.diff_trees(base, tree_hash)
+        if changed is None:
+            selected, reason = None, f"différences inconnues: {error}"
+        else:
+            selected, reason = select(closures, changed)
+        if selected is not None and len(selected) == len(closures):
+            selected, reason = None, "tous les fichiers de tests sont concernés"
+        # Au-delà de la taille maximale d'un argument, tous les tests sont exécutés
+        encoded = encoding_utils.encode(selected) if selected is not None else None
+        if selected is not None and encoded is None:
+            selected, reason = None, "sélection trop volumineuse"
+
+    options = ['--record-deps']
+    if selected is None:
+        print(f"🧪  Analyse d'impact: exécution de tous les tests ({reason})")
+    else:
+        print(f"🎯  Analyse d'impact: {len(selected)} fichier(s) de tests sur {len(closures)} concerné(s) "
+              f"par {len(changed)} fichier(s) modifié(s) depuis {base[:12]}")
+        options.extend(['--test-impact', encoded])
+    return options, {"branch": branch, "tree": tree_hash, "base": base, "selected": selected}
+
+def is_full_run(test_plan):
+    """Vérifie si un plan de plan() exécute tous les tests (analyse d'impact désactivée comprise)."""
+    return test_plan is None or test_plan["selected"] is None
+
+def get_closures(logs):
+    """Dépendances transmises par l'entrypoint (marqueur test-deps).
+
+    Retourne {fichier de tests: [fichiers]}, "-" si l'entrypoint n'a pas pu les établir,
+    ou None si aucun test n'a été compilé.
+    """
+    for kind, fields in docker_utils.parse_markers(logs):
+        if kind == 'test-deps' and fields:
+            if fields[0] == '-':
+                return '-'
+            closures = encoding_utils.decode(fields[0])
+            return closures if isinstance(closures, dict) else '-'
+    return None
+
+def record(logs, test_plan):
+    """Enregistre les dépendances d'une vérification réussie pour les push suivants."""
+    if test_plan is None:
+        return
+    data = load_data()
+    repo = data.setdefault(shard_utils.get_repo_key(), {"trees": {}, "branches": {}})
+    branch = test_plan["branch"]
+    closures = get_closures(logs)
+    if closures is None and test_plan["selected"] == [] and test_plan["base"] in repo["trees"]:
+        # Aucun test exécuté: les fichiers modifiés n'appartiennent à aucune fermeture, qui restent valables
+        closures = repo["trees"][test_plan["base"]]["closures"]
+    if closures is None or closures == '-':
+        # Dépendances inconnues: la prochaine exécution sera complète
+        repo["branches"].pop(branch, None)
+        save_data(data)
+        return
+
+    repo["trees"][test_plan["tree"]] = {"closures": closures, "used": time.time()}
+    entry = repo["branches"].setdefault(branch, {})
+    entry["tree"] = test_plan["tree"]
+    entry["partial_runs"] = entry.get("partial_runs", 0) + 1 if test_plan["selected"] is not None else 0
+
+    # Conserver les arbres les plus récents, et ceux sur lesquels pointent les branches
+    referenced = set(entry["tree"] for entry in repo["branches"].values())
+    recent = sorted(repo["trees"], key=lambda tree: repo["trees"][tree]["used"], reverse=True)[:MAX_TREES]
+    repo["trees"] = {tree: value for tree, value in repo["trees"].items() if tree in referenced or tree in recent}
+    save_data(data)
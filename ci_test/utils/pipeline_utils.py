@@ -0,0 +1,94 @@
+"""
+Utilitaires pour exécuter en parallèle les étapes indépendantes d'une commande (graphe de tâches)
+"""
+
+import concurrent.futures
+import threading
+from ci_test.utils import trace_utils
+
+class Pipeline:
+    """Graphe de tâches lancées en arrière-plan dès que leurs dépendances sont terminées.
+
+    Une tâche retourne (succès, valeur); les valeurs de ses dépendances lui sont passées
+    à la suite de ses arguments. Si une dépendance échoue, la tâche n'est pas exécutée
+    et échoue avec la même erreur. Les étapes dont l'ordre importe (rebase, amend, push)
+    restent exécutées par l'appelant, qui attend les résultats dont il a besoin.
+    """
+
+    def __init__(self, key=None):
+        # Ce que prépare le pipeline (par exemple l'arbre vérifié), pour savoir s'il est réutilisable
+        self.key = key
+        self._futures = {}
+        self._cleanups = {}
+
+    def add(self, name, function, *args, after=(), cleanup=None):
+        """Lance une tâche. cleanup(valeur) libère son résultat s'il n'est jamais récupéré par take."""
+        dependencies = [self._futures[dependency] for dependency in after]
+        future = concurrent.futures.Future()
+        self._futures[name] = future
+        if cleanup is not None:
+            self._cleanups[name] = cleanup
+        threading.Thread(
+            target=self._run,
+            args=(name, future, function, args, dependencies),
+            daemon=True
+        ).start()
+        return future
+
+    def _run(self, name, future, function, args, dependencies):
+        values = []
+        for dependency in dependencies:
+            try:
+                success, value = dependency.result()
+            except concurrent.futures.CancelledError:
+                future.cancel()
+                return
+            if not success:
+                values = None
+                error = value
+                break
+            values.append(value)
+        if not future.set_running_or_notify_cancel():
+            return
+        if values is None:
+            future.set_result((False, error))
+            return
+        try:
+            with trace_utils.span(f"pipeline.{name}"):
+                future.set_result(function(*args, *values))
+        except Exception as e:
+            future.set_result((False, str(e)))
+
+    def result(self, name):
+        """Attend une tâche. Retourne (succès, valeur), ou (False, None) si elle a été annulée."""
+        future = self._futures.get(name)
+        if future is None or future.cancelled():
+            return False, None
+        try:
+            return future.result()
+        except concurrent.futures.CancelledError:
+            return False, None
+
+    def take(self, name):
+        """Comme result, mais l'appelant devient responsable de libérer la valeur."""
+        self._cleanups.pop(name, None)
+        return self.result(name)
+
+    def close(self):
+        """Annule les tâches qui n'ont pas démarré et libère les résultats non récupérés.
+
+        Les tâches en cours (git archive, docker build) ne sont pas interrompues: leur
+        résultat est libéré dès qu'elles se terminent. Peut être appelé plusieurs fois.
+        """
+        for name, future in self._futures.items():
+            future.cancel()
+            cleanup = self._cleanups.pop(name, None)
+            if cleanup is not None:
+                future.add_done_callback(lambda done, cleanup=cleanup: _release(done, cleanup))
+
+def _release(future, cleanup):
+    if future.cancelled():
+        return
+    success, value = future.result()
+    if success and value is not None:
+        cleanup(value)
@@ -0,0 +1,198 @@
+"""
+Utilitaires pour le pool de conteneurs ci_image maintenus à chaud
+"""
+
+import fcntl
+import getpass
+import subprocess
+from ci_test.utils import config_utils, trace_utils
+
+# Le conteneur s'arrête de lui-même (et est supprimé grâce à --rm) lorsqu'aucun
+# job n'est en cours et que le dernier job date de plus de warm_pool_idle_timeout secondes.
+IDLE_LOOP = (
+    'touch /tmp/ci_last_used; '
+    'while :; do '
+    'if [ ! -e /tmp/ci_busy ] && '
+    '[ $(( $(date +%s) - $(stat -c %Y /tmp/ci_last_used) )) -ge {timeout} ]; then exit 0; fi; '
+    'sleep 5; '
+    'done'
+)
+
+# Marque le conteneur occupé pendant le job pour empêcher son éviction
+JOB_WRAPPER = (
+    'touch /tmp/ci_busy /tmp/ci_last_used; '
+    'python3 /app/entrypoint.py "$@"; ret=$?; '
+    'rm -f /tmp/ci_busy; touch /tmp/ci_last_used; '
+    'exit $ret'
+)
+
+def get_pool_dir():
+    """Récupère le répertoire contenant les verrous du pool."""
+    pool_dir = config_utils.get_config_dir() / "pool"
+    pool_dir.mkdir(exist_ok=True)
+    return pool_dir
+
+def get_name_prefix():
+    """Préfixe des noms de conteneurs, propre à l'utilisateur (machine de build partagée)."""
+    return f"ci_test_warm_{getpass.getuser()}_"
+
+def get_container_names():
+    """Liste les noms des conteneurs du pool pour l'utilisateur courant."""
+    size = max(1, config_utils.get_setting("warm_pool_size", 2))
+    return [f"{get_name_prefix()}{i}" for i in range(size)]
+
+def inspect_container(name):
+    """Retourne (en cours d'exécution, id de l'image, empreinte des options) pour un conteneur."""
+    try:
+        result = subprocess.run(
+            [
+                'docker', 'inspect', '--format',
+                '{{.State.Running}} {{.Image}} {{index .Config.Labels "ci_test.options"}}',
+                name,
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+            universal_newlines=True
+        )
+        if result.returncode != 0:
+            return False, None, None
+        fields = result.stdout.strip().split(' ')
+        fields += [''] * (3 - len(fields))
+        return fields[0] == 'true', fields[1], fields[2]
+    except Exception:
+        return False, None, None
+
+def is_healthy(name):
+    """Vérifie qu'un conteneur du pool répond à docker exec.
+
+    Appelé sous le verrou du conteneur: la date de dernière utilisation est rafraîchie pour
+    que sa boucle d'attente ne s'arrête pas (docker run --rm) avant le démarrage du job.
+    """
+    try:
+        result = subprocess.run(
+            ['docker', 'exec', name, 'touch', '/tmp/ci_last_used'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+            timeout=10
+        )
+        return result.returncode == 0
+    except Exception:
+        return False
+
+def remove_container(name):
+    """Supprime un conteneur du pool."""
+    try:
+        result = subprocess.run(
+            ['docker', 'rm', '-f', name],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False
+        )
+        return result.returncode == 0
+    except Exception:
+        return False
+
+def start_container(name, run_options, options_hash, image='ci_image'):
+    """Démarre un conteneur longue durée qui attend des jobs."""
+    timeout = config_utils.get_setting("warm_pool_idle_timeout", 900)
+    try:
+        result = subprocess.run(
+            [
+                'docker', 'run', '-d', '--rm',
+                '--name', name,
+                '--label', 'ci_test.pool=1',
+                '--label', f"ci_test.options={options_hash}",
+                '--entrypoint', 'sh',
+            ] + run_options + [
+                image,
+                '-c', IDLE_LOOP.format(timeout=int(timeout)),
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+            universal_newlines=True
+        )
+        if result.returncode != 0:
+            return False, result.stderr.strip()
+        return True, ""
+    except Exception as e:
+        return False, str(e)
+
+@trace_utils.traced('pool.acquire')
+def acquire(image_id, run_options, options_hash):
+    """Réserve un conteneur sain du pool, en le (re)créant si nécessaire.
+
+    Retourne (nom du conteneur, fichier de verrou) ou (None, None) si tous les
+    conteneurs sont occupés ou ne peuvent pas être démarrés.
+    """
+    pool_dir = get_pool_dir()
+    for name in get_container_names():
+        lock_file = open(pool_dir / f"{name}.lock", 'w')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            continue
+
+        running, container_image, container_options = inspect_container(name)
+        if running and container_image == image_id and container_options == options_hash \
+                and is_healthy(name):
+            return name, lock_file
+
+        # Conteneur absent, arrêté, obsolète ou ne répondant plus: on le recrée
+        remove_container(name)
+        started, _ = start_container(name, run_options, options_hash)
+        if started:
+            return name, lock_file
+
+        release(lock_file)
+    return None, None
+
+def release(lock_file):
+    """Libère un conteneur du pool."""
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+    except Exception:
+        pass
+
+def get_job_command(name, type, entrypoint_options):
+    """Construit la commande docker exec d'un job; l'archive du projet est lue sur stdin."""
+    return [
+        'docker', 'exec', '-i', name,
+        'sh', '-c', JOB_WRAPPER, 'sh',
+        type,
+    ] + entrypoint_options + [
+        '--reset',
+    ]
+
+def list_containers():
+    """Liste les conteneurs du pool de l'utilisateur courant actuellement démarrés."""
+    try:
+        result = subprocess.run(
+            [
+                'docker', 'ps',
+                '--filter', 'label=ci_test.pool=1',
+                '--filter', f"name={get_name_prefix()}",
+                '--format', '{{.Names}}\t{{.Status}}',
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+            universal_newlines=True
+        )
+        if result.returncode != 0:
+            return []
+        return [line.split('\t', 1) for line in result.stdout.splitlines() if line]
+    except Exception:
+        return []
+
+def stop_all():
+    """Arrête tous les conteneurs du pool de l'utilisateur courant."""
+    stopped = 0
+    for name, _ in list_containers():
+        if remove_container(name):
+            stopped += 1
+    return stopped
@@ -0,0 +1,50 @@
+"""
+Utilitaires pour la pré-vérification syntaxique des fichiers modifiés (syntax_preflight)
+
+Avant le build complet, l'entrypoint compile en -fsyntax-only les fichiers C/C++ modifiés
+depuis la branche distante suivie: une erreur est signalée sans attendre make re.
+"""
+
+from ci_test.utils import config_utils, docker_utils, encoding_utils, git_utils
+
+# Fichiers transmis à l'entrypoint (les autres ne sont pas compilés séparément)
+CHECKED_EXTENSIONS = ('.c', '.cc', '.cpp', '.cxx', '.h', '.hh', '.hpp', '.hxx')
+
+def is_enabled():
+    """Vérifie si la pré-vérification syntaxique est activée (syntax_preflight)."""
+    return bool(config_utils.get_setting("syntax_preflight", False))
+
+def get_changed_sources(rev='HEAD'):
+    """Fichiers C/C++ modifiés par rev depuis la branche distante suivie (vide si aucune)."""
+    upstream = git_utils.get_upstream()
+    if upstream is None:
+        return []
+    files, _ = git_utils.get_changed_files(upstream, rev)
+    return [path for path in files or [] if path.endswith(CHECKED_EXTENSIONS)]
+
+def get_entrypoint_options(rev='HEAD'):
+    """Arguments de l'entrypoint pour pré-vérifier les fichiers modifiés par rev."""
+    if not is_enabled():
+        return []
+    files = get_changed_sources(rev)
+    if not files:
+        return []
+    encoded = encoding_utils.encode(files)
+    if encoded is None:
+        # Au-delà de la taille maximale d'un argument, seul le build complet est lancé
+        print(f"⚠️   Warn: {len(files)} fichiers modifiés, pré-vérification syntaxique ignorée")
+        return []
+    return ['--syntax-check', encoded]
+
+def get_stats(logs):
+    """Résultat de la pré-vérification rapporté par l'entrypoint.
+
+    Retourne (fichiers vérifiés, fichiers en erreur, durée en secondes) ou None.
+    """
+    for kind, fields in docker_utils.parse_markers(logs):
+        if kind == 'syntax' and len(fields) == 3:
+            try:
+                return int(fields[0]), int(fields[1]), float(fields[2])
+            except ValueError:
+                return None
+    return None
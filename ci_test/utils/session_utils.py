@@ -0,0 +1,320 @@
+"""
+Session Git persistante: un seul processus git cat-file répond aux requêtes
+de références, d'objets et d'ascendance pendant toute l'exécution d'une commande
+"""
+
+import atexit
+import heapq
+import os
+import subprocess
+import threading
+from ci_test.utils import trace_utils
+
+# Au-delà, le parcours d'ascendance est confié à git merge-base
+ANCESTRY_WALK_LIMIT = 10000
+
+# Marge tolérée sur les dates de commit (horloges décalées) lors du parcours d'ascendance
+ANCESTRY_DATE_SLOP = 86400
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+class GitSession:
+    """Processus git cat-file --batch / --batch-check maintenus ouverts pour un dépôt."""
+
+    def __init__(self, git_dir, common_dir, toplevel):
+        self.git_dir = git_dir
+        self.common_dir = common_dir
+        self.toplevel = toplevel
+        self._lock = threading.Lock()
+        self._check_process = None
+        self._batch_process = None
+        self._config = None
+        self._config_stamp = None
+        self._commits = {}
+
+    @classmethod
+    @trace_utils.traced('git.session')
+    def open(cls, cwd=None):
+        """Ouvre une session sur le dépôt contenant cwd. Retourne None hors d'un dépôt."""
+        try:
+            result = subprocess.run(
+                ['git', 'rev-parse', '--absolute-git-dir', '--git-common-dir', '--show-toplevel'],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                check=False,
+                universal_newlines=True,
+                cwd=cwd
+            )
+            lines = result.stdout.splitlines()
+            if result.returncode != 0 or len(lines) < 3:
+                return None
+            git_dir, common_dir, toplevel = lines[:3]
+            common_dir = os.path.join(cwd or os.getcwd(), common_dir)
+            return cls(git_dir, os.path.normpath(common_dir), toplevel)
+        except Exception:
+            return None
+
+    def _start(self, mode):
+        return subprocess.Popen(
+            ['git', 'cat-file', mode],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=self.toplevel
+        )
+
+    def _query(self, mode, name):
+        """Envoie une requête au processus cat-file; le relance une fois s'il s'est arrêté."""
+        attribute = '_check_process' if mode == '--batch-check' else '_batch_process'
+        for _ in range(2):
+            process = getattr(self, attribute)
+            if process is None or process.poll() is not None:
+                process = self._start(mode)
+                setattr(self, attribute, process)
+            try:
+                process.stdin.write(name.encode('utf-8', errors='surrogateescape') + b'\n')
+                process.stdin.flush()
+                header = process.stdout.readline()
+                if not header:
+                    raise BrokenPipeError()
+                fields = header.rstrip(b'\n').split(b' ')
+                if len(fields) != 3 or fields[1] in (b'missing', b'ambiguous'):
+                    return None
+                sha, object_type, size = fields[0].decode(), fields[1].decode(), int(fields[2])
+                if mode == '--batch-check':
+                    return sha, object_type, size
+                data = process.stdout.read(size)
+                process.stdout.read(1)
+                return sha, object_type, data
+            except (BrokenPipeError, OSError, ValueError):
+                process.kill()
+                setattr(self, attribute, None)
+        return None
+
+    def resolve(self, rev):
+        """Résout une révision en hash d'objet, ou None si elle n'existe pas."""
+        if not rev or '\n' in rev:
+            return None
+        with self._lock:
+            info = self._query('--batch-check', rev)
+        return info[0] if info else None
+
+    def object_type(self, rev):
+        """Type de l'objet désigné par une révision (commit, tree, blob, tag) ou None."""
+        if not rev or '\n' in rev:
+            return None
+        with self._lock:
+            info = self._query('--batch-check', rev)
+        return info[1] if info else None
+
+    def read_object(self, rev):
+        """Lit un objet. Retourne (hash, type, contenu) ou None."""
+        if not rev or '\n' in rev:
+            return None
+        with self._lock:
+            return self._query('--batch', rev)
+
+    def read_commit(self, sha):
+        """Retourne (parents, date du committer) d'un commit, mis en cache pour la session."""
+        commit = self._commits.get(sha)
+        if commit is not None:
+            return commit
+        obj = self.read_object(sha)
+        if obj is None or obj[1] != 'commit':
+            return None
+        parents = []
+        timestamp = 0
+        for line in obj[2].split(b'\n'):
+            if not line:
+                break
+            if line.startswith(b'parent '):
+                parents.append(line[7:].decode())
+            elif line.startswith(b'committer '):
+                try:
+                    timestamp = int(line.rsplit(b' ', 2)[1])
+                except (IndexError, ValueError):
+                    timestamp = 0
+        commit = (parents, timestamp)
+        self._commits[sha] = commit
+        return commit
+
+    def head_ref(self):
+        """Lit HEAD directement. Retourne (référence symbolique ou None, contenu brut)."""
+        try:
+            with open(os.path.join(self.git_dir, 'HEAD'), 'r') as f:
+                content = f.read().strip()
+        except OSError:
+            return None, None
+        if content.startswith('ref: '):
+            return content[5:], content
+        return None, content
+
+    def current_branch(self):
+        """Nom de la branche courante, 'HEAD' si détachée, None si la branche n'a pas de commit."""
+        ref, content = self.head_ref()
+        if content is None or ref == 'refs/heads/.invalid':
+            # Stockage reftable: HEAD n'est pas lisible comme un fichier
+            return None
+        if ref is None:
+            return 'HEAD'
+        if self.resolve(ref) is None:
+            return None
+        return ref[len('refs/heads/'):] if ref.startswith('refs/heads/') else ref
+
+    def is_ancestor(self, ancestor, descendant):
+        """Vérifie l'ascendance en parcourant les commits par date décroissante.
+
+        Seule une réponse positive est donnée par le parcours; une réponse négative
+        (ou un parcours trop long) est confirmée par git merge-base, qui dispose du commit-graph.
+        """
+        ancestor_sha = self.resolve(f"{ancestor}^{{commit}}")
+        descendant_sha = self.resolve(f"{descendant}^{{commit}}")
+        if ancestor_sha is None or descendant_sha is None:
+            return False
+        if ancestor_sha == descendant_sha:
+            return True
+
+        target = self.read_commit(ancestor_sha)
+        start = self.read_commit(descendant_sha)
+        if target is None or start is None:
+            return self._merge_base_is_ancestor(ancestor_sha, descendant_sha)
+
+        cutoff = target[1] - ANCESTRY_DATE_SLOP
+        queue = [(-start[1], descendant_sha)]
+        seen = {descendant_sha}
+        walked = 0
+        while queue and walked < ANCESTRY_WALK_LIMIT:
+            negative_time, sha = heapq.heappop(queue)
+            if -negative_time < cutoff:
+                break
+            walked += 1
+            commit = self.read_commit(sha)
+            if commit is None:
+                break
+            for parent in commit[0]:
+                if parent == ancestor_sha:
+                    return True
+                if parent not in seen:
+                    seen.add(parent)
+                    parent_commit = self.read_commit(parent)
+                    # Parent absent (clone superficiel): git tranchera
+                    heapq.heappush(queue, (-(parent_commit[1] if parent_commit else 0), parent))
+        return self._merge_base_is_ancestor(ancestor_sha, descendant_sha)
+
+    def _merge_base_is_ancestor(self, ancestor, descendant):
+        try:
+            result = subprocess.run(
+                ['git', 'merge-base', '--is-ancestor', ancestor, descendant],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                check=False,
+                cwd=self.toplevel
+            )
+            return result.returncode == 0
+        except Exception:
+            return False
+
+    def _config_files_stamp(self):
+        stamp = []
+        for path in (os.path.join(self.common_dir, 'config'),
+                     os.path.join(self.git_dir, 'config.worktree'),
+                     os.path.expanduser('~/.gitconfig')):
+            try:
+                st = os.stat(path)
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                stamp.append(None)
+        return stamp
+
+    def config(self):
+        """Configuration git du dépôt (clé -> liste de valeurs), relue si un fichier a changé.
+
+        Les clés sont sous la forme canonique de git config --list: section et nom
+        en minuscules, sous-section (nom de remote, base d'URL) avec sa casse d'origine.
+        """
+        with self._lock:
+            stamp = self._config_files_stamp()
+            if self._config is not None and stamp == self._config_stamp:
+                return self._config
+            config = {}
+            try:
+                result = subprocess.run(
+                    ['git', 'config', '--list', '-z'],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    check=False,
+                    cwd=self.toplevel
+                )
+                for entry in result.stdout.split(b'\0'):
+                    if not entry:
+                        continue
+                    key, _, value = entry.decode('utf-8', errors='surrogateescape').partition('\n')
+                    config.setdefault(key, []).append(value)
+            except Exception:
+                return {}
+            self._config = config
+            self._config_stamp = stamp
+            return config
+
+    def get_config(self, key):
+        """Dernière valeur d'une clé de configuration (forme canonique de git config --list), ou None."""
+        values = self.config().get(key)
+        return values[-1] if values else None
+
+    def remotes(self):
+        """Liste des remotes ayant une URL configurée."""
+        return sorted({key[len('remote.'):-len('.url')]
+                       for key in self.config()
+                       if key.startswith('remote.') and key.endswith('.url')})
+
+    def remote_url(self, remote='origin'):
+        """URL d'un remote, réécrite selon url.<base>.insteadOf comme git remote get-url."""
+        urls = self.config().get(f"remote.{remote}.url")
+        if not urls:
+            return None
+        url = urls[0]
+        best_base, best_prefix = None, ''
+        for key, values in self.config().items():
+            if not (key.startswith('url.') and key.endswith('.insteadof')):
+                continue
+            for prefix in values:
+                if url.startswith(prefix) and len(prefix) > len(best_prefix):
+                    best_base, best_prefix = key[len('url.'):-len('.insteadof')], prefix
+        if best_base is not None:
+            return best_base + url[len(best_prefix):]
+        return url
+
+    def close(self):
+        """Arrête les processus cat-file de la session."""
+        with self._lock:
+            for attribute in ('_check_process', '_batch_process'):
+                process = getattr(self, attribute)
+                if process is None:
+                    continue
+                try:
+                    process.stdin.close()
+                    process.wait(timeout=5)
+                except Exception:
+                    process.kill()
+                setattr(self, attribute, None)
+
+def get_session(cwd=None):
+    """Session partagée pour le dépôt du répertoire courant (une par répertoire et par exécution)."""
+    key = os.path.abspath(cwd or os.getcwd())
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = GitSession.open(key)
+            # Un échec n'est pas mémorisé: le dépôt peut être créé plus tard (clone, init)
+            if session is not None:
+                _sessions[key] = session
+        return session
+
+@atexit.register
+def close_sessions():
+    """Ferme toutes les sessions ouvertes."""
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+        _sessions.clear()
@@ -0,0 +1,159 @@
+"""
+Utilitaires pour l'exécution des tests Criterion répartie en shards
+"""
+
+import json
+import os
+import re
+import xml.etree.ElementTree as ET
+from ci_test.utils import config_utils, encoding_utils, git_utils
+
+def get_shards_setting():
+    """Nombre de shards configuré (test_shards): 0 pour désactiver, "auto" ou un entier."""
+    shards = config_utils.get_setting("test_shards", 0)
+    if shards == "auto":
+        return "auto"
+    try:
+        return max(0, int(shards))
+    except (TypeError, ValueError):
+        return 0
+
+def get_durations_file_path():
+    """Récupère le chemin du fichier des durées de tests."""
+    return config_utils.get_config_dir() / "test_durations.json"
+
+def get_repo_key():
+    """Identifiant du dépôt courant dans le fichier des durées."""
+    return git_utils.get_toplevel() or os.getcwd()
+
+def load_durations():
+    """Charge les durées de tous les dépôts."""
+    durations_file = get_durations_file_path()
+    if not durations_file.exists():
+        return {}
+    try:
+        with open(durations_file, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def save_durations(durations):
+    """Sauvegarde les durées de manière atomique."""
+    durations_file = get_durations_file_path()
+    tmp_file = durations_file.with_name(f"{durations_file.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_file, 'w') as f:
+            json.dump(durations, f, indent=2)
+        os.replace(str(tmp_file), str(durations_file))
+        return True
+    except Exception:
+        return False
+
+def get_entrypoint_options():
+    """Arguments de entrypoint.py pour l'exécution des tests en shards."""
+    shards = get_shards_setting()
+    if shards in (0, 1):
+        return []
+    options = ['--test-shards', str(shards)]
+    durations = load_durations().get(get_repo_key())
+    # Au-delà de la taille maximale d'un argument, les durées ne sont pas transmises
+    encoded = encoding_utils.encode(durations) if durations else None
+    if encoded:
+        options.extend(['--test-durations', encoded])
+    return options
+
+def parse_results(markers):
+    """Résultats des tests rapportés par l'entrypoint (voir docker_utils.parse_markers).
+
+    Retourne [(statut, durée, test)].
+    """
+    results = []
+    for kind, fields in markers:
+        if kind == 'test' and len(fields) >= 3:
+            try:
+                results.append((fields[0], float(fields[1]), ' '.join(fields[2:])))
+            except ValueError:
+                continue
+    return results
+
+def get_shard_stats(markers):
+    """Retourne (nombre de shards, durée totale, durée du shard le plus lent) ou None."""
+    for kind, fields in markers:
+        if kind == 'test-shards' and len(fields) == 3:
+            try:
+                return int(fields[0]), float(fields[1]), float(fields[2])
+            except ValueError:
+                return None
+    return None
+
+def record_results(markers, branch=None):
+    """Mémorise les durées des tests et écrit le rapport JUnit. Retourne le chemin du rapport ou None."""
+    results = parse_results(markers)
+    if not results:
+        return None
+
+    durations = load_durations()
+    repo_durations = durations.setdefault(get_repo_key(), {})
+    for status, duration, test in results:
+        if status in ('passed', 'failed'):
+            repo_durations[test] = duration
+    save_durations(durations)
+
+    return write_junit_report(results, branch)
+
+def write_junit_report(results, branch=None):
+    """Écrit le rapport JUnit fusionné de tous les shards."""
+    reports_dir = config_utils.get_config_dir() / "reports"
+    reports_dir.mkdir(exist_ok=True)
+    name = re.sub(r'[^A-Za-z0-9._-]', '_', branch or "HEAD")
+    report_path = reports_dir / f"{name}-junit.xml"
+
+    suites = {}
+    for status, duration, test in results:
+        binary, _, full_name = test.rpartition(':')
+        suite_name, _, case_name = full_name.partition('/')
+        suites.setdefault(f"{binary}:{suite_name}" if binary else suite_name, []).append(
+            (case_name, status, duration))
+
+    root = ET.Element('testsuites', name="ci_test", tests=str(len(results)))
+    for suite_name, cases in suites.items():
+        suite = ET.SubElement(
+            root, 'testsuite', name=suite_name, tests=str(len(cases)),
+            failures=str(sum(1 for _, status, _ in cases if status == 'failed')),
+            errors=str(sum(1 for _, status, _ in cases if status == 'crashed')),
+            skipped=str(sum(1 for _, status, _ in cases if status == 'skipped')),
+            time=f"{sum(duration for _, _, duration in cases):.4f}")
+        for case_name, status, duration in cases:
+            case = ET.SubElement(suite, 'testcase', classname=suite_name, name=case_name, time=f"{duration:.4f}")
+            if status == 'failed':
+                ET.SubElement(case, 'failure', message="échec")
+            elif status == 'crashed':
+                ET.SubElement(case, 'error', message="plantage")
+            elif status == 'skipped':
+                ET.SubElement(case, 'skipped')
+    try:
+        ET.ElementTree(root).write(str(report_path), encoding='utf-8', xml_declaration=True)
+        return report_path
+    except Exception:
+        return None
+
+def print_summary(markers, report_path=None):
+    """Affiche le résumé des tests en shards, si les tests ont été découpés."""
+    results = parse_results(markers)
+    if not results:
+        return
+    counts = {}
+    for status, _, _ in results:
+        counts[status] = counts.get(status, 0) + 1
+    line = (f"🧪  Tests: {counts.get('passed', 0)} réussi(s), {counts.get('failed', 0)} échoué(s), "
+            f"{counts.get('crashed', 0)} planté(s), {counts.get('skipped', 0)} ignoré(s)")
+    stats = get_shard_stats(markers)
+    if stats is not None:
+        shards, elapsed, slowest = stats
+        line += f" | {shards} shard(s) en {elapsed:.1f}s (shard le plus lent: {slowest:.1f}s)"
+    print(line)
+    for status, _, test in results:
+        if status in ('failed', 'crashed'):
+            print(f"   ❌  {test} ({'échec' if status == 'failed' else 'plantage'})")
+    if report_path is not None:
+        print(f"📄  Rapport JUnit: {report_path}")
@@ -0,0 +1,139 @@
+"""
+Connexion SSH partagée: une seule connexion maîtresse (ControlMaster) vers le remote
+est ouverte au début d'une commande, et tous les git fetch/push de la commande la réutilisent
+au lieu de refaire chacun la poignée de main SSH
+"""
+
+import atexit
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from ci_test.utils import config_utils, session_utils, trace_utils
+
+# Commandes qui communiquent avec le remote
+REMOTE_COMMANDS = ('push', 'clone', 'init', 'mod', 'module', 'iss', 'issue', 'finish', 'release', 'update')
+
+# Attente maximale de la connexion maîtresse avant de se connecter directement
+MASTER_WAIT_TIMEOUT = 15
+
+# URL scp (utilisateur@hôte:chemin) et URL ssh://utilisateur@hôte:port/chemin
+SCP_URL_PATTERN = re.compile(r'^(?:([^@/]+)@)?([^:/]+):(?!//)')
+SSH_URL_PATTERN = re.compile(r'^(?:git\+)?ssh://(?:([^@/]+)@)?(\[[^\]]+\]|[^:/]+)(?::(\d+))?/')
+
+_lock = threading.Lock()
+_master = None
+_control_dir = None
+
+def is_enabled():
+    """Vérifie si la connexion SSH partagée est activée (ssh_multiplexing)."""
+    return bool(config_utils.get_setting("ssh_multiplexing", True))
+
+def parse_ssh_url(url):
+    """Destination SSH d'une URL git. Retourne (utilisateur, hôte, port), ou None hors SSH."""
+    if not url:
+        return None
+    match = SSH_URL_PATTERN.match(url)
+    if match:
+        user, host, port = match.groups()
+        return user, host.strip('[]'), port
+    if '://' in url or os.path.exists(url):
+        return None
+    match = SCP_URL_PATTERN.match(url)
+    if match:
+        user, host = match.groups()
+        return user, host, None
+    return None
+
+def is_user_configured():
+    """Vérifie si l'utilisateur a choisi sa propre commande SSH (respectée telle quelle)."""
+    if os.environ.get('GIT_SSH_COMMAND') or os.environ.get('GIT_SSH'):
+        return True
+    session = session_utils.get_session()
+    return bool(session and session.get_config('core.sshcommand'))
+
+@trace_utils.traced('ssh.master')
+def start(url=None):
+    """Ouvre la connexion maîtresse vers le remote (url, sinon origin) en arrière-plan.
+
+    Les commandes git lancées ensuite l'utilisent via GIT_SSH_COMMAND dès qu'elle est prête;
+    si elle échoue (authentification interactive, hôte injoignable...), elles se connectent
+    directement comme avant. Retourne True si la connexion est lancée.
+    """
+    global _master, _control_dir
+    if os.name == 'nt' or not is_enabled() or shutil.which('ssh') is None:
+        return False
+    if url is None:
+        session = session_utils.get_session()
+        url = session.remote_url('origin') if session else None
+    destination = parse_ssh_url(url)
+    if destination is None or is_user_configured():
+        return False
+    user, host, port = destination
+
+    with _lock:
+        if _master is not None:
+            return True
+        try:
+            # Chemin court: un socket Unix est limité à ~100 caractères (TMPDIR est long sous macOS)
+            _control_dir = tempfile.mkdtemp(prefix='ci_test_ssh-', dir='/tmp' if os.path.isdir('/tmp') else None)
+            control_path = os.path.join(_control_dir, '%C')
+            command = ['ssh', '-N', '-o', 'ControlMaster=yes', '-o', f'ControlPath={control_path}',
+                       '-o', 'BatchMode=yes']
+            if port:
+                command.extend(['-p', port])
+            command.append(f"{user}@{host}" if user else host)
+            _master = subprocess.Popen(
+                command,
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+        except Exception:
+            _master = None
+            shutil.rmtree(_control_dir, ignore_errors=True)
+            _control_dir = None
+            return False
+        # ControlMaster=no: les clients utilisent la connexion existante sans jamais en créer
+        os.environ['GIT_SSH_COMMAND'] = f"ssh -o ControlMaster=no -o ControlPath={control_path}"
+    return True
+
+@trace_utils.traced('ssh.wait')
+def wait_ready(timeout=MASTER_WAIT_TIMEOUT):
+    """Attend que la connexion maîtresse soit établie (ou ait échoué) avant une commande git distante."""
+    master, control_dir = _master, _control_dir
+    if master is None:
+        return False
+    deadline = time.monotonic() + timeout
+    while master.poll() is None:
+        try:
+            # ssh crée le socket sous un nom temporaire (<nom>.<suffixe>) avant de le renommer
+            if any('.' not in name for name in os.listdir(control_dir)):
+                return True
+        except OSError:
+            return False
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(0.02)
+    return False
+
+@atexit.register
+def stop():
+    """Ferme la connexion maîtresse et supprime son socket."""
+    global _master, _control_dir
+    with _lock:
+        if _master is not None:
+            if _master.poll() is None:
+                _master.terminate()
+                try:
+                    _master.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    _master.kill()
+            _master = None
+            os.environ.pop('GIT_SSH_COMMAND', None)
+        if _control_dir is not None:
+            shutil.rmtree(_control_dir, ignore_errors=True)
+            _control_dir = None
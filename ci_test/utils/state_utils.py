@@ -0,0 +1,103 @@
+"""
+Instantané de l'état du dépôt chargé une fois par commande
+"""
+
+import os
+import subprocess
+from ci_test.utils import session_utils, trace_utils
+
+REF_FORMAT = '%(refname)%00%(objectname)%00%(upstream)%00%(HEAD)'
+
+class RepoState:
+    """État du dépôt (branche courante, HEAD, références, remotes, rebase).
+
+    Chargé en un seul appel git for-each-ref (plus la configuration mise en cache
+    par la session); il n'est pas relu automatiquement: appeler refresh() après
+    une opération qui le modifie (fetch, checkout, rebase, création de branche...).
+    """
+
+    def __init__(self, session):
+        self.session = session
+        self.current_branch = None
+        self.head = None
+        self.branches = {}
+        self.remote_branches = {}
+        self.upstreams = {}
+        self.remote_urls = {}
+        self.rebase_in_progress = False
+
+    @classmethod
+    def load(cls):
+        """Charge l'état du dépôt courant. Retourne None hors d'un dépôt."""
+        session = session_utils.get_session()
+        if session is None:
+            return None
+        state = cls(session)
+        state.refresh()
+        return state
+
+    @trace_utils.traced('git.for-each-ref')
+    def refresh(self):
+        """Relit l'état du dépôt."""
+        self.current_branch = None
+        self.head = None
+        self.branches = {}
+        self.remote_branches = {}
+        self.upstreams = {}
+
+        try:
+            result = subprocess.run(
+                ['git', 'for-each-ref', f'--format={REF_FORMAT}', 'refs/heads', 'refs/remotes'],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                check=False,
+                universal_newlines=True,
+                cwd=self.session.toplevel
+            )
+            lines = result.stdout.splitlines() if result.returncode == 0 else []
+        except Exception:
+            lines = []
+
+        for line in lines:
+            fields = line.split('\0')
+            if len(fields) != 4:
+                continue
+            refname, objectname, upstream, is_head = fields
+            if refname.startswith('refs/heads/'):
+                name = refname[len('refs/heads/'):]
+                self.branches[name] = objectname
+                if upstream:
+                    self.upstreams[name] = upstream
+                if is_head == '*':
+                    self.current_branch = name
+                    self.head = objectname
+            elif not refname.endswith('/HEAD'):
+                self.remote_branches[refname[len('refs/remotes/'):]] = objectname
+
+        if self.current_branch is None:
+            ref, content = self.session.head_ref()
+            if content is not None and ref is None:
+                # HEAD détachée, même convention que git rev-parse --abbrev-ref HEAD
+                self.current_branch = 'HEAD'
+                self.head = content
+
+        self.remote_urls = {remote: self.session.remote_url(remote) for remote in self.session.remotes()}
+        self.rebase_in_progress = os.path.exists(os.path.join(self.session.git_dir, "rebase-apply")) or \
+            os.path.exists(os.path.join(self.session.git_dir, "rebase-merge"))
+        return self
+
+    def has_remote(self):
+        """Vérifie si le dépôt a un remote."""
+        return bool(self.remote_urls)
+
+    def has_local_branch(self, name):
+        """Vérifie si une branche existe localement."""
+        return name in self.branches
+
+    def get_remote_url(self, remote='origin'):
+        """Récupère l'URL d'un remote."""
+        return self.remote_urls.get(remote)
+
+    def get_upstream(self, branch=None):
+        """Référence amont (refs/remotes/...) d'une branche, par défaut la branche courante."""
+        return self.upstreams.get(branch or self.current_branch)
@@ -0,0 +1,138 @@
+"""
+Utilitaires pour mesurer la durée des phases de ci_test (--profile)
+
+Les spans sont enregistrés au format Chrome trace (chrome://tracing, ui.perfetto.dev).
+Ceux du conteneur sont transmis par l'entrypoint sous forme de marqueurs.
+"""
+
+import contextlib
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+from ci_test.utils import config_utils
+
+HOST_PID = 1
+CONTAINER_PID = 2
+
+_enabled = False
+_events = []
+_lock = threading.Lock()
+_origin = time.time()
+_thread_ids = {}
+_container_rows = itertools.count(1)
+
+def enable():
+    """Active l'enregistrement des spans pour la suite de l'exécution."""
+    global _enabled, _origin
+    _enabled = True
+    _origin = time.time()
+    del _events[:]
+
+def is_enabled():
+    """Vérifie si le profilage est actif."""
+    return _enabled
+
+def _thread_id():
+    ident = threading.get_ident()
+    with _lock:
+        return _thread_ids.setdefault(ident, len(_thread_ids) + 1)
+
+def add_span(name, start, end, category='ci_test', pid=HOST_PID, tid=None, args=None):
+    """Enregistre un span terminé (start et end en secondes depuis l'epoch)."""
+    if not _enabled:
+        return
+    event = {
+        "name": name,
+        "cat": category,
+        "ph": "X",
+        "ts": round((start - _origin) * 1e6),
+        "dur": round(max(0.0, end - start) * 1e6),
+        "pid": pid,
+        "tid": tid if tid is not None else _thread_id(),
+    }
+    if args:
+        event["args"] = args
+    with _lock:
+        _events.append(event)
+
+@contextlib.contextmanager
+def span(name, category='ci_test', **args):
+    """Mesure la durée du bloc (sans effet si le profilage est inactif)."""
+    if not _enabled:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        add_span(name, start, time.time(), category, args=args or None)
+
+def traced(name, category='ci_test'):
+    """Décorateur mesurant chaque appel de la fonction."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with span(name, category):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def add_container_spans(markers, label=None):
+    """Ajoute les spans transmis par l'entrypoint (marqueurs span nom début durée).
+
+    Chaque conteneur occupe sa propre ligne dans la trace.
+    """
+    if not _enabled:
+        return
+    row = next(_container_rows)
+    for kind, fields in markers:
+        if kind != 'span' or len(fields) != 3:
+            continue
+        try:
+            start, duration = float(fields[1]), float(fields[2])
+        except ValueError:
+            continue
+        add_span(f"conteneur:{fields[0]}", start, start + duration, 'conteneur', CONTAINER_PID, row,
+                 {"label": label} if label else None)
+
+def get_default_path(command):
+    """Chemin par défaut du fichier de trace d'une commande."""
+    traces_dir = config_utils.get_config_dir() / "traces"
+    traces_dir.mkdir(exist_ok=True)
+    return str(traces_dir / f"{command}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+
+def write_trace(path):
+    """Écrit la trace au format Chrome trace."""
+    metadata = [
+        {"name": "process_name", "ph": "M", "pid": HOST_PID, "args": {"name": "ci_test (hôte)"}},
+        {"name": "process_name", "ph": "M", "pid": CONTAINER_PID, "args": {"name": "conteneur"}},
+    ]
+    with _lock:
+        events = sorted(_events, key=lambda event: event["ts"])
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({"traceEvents": metadata + events, "displayTimeUnit": "ms"}, f)
+    os.replace(tmp_path, path)
+
+def print_summary(limit=20):
+    """Affiche la durée cumulée de chaque phase, des plus coûteuses aux moins coûteuses."""
+    with _lock:
+        events = list(_events)
+    if not events:
+        return
+    wall = max(event["ts"] + event["dur"] for event in events) - min(event["ts"] for event in events)
+    totals = {}
+    for event in events:
+        count, total = totals.get(event["name"], (0, 0))
+        totals[event["name"]] = (count + 1, total + event["dur"])
+
+    print(f"\n⏱️   Profil: {wall / 1e6:.2f}s au total")
+    print(f"   {'phase':<40} {'appels':>6} {'total':>9} {'%':>5}")
+    for name, (count, total) in sorted(totals.items(), key=lambda item: -item[1][1])[:limit]:
+        share = total * 100.0 / wall if wall else 0.0
+        print(f"   {name:<40} {count:>6} {total / 1e6:>8.2f}s {share:>4.0f}%")
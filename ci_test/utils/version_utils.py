@@ -0,0 +1,102 @@
+"""
+Utilitaires pour déterminer la version des releases à partir des tags
+"""
+
+import re
+import subprocess
+from ci_test.utils import config_utils
+
+# Nombre de composants de la version pour chaque schéma; le dernier est incrémenté
+SCHEMES = {
+    "major": 2,  # 1.0, 2.0, 3.0...
+    "minor": 2,  # 1.0, 1.1, 1.2...
+    "patch": 3,  # 1.0.0, 1.0.1, 1.0.2...
+}
+
+# Message des commits de release, utilisé en repli lorsqu'aucun tag n'est trouvé
+RELEASE_COMMIT_PATTERN = re.compile(r"Release (\d+(?:\.\d+)*) - snapshot of dev")
+
+def get_scheme():
+    """Schéma de version configuré (release_scheme)."""
+    scheme = config_utils.get_setting("release_scheme", "major")
+    return scheme if scheme in SCHEMES else "major"
+
+def get_tag_prefix():
+    """Préfixe des tags de release (release_tag_prefix, ex: "v")."""
+    return config_utils.get_setting("release_tag_prefix", "") or ""
+
+def parse_version(text):
+    """Convertit "2.1" en (2, 1), ou None si le texte n'est pas une version."""
+    if not re.fullmatch(r"\d+(?:\.\d+)*", text or ""):
+        return None
+    return tuple(int(part) for part in text.split('.'))
+
+def format_version(version):
+    """Convertit (2, 1) en "2.1"."""
+    return '.'.join(str(part) for part in version)
+
+def bump(version, scheme=None):
+    """Calcule la version suivante selon le schéma (None: première release)."""
+    scheme = scheme or get_scheme()
+    size = SCHEMES[scheme]
+    if version is None:
+        return (1,) + (0,) * (size - 1)
+    version = tuple(version[:size]) + (0,) * (size - len(version))
+    if scheme == "major":
+        return (version[0] + 1,) + (0,) * (size - 1)
+    return version[:-1] + (version[-1] + 1,)
+
+def find_latest_tag(prefix=None):
+    """Dernière version publiée d'après les tags, triés par git (un seul appel for-each-ref).
+
+    Le coût dépend du nombre de tags, pas de la longueur de l'historique.
+    """
+    prefix = get_tag_prefix() if prefix is None else prefix
+    try:
+        result = subprocess.run(
+            [
+                'git', 'for-each-ref', '--sort=-version:refname',
+                '--format=%(refname:lstrip=2)', f'refs/tags/{prefix}[0-9]*',
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+            universal_newlines=True
+        )
+        if result.returncode != 0:
+            return None
+        for tag in result.stdout.splitlines():
+            version = parse_version(tag[len(prefix):])
+            if version is not None:
+                return version
+        return None
+    except Exception:
+        return None
+
+def find_latest_release_commit(rev, limit=None):
+    """Repli: cherche le dernier commit de release parmi les `limit` derniers commits de rev."""
+    limit = limit or config_utils.get_setting("release_log_scan_limit", 1000)
+    try:
+        result = subprocess.run(
+            ['git', 'log', f'--max-count={int(limit)}', '--format=%s', rev],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+            universal_newlines=True
+        )
+        if result.returncode != 0:
+            return None
+        for subject in result.stdout.splitlines():
+            match = RELEASE_COMMIT_PATTERN.search(subject)
+            if match:
+                return parse_version(match.group(1))
+        return None
+    except Exception:
+        return None
+
+def get_next_version(rev):
+    """Version de la prochaine release de la branche rev, sous forme de texte (ex: "3.0")."""
+    latest = find_latest_tag()
+    if latest is None:
+        latest = find_latest_release_commit(rev)
+    return format_version(bump(latest))
@@ -0,0 +1,210 @@
+"""
+Utilitaires pour les espaces de travail persistants synchronisés par delta
+"""
+
+import fcntl
+import hashlib
+import io
+import json
+import os
+import subprocess
+import tarfile
+import tempfile
+import time
+from ci_test.utils import config_utils, docker_utils, git_utils, session_utils, trace_utils
+
+# Doit correspondre à la constante de entrypoint.py
+DELETED_MEMBER = '.ci_test_meta/deleted'
+
+def is_enabled():
+    """Vérifie si la synchronisation delta est activée."""
+    return docker_utils.uses_persistent_workspace()
+
+def get_state_file_path():
+    """Récupère le chemin du fichier mémorisant l'arbre de chaque espace de travail."""
+    return config_utils.get_config_dir() / "workspaces.json"
+
+def get_workspace_key(branch):
+    """Identifiant de l'espace de travail d'une branche du dépôt courant."""
+    toplevel = git_utils.get_toplevel() or os.getcwd()
+    return hashlib.sha256(f"{toplevel}:{branch}".encode()).hexdigest()[:16]
+
+def load_state():
+    """Charge l'état des espaces de travail."""
+    state_file = get_state_file_path()
+    if not state_file.exists():
+        return {}
+    try:
+        with open(state_file, 'r') as f:
+            return json.load(f)
+    except Exception:
+        return {}
+
+def set_synced_tree(key, tree_hash):
+    """Mémorise l'arbre sur lequel un espace de travail est synchronisé (None pour l'oublier)."""
+    state_file = get_state_file_path()
+    with open(config_utils.get_config_dir() / "workspaces.lock", 'w') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        state = load_state()
+        if tree_hash is None:
+            state.pop(key, None)
+        else:
+            state[key] = {"tree": tree_hash, "synced_at": time.time()}
+        tmp_file = state_file.with_name(f"{state_file.name}.{os.getpid()}.tmp")
+        with open(tmp_file, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(str(tmp_file), str(state_file))
+
+def get_synced_tree(key):
+    """Récupère l'arbre sur lequel un espace de travail est synchronisé."""
+    return load_state().get(key, {}).get("tree")
+
+def lock_workspace(key):
+    """Verrouille un espace de travail pour la durée d'une vérification."""
+    lock_dir = config_utils.get_config_dir() / "workspaces"
+    lock_dir.mkdir(exist_ok=True)
+    lock_file = open(lock_dir / f"{key}.lock", 'w')
+    fcntl.flock(lock_file, fcntl.LOCK_EX)
+    return lock_file
+
+def get_changes(base_tree, target_tree):
+    """Liste les changements entre deux arbres. Retourne ([(mode, sha, chemin)], [supprimés]) ou None."""
+    try:
+        result = subprocess.run(
+            ['git', 'diff-tree', '-r', '-z', '--raw', '--no-renames', base_tree, target_tree],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False
+        )
+        if result.returncode != 0:
+            return None
+
+        changed = []
+        deleted = []
+        fields = result.stdout.split(b'\0')
+        for meta, path in zip(fields[0::2], fields[1::2]):
+            if not meta.startswith(b':'):
+                continue
+            _, new_mode, _, new_sha, status = meta[1:].decode().split(' ')
+            path = path.decode('utf-8', errors='surrogateescape')
+            if status in ('D', 'T'):
+                # Un changement de type (fichier <-> lien) est appliqué comme suppression + ajout
+                deleted.append(path)
+            if status != 'D' and new_mode != '160000':
+                changed.append((new_mode, new_sha, path))
+        return changed, deleted
+    except Exception:
+        return None
+
+def read_blobs(shas):
+    """Lit le contenu de plusieurs blobs via la session git cat-file --batch."""
+    session = session_utils.get_session()
+    if session is None:
+        raise RuntimeError("Dépôt git introuvable")
+    blobs = {}
+    for sha in shas:
+        obj = session.read_object(sha)
+        if obj is None:
+            raise RuntimeError(f"Objet {sha} introuvable")
+        blobs[sha] = obj[2]
+    return blobs
+
+@trace_utils.traced('workspace.delta_archive')
+def create_delta_archive(base_tree, target_tree):
+    """Crée l'archive des seuls fichiers modifiés entre deux arbres.
+
+    La liste des fichiers supprimés est placée en tête de l'archive (DELETED_MEMBER).
+    Retourne (archive, nombre de fichiers transmis, nombre de suppressions) ou (None, 0, 0).
+    """
+    changes = get_changes(base_tree, target_tree)
+    if changes is None:
+        return None, 0, 0
+    changed, deleted = changes
+
+    archive = tempfile.SpooledTemporaryFile(max_size=git_utils.ARCHIVE_SPOOL_SIZE)
+    try:
+        blobs = read_blobs(sorted({sha for _, sha, _ in changed}))
+        now = time.time()
+        with tarfile.open(fileobj=archive, mode='w', format=tarfile.PAX_FORMAT) as t:
+            deleted_data = '\0'.join(deleted).encode('utf-8', errors='surrogateescape')
+            info = tarfile.TarInfo(DELETED_MEMBER)
+            info.size = len(deleted_data)
+            info.mtime = now
+            t.addfile(info, io.BytesIO(deleted_data))
+
+            for mode, sha, path in changed:
+                data = blobs[sha]
+                info = tarfile.TarInfo(path)
+                info.mtime = now
+                if mode == '120000':
+                    info.type = tarfile.SYMTYPE
+                    info.linkname = data.decode('utf-8', errors='surrogateescape')
+                    t.addfile(info)
+                else:
+                    info.mode = 0o755 if mode == '100755' else 0o644
+                    info.size = len(data)
+                    t.addfile(info, io.BytesIO(data))
+        archive.seek(0)
+        return archive, len(changed), len(deleted)
+    except Exception:
+        archive.close()
+        return None, 0, 0
+
+def run_synced(branch, target_tree, debug_mode, type='all', quiet=False, extra_options=None):
+    """Exécute une vérification dans l'espace de travail persistant de la branche.
+
+    Seuls les fichiers modifiés depuis le dernier arbre synchronisé sont transmis;
+    la synchronisation est complète la première fois ou si l'espace de travail a divergé.
+    extra_options est transmis à l'entrypoint. Retourne (succès, logs) comme docker_utils.run_container.
+    """
+    key = get_workspace_key(branch)
+    lock_file = lock_workspace(key)
+    try:
+        base_tree = get_synced_tree(key)
+        # L'état est invalidé pendant la vérification et rétabli selon le marqueur sync-done
+        set_synced_tree(key, None)
+
+        archive = None
+        if base_tree is not None:
+            archive, changed_count, deleted_count = create_delta_archive(base_tree, target_tree)
+        if archive is not None:
+            if not quiet:
+                print(f"🔁  Synchronisation delta: {changed_count} fichier(s) modifié(s), {deleted_count} supprimé(s)")
+            success, logs = run_with_sync(archive, 'none', debug_mode, type, key, 'delta', base_tree, target_tree,
+                                          quiet, extra_options)
+            archive.close()
+            mismatch = any(kind == 'sync-mismatch' for kind, _ in docker_utils.parse_markers(logs))
+            if not mismatch:
+                return finish_sync(key, success, logs)
+            print(f"⚠️   Warn: Espace de travail de {branch} désynchronisé, synchronisation complète")
+
+        archive, compression = git_utils.create_archive(
+            target_tree, config_utils.get_setting("archive_compression", "none"))
+        if archive is None:
+            return False, compression
+        success, logs = run_with_sync(archive, compression, debug_mode, type, key, 'full', None, target_tree,
+                                      quiet, extra_options)
+        archive.close()
+        return finish_sync(key, success, logs)
+    finally:
+        lock_file.close()
+
+def run_with_sync(archive, compression, debug_mode, type, key, sync, base_tree, target_tree, quiet=False,
+                  extra_options=None):
+    """Lance le conteneur sur l'espace de travail persistant."""
+    options = [
+        '--workdir', f"{docker_utils.WORKSPACES_MOUNT}/{key}",
+        '--sync', sync,
+        '--target-tree', target_tree,
+    ]
+    if base_tree is not None:
+        options.extend(['--base-tree', base_tree])
+    options.extend(extra_options or [])
+    return docker_utils.run_container(archive, compression, debug_mode, type, options, quiet)
+
+def finish_sync(key, success, logs):
+    """Mémorise l'arbre synchronisé si le conteneur a restauré l'espace de travail."""
+    for kind, fields in docker_utils.parse_markers(logs):
+        if kind == 'sync-done' and fields:
+            set_synced_tree(key, fields[0])
+    return success, logs
@@ -1,12 +1,113 @@
 #!/usr/bin/env python3
 
 import argparse
+import base64
+import collections
+import concurrent.futures
+import contextlib
+import json
 import os
 import subprocess
 import sys
+import shutil
+import statistics
 import tarfile
+import tempfile
+import threading
+import time
 import logging
 import re
+import shlex
+import zlib
+import xml.etree.ElementTree as ET
+
+# Préfixe des lignes de contrôle lues par ci_test sur l'hôte
+MARKER_PREFIX = '::ci_test::'
+
+# Membre des archives delta listant les fichiers supprimés (séparés par des NUL)
+DELETED_MEMBER = '.ci_test_meta/deleted'
+
+# Fin de la sortie de make conservée pour le rapport d'échec en mode non-verbeux
+DEFAULT_TAIL_BYTES = 256 * 1024
+
+# Code de retour lorsque l'espace de travail persistant n'est pas sur l'arbre attendu
+SYNC_MISMATCH_EXIT = 75
+
+# Filtre Criterion ne correspondant à aucun test: make tests_run compile sans exécuter
+NO_MATCH_PATTERN = 'ci_test_no_match/ci_test_no_match'
+
+# Préfixe du répertoire temporaire (hors de l'espace de travail, propre à chaque job)
+# des rapports XML de chaque shard
+SHARD_REPORTS_PREFIX = 'ci_test_shards-'
+
+# Taille maximale d'un argument --filter (le noyau limite chaque argument à 128 Kio):
+# au-delà, les tests d'un shard sont exécutés en plusieurs appels du binaire
+MAX_FILTER_BYTES = 96 * 1024
+
+# Durée maximale d'un appel d'un binaire de tests dans un shard (secondes)
+SHARD_CHUNK_TIMEOUT = 3600
+
+# Fichiers vérifiés par la pré-vérification syntaxique (--syntax-check)
+SOURCE_EXTENSIONS = ('.c', '.cc', '.cpp', '.cxx')
+HEADER_EXTENSIONS = ('.h', '.hh', '.hpp', '.hxx')
+
+# Compilateurs reconnus dans la sortie de make -n (préfixes de cross-compilation compris)
+COMPILER_PATTERN = re.compile(r'^(?:.*-)?(?:gcc|g\+\+|cc|c\+\+|clang|clang\+\+)(?:-[\d.]+)?$')
+
+# Sous-make (make -C) annoncé par make -n: les chemins qui suivent sont relatifs à ce répertoire
+MAKE_DIRECTORY_PATTERN = re.compile(r"^make(?:\[\d+\])?: (Entering|Leaving) directory '(.*)'$")
+
+# Un header modifié est vérifié à travers les sources du build qui l'incluent (au plus ce nombre)
+INCLUDE_PATTERN = re.compile(r'^\s*#\s*include\s*[<"]([^>"]+)[>"]', re.MULTILINE)
+MAX_HEADER_INCLUDERS = 4
+
+# Analyse d'impact des tests (--record-deps): répertoires propres à chaque job
+DEPS_WRAPPER_DIR = '/tmp/ci_test_deps_bin-{pid}'
+DEPS_RECORDS_DIR = '/tmp/ci_test_deps-{pid}'
+
+# Variable d'environnement indiquant aux compilateurs enveloppés où enregistrer les dépendances
+DEPS_DIR_ENV = 'CI_TEST_DEPS_DIR'
+
+# Premier argument de l'entrypoint lorsqu'il est appelé comme compilateur enveloppé
+WRAP_COMPILER_FLAG = '--wrap-compiler'
+
+# Compilateurs enveloppés pour enregistrer les dépendances
+WRAPPED_COMPILERS = ('gcc', 'g++', 'cc', 'c++', 'clang', 'clang++')
+
+# Options du compilateur suivies d'une valeur séparée
+OPTIONS_WITH_VALUE = ('-o', '-I', '-L', '-l', '-D', '-U', '-include', '-imacros', '-isystem', '-iquote',
+                      '-idirafter', '-MF', '-MT', '-MQ', '-x', '-Xlinker', '-T', '-u')
+
+# Commandes laissées telles quelles par le compilateur enveloppé (pas de compilation vers un objet)
+WRAPPER_PASSTHROUGH = ('-E', '-S', '-M', '-MM', '-x', '-fsyntax-only', '-shared')
+
+# Cibles de nettoyage: une cible qui en dépend n'est pas lancée avec make -j
+CLEAN_TARGETS = {'clean', 'fclean', 're'}
+
+# Longueur maximale de CRITERION_TEST_PATTERN (le noyau limite chaque variable d'environnement
+# à 128 Kio): au-delà, tous les tests sont exécutés
+MAX_TEST_PATTERN_BYTES = 96 * 1024
+
+# Déclarations de tests Criterion: Test(suite, nom), ParameterizedTest(param, suite, nom), Theory((...), suite, nom)
+TEST_MACRO_PATTERN = re.compile(r'\b(Test|ParameterizedTest|Theory)\s*\(')
+
+# Transmettre la durée des phases à ci_test (--trace, activé par ci_test --profile)
+TRACE_SPANS = False
+
+def emit_marker(kind, *fields):
+    """Émet une ligne de contrôle destinée à ci_test (début/fin d'étape, etc.)."""
+    sys.stdout.flush()
+    print(' '.join([MARKER_PREFIX + kind] + [str(f) for f in fields]), file=sys.stderr, flush=True)
+
+@contextlib.contextmanager
+def trace_span(name):
+    """Mesure la durée d'une phase et la transmet à ci_test (marqueur span nom début durée)."""
+    start = time.time()
+    try:
+        yield
+    finally:
+        if TRACE_SPANS:
+            emit_marker('span', name, f"{start:.6f}", f"{time.time() - start:.6f}")
 
 def setup_logging(verbose):
     """Configure le système de logging selon le niveau de verbosité."""
@@ -18,25 +119,122 @@ def setup_logging(verbose):
     )
     return logging.getLogger('ci_entrypoint')
 
+def parse_bool(value):
+    """Convertit "true"/"false" en booléen (type=bool considérerait "false" comme vrai)."""
+    return str(value).strip().lower() in ('true', '1', 'yes', 'on')
+
 def parse_arguments():
     """Parse les arguments de la ligne de commande."""
     parser = argparse.ArgumentParser(description='CI Test Docker Entrypoint')
-    parser.add_argument('type', type=str, choices=['build', 'tests'], default='build',
-                        help='Type d\'opération à effectuer: build ou tests')
-    parser.add_argument('--verbose', type=bool, default=False,
+    parser.add_argument('type', type=str, choices=['build', 'tests', 'all'], default='build',
+                        help='Type d\'opération à effectuer: build, tests ou all (build puis tests sur le même arbre)')
+    parser.add_argument('--verbose', type=parse_bool, default=False,
                         help='Mode verbeux pour afficher tous les logs')
     parser.add_argument('--workdir', type=str, default='/workspace',
                         help='Répertoire de travail pour l\'extraction et la compilation')
+    parser.add_argument('--archive', type=str, default='/mnt/project.tar',
+                        help='Archive du projet à extraire ("-" pour la lire en flux sur stdin)')
+    parser.add_argument('--compression', type=str, choices=['none', 'gzip', 'zstd'], default='none',
+                        help='Compression de l\'archive')
+    parser.add_argument('--sync', type=str, choices=['none', 'full', 'delta'], default='none',
+                        help='Espace de travail persistant: none (éphémère), full (resynchronisation complète) '
+                             'ou delta (seuls les fichiers modifiés depuis --base-tree sont transmis)')
+    parser.add_argument('--base-tree', type=str, default=None,
+                        help='Arbre git sur lequel l\'espace de travail doit être synchronisé (mode delta)')
+    parser.add_argument('--target-tree', type=str, default=None,
+                        help='Arbre git transmis par l\'archive (espace de travail persistant)')
+    parser.add_argument('--ccache', action='store_true',
+                        help='Active le cache de compilation ccache (CC/CXX enveloppés)')
+    parser.add_argument('--ccache-dir', type=str, default='/ccache',
+                        help='Répertoire du cache ccache (volume Docker persistant)')
+    parser.add_argument('--ccache-max-size', type=str, default='5G',
+                        help='Taille maximale du cache ccache')
+    parser.add_argument('--log-tail-kb', type=int, default=256,
+                        help='Ko de sortie conservés (fin des logs) pour le rapport d\'échec en mode non-verbeux')
+    parser.add_argument('--jobs', type=int, default=0,
+                        help='Nombre de jobs make en parallèle (0: CPU disponibles pour le conteneur)')
+    parser.add_argument('--reset', action='store_true',
+                        help='Vide le répertoire de travail avant l\'extraction (conteneur réutilisé)')
+    parser.add_argument('--skip-clean', action='store_true',
+                        help='N\'exécute pas make fclean à la fin (répertoire de travail jetable ou restauré)')
+    parser.add_argument('--test-shards', type=str, default='0',
+                        help='Nombre de shards pour les tests Criterion (0: make tests_run classique, '
+                             'auto: autant que de jobs)')
+    parser.add_argument('--trace', action='store_true',
+                        help='Transmet la durée de chaque phase (extraction, make, tests...) à ci_test')
+    parser.add_argument('--test-durations', type=str, default=None,
+                        help='Durées des tests lors des exécutions précédentes (JSON compressé zlib, en base64)')
+    parser.add_argument('--record-deps', action='store_true',
+                        help='Enregistre les dépendances de chaque fichier de tests (analyse d\'impact)')
+    parser.add_argument('--test-impact', type=str, default=None,
+                        help='Fichiers de tests à exécuter, les autres tests étant ignorés '
+                             '(liste JSON compressée zlib, en base64)')
+    parser.add_argument('--syntax-check', type=str, default=None,
+                        help='Fichiers modifiés à compiler en -fsyntax-only avant le build complet '
+                             '(liste JSON compressée zlib, en base64)')
 
     # Structure extensible pour ajouter facilement d'autres arguments à l'avenir
     return parser.parse_args()
 
-def extract_tarball(input_path, output_path, logger):
-    """Extrait le tarball Git vers le répertoire de travail."""
-    logger.info(f"Extraction du tarball {input_path} vers {output_path}")
+def reset_workdir(workdir, logger):
+    """Vide le répertoire de travail laissé par un job précédent."""
+    logger.info(f"Réinitialisation du répertoire de travail {workdir}")
     try:
-        with tarfile.open(input_path) as t:
-            t.extractall(output_path)
+        os.makedirs(workdir, exist_ok=True)
+        for entry in os.listdir(workdir):
+            path = os.path.join(workdir, entry)
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        return True
+    except Exception as e:
+        logger.error(f"Erreur lors de la réinitialisation: {e}")
+        return False
+
+def apply_deletions(workdir, deleted_paths, logger):
+    """Supprime les fichiers retirés de l'arbre depuis la dernière synchronisation."""
+    root = os.path.realpath(workdir)
+    for relative_path in deleted_paths:
+        path = os.path.realpath(os.path.join(workdir, relative_path))
+        if not path.startswith(root + os.sep):
+            logger.warning(f"Chemin ignoré hors de l'espace de travail: {relative_path}")
+            continue
+        if os.path.lexists(path) and not os.path.isdir(path):
+            os.remove(path)
+        # Supprimer les répertoires devenus vides (un fichier peut remplacer un répertoire)
+        parent = os.path.dirname(path)
+        while parent != root and os.path.isdir(parent) and not os.listdir(parent):
+            os.rmdir(parent)
+            parent = os.path.dirname(parent)
+    logger.info(f"{len(deleted_paths)} fichier(s) supprimé(s) de l'espace de travail")
+
+def extract_tarball(input_path, output_path, logger, compression='none'):
+    """Extrait le tarball Git vers le répertoire de travail, en flux si input_path vaut "-"."""
+    source = 'stdin' if input_path == '-' else input_path
+    logger.info(f"Extraction du tarball {source} ({compression}) vers {output_path}")
+    decompressor = None
+    try:
+        stream = sys.stdin.buffer if input_path == '-' else open(input_path, 'rb')
+        if compression == 'zstd':
+            # tarfile ne gère pas zstd: décompression en flux par le binaire zstd
+            decompressor = subprocess.Popen(['zstd', '-d', '-c', '-q'], stdin=stream, stdout=subprocess.PIPE)
+            stream = decompressor.stdout
+        mode = 'r|gz' if compression == 'gzip' else 'r|'
+
+        with tarfile.open(fileobj=stream, mode=mode) as t:
+            for member in t:
+                if member.name == DELETED_MEMBER:
+                    # Placé en tête des archives delta: appliqué avant les ajouts
+                    content = t.extractfile(member).read().decode('utf-8')
+                    apply_deletions(output_path, [p for p in content.split('\0') if p], logger)
+                    continue
+                t.extract(member, output_path)
+        stream.close()
+
+        if decompressor is not None and decompressor.wait() != 0:
+            logger.error("Erreur lors de la décompression zstd")
+            return False
         logger.debug("Extraction réussie")
         return True
     except Exception as e:
@@ -75,35 +273,266 @@ def get_binary_names_from_makefile(workdir, logger):
         logger.error(f"Erreur lors de la lecture du Makefile: {e}")
         return None
 
-def run_build(workdir, verbose, logger):
-    """Exécute la commande de build dans le répertoire de travail."""
-    logger.info("Lancement de la compilation (make re)")
+def get_available_cpus():
+    """Nombre de CPU utilisables par le conteneur (affinité et quota cgroup)."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except (AttributeError, OSError):
+        cpus = os.cpu_count() or 1
+
+    quota = None
+    try:
+        # cgroup v2: "<quota> <période>" ou "max <période>"
+        with open('/sys/fs/cgroup/cpu.max') as f:
+            fields = f.read().split()
+        if fields[0] != 'max':
+            quota = int(fields[0]) / int(fields[1])
+    except (OSError, ValueError, IndexError):
+        try:
+            # cgroup v1
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us') as f:
+                quota_us = int(f.read())
+            with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us') as f:
+                period_us = int(f.read())
+            if quota_us > 0 and period_us > 0:
+                quota = quota_us / period_us
+        except (OSError, ValueError):
+            pass
 
-    cmd = ['make', 're']
+    if quota is not None:
+        cpus = min(cpus, max(1, int(quota + 0.999)))
+    return max(1, cpus)
+
+def run_make(cmd, workdir, verbose, logger, error_message, tail_bytes=DEFAULT_TAIL_BYTES, env=None):
+    """Exécute une commande make et retourne son code de retour."""
+    targets = [arg for arg in cmd[1:] if not arg.startswith('-')]
+    with trace_span(f"make:{'+'.join(targets) or 'all'}"):
+        return _run_make(cmd, workdir, verbose, logger, error_message, tail_bytes, env)
+
+def _run_make(cmd, workdir, verbose, logger, error_message, tail_bytes, env):
     # Ne jamais utiliser --quiet, même en mode non-verbose
     # pour pouvoir afficher les sorties complètes en cas d'échec
+    if verbose:
+        # En mode verbose, afficher tous les logs en temps réel
+        return subprocess.call(cmd, cwd=workdir, env=env)
+
+    # En mode non-verbose, ne conserver que la fin des logs pour l'afficher en cas d'erreur:
+    # la mémoire reste bornée même avec des erreurs de templates de plusieurs Mo
+    process = subprocess.Popen(
+        cmd,
+        cwd=workdir,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        env=env
+    )
+    tail = collections.deque()
+    size = 0
+    dropped = 0
+    for raw_line in process.stdout:
+        tail.append(raw_line)
+        size += len(raw_line)
+        while size > tail_bytes and len(tail) > 1:
+            size -= len(tail.popleft())
+            dropped += 1
+    process.stdout.close()
+    ret = process.wait()
+
+    if ret != 0:
+        logger.error(error_message)
+        output = b''.join(tail).decode(errors='replace')
+        if dropped:
+            output = f"[... {dropped} ligne(s) tronquée(s) ...]\n{output}"
+        logger.error(f"SORTIE: {output}")
+    return ret
+
+def decode_file_list(encoded, logger):
+    """Décode une liste de fichiers transmise par ci_test (--syntax-check, --test-impact), ou None."""
+    try:
+        return json.loads(zlib.decompress(base64.b64decode(encoded)).decode())
+    except Exception as e:
+        logger.warning(f"Liste de fichiers illisible, ignorée: {e}")
+        return None
 
+def get_compile_commands(workdir, logger):
+    """Commandes de compilation du projet, d'après make -n -B (rien n'est compilé).
+
+    Retourne {fichier source relatif à workdir: (répertoire, arguments du compilateur)},
+    ou None si make -n échoue.
+    """
     try:
-        if verbose:
-            # En mode verbose, afficher tous les logs en temps réel
-            ret = subprocess.call(cmd, cwd=workdir)
+        result = subprocess.run(
+            ['make', '-n', '-B', '-w'],
+            cwd=workdir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            env=dict(os.environ, LC_ALL='C'),
+            timeout=60
+        )
+    except Exception as e:
+        logger.warning(f"make -n impossible, pré-vérification ignorée: {e}")
+        return None
+    output = result.stdout.decode(errors='replace')
+    if result.returncode != 0:
+        logger.warning(f"make -n a échoué, pré-vérification ignorée:\n{output[-2000:]}")
+        return None
+
+    commands = {}
+    directories = [workdir]
+    for line in output.replace('\\\n', ' ').splitlines():
+        directory = MAKE_DIRECTORY_PATTERN.match(line.strip())
+        if directory:
+            if directory.group(1) == 'Entering':
+                directories.append(directory.group(2))
+            elif len(directories) > 1:
+                directories.pop()
+            continue
+        try:
+            argv = shlex.split(line)
+        except ValueError:
+            continue
+        if argv and os.path.basename(argv[0]) == 'ccache':
+            argv = argv[1:]
+        # Seules les commandes simples "compilateur ... -c source" sont reprises
+        if not argv or not COMPILER_PATTERN.match(os.path.basename(argv[0])) or '-c' not in argv:
+            continue
+        if any(token in ('&&', '||', ';', '|') for token in argv):
+            continue
+        for token in argv[1:]:
+            if token.endswith(SOURCE_EXTENSIONS):
+                path = os.path.relpath(os.path.join(directories[-1], token), workdir)
+                commands.setdefault(os.path.normpath(path), (directories[-1], argv))
+    return commands
+
+def to_syntax_command(argv):
+    """Transforme une commande de compilation en vérification -fsyntax-only (aucun fichier produit)."""
+    command = [argv[0], '-fsyntax-only']
+    skip_next = False
+    for token in argv[1:]:
+        if skip_next:
+            skip_next = False
+        elif token in ('-o', '-MF', '-MT', '-MQ'):
+            skip_next = True
+        elif token in ('-c', '-M', '-MM', '-MD', '-MMD', '-MP') or token.startswith('-o'):
+            continue
         else:
-            # En mode non-verbose, capturer les logs pour les afficher uniquement en cas d'erreur
-            # mais ne pas utiliser --quiet pour avoir les sorties complètes
-            process = subprocess.Popen(
-                cmd,
-                cwd=workdir,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
-            stdout, stderr = process.communicate()
-            ret = process.returncode
-
-            if ret != 0:
-                logger.error("Échec de la compilation")
-                logger.error(f"STDOUT: {stdout}")
-                logger.error(f"STDERR: {stderr}")
+            command.append(token)
+    return command
+
+def find_includers(workdir, commands, header):
+    """Sources du build qui incluent directement un header (au plus MAX_HEADER_INCLUDERS).
+
+    Un header n'est pas compilable seul (types fournis par les includes de la source,
+    #pragma once...): ses erreurs sont celles des sources qui l'incluent.
+    """
+    name = os.path.basename(header)
+    includers = []
+    for source in sorted(commands):
+        included = INCLUDE_PATTERN.findall(read_source(os.path.join(workdir, source)))
+        if any(os.path.basename(path) == name for path in included):
+            includers.append(source)
+            if len(includers) >= MAX_HEADER_INCLUDERS:
+                break
+    return includers
+
+def check_syntax(directory, command):
+    """Exécute une vérification syntaxique. Retourne (succès, sortie du compilateur)."""
+    try:
+        result = subprocess.run(command, cwd=directory, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        return result.returncode == 0, result.stdout.decode(errors='replace')
+    except Exception as e:
+        return False, f"{' '.join(command)}: {e}\n"
+
+def run_syntax_check(workdir, files, logger, jobs=1, tail_bytes=DEFAULT_TAIL_BYTES):
+    """Compile en -fsyntax-only les fichiers modifiés, avant le build complet.
+
+    Les options de compilation de chaque fichier sont celles de make -n. Un header modifié
+    est vérifié en compilant les sources du build qui l'incluent. Les fichiers que le build
+    ne compile pas (sources des tests par exemple) sont ignorés.
+    Retourne 0 si aucune erreur n'est détectée ou si la pré-vérification est impossible.
+    """
+    # make annonce les répertoires par leur chemin réel
+    workdir = os.path.realpath(workdir)
+    commands = get_compile_commands(workdir, logger)
+    if commands is None:
+        return 0
+
+    sources = []
+    ignored = 0
+    for path in files:
+        if path.endswith(SOURCE_EXTENSIONS) and os.path.normpath(path) in commands:
+            found = [os.path.normpath(path)]
+        elif path.endswith(HEADER_EXTENSIONS) and os.path.exists(os.path.join(workdir, path)):
+            found = find_includers(workdir, commands, path)
+        else:
+            found = []
+        if not found:
+            ignored += 1
+        sources.extend(source for source in found if source not in sources)
+    checks = [(source, commands[source][0], to_syntax_command(commands[source][1])) for source in sources]
+    logger.info(f"Pré-vérification syntaxique de {len(checks)} source(s)"
+                + (f" ({ignored} ignoré(s), hors du build)" if ignored else ""))
+    if not checks:
+        return 0
+
+    start_time = time.time()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        outcomes = list(executor.map(lambda check: check_syntax(check[1], check[2]), checks))
+    elapsed = time.time() - start_time
+    failed = [(path, output) for (path, _, _), (ok, output) in zip(checks, outcomes) if not ok]
+    emit_marker('syntax', len(checks), len(failed), f"{elapsed:.2f}")
+
+    if failed:
+        logger.error(f"Erreurs de syntaxe dans {len(failed)} fichier(s): {', '.join(path for path, _ in failed)}")
+        output = ''.join(output for _, output in failed)
+        if len(output) > tail_bytes:
+            output = f"[... sortie tronquée ...]\n{output[-tail_bytes:]}"
+        logger.error(f"SORTIE: {output}")
+        return 1
+    logger.info(f"Aucune erreur de syntaxe ({elapsed:.2f}s)")
+    return 0
+
+def get_target_jobs(workdir, target, jobs, logger):
+    """Nombre de jobs make sûr pour une cible: 1 si elle dépend d'une cible de nettoyage.
+
+    "tests_run: fclean $(TEST_OBJ)" n'est pas sûr avec -j (fclean s'exécuterait en parallèle
+    de la compilation). Les dépendances sont lues dans la base de règles de make -p -q.
+    """
+    if jobs <= 1:
+        return jobs
+    try:
+        result = subprocess.run(
+            ['make', '-p', '-q', '--no-print-directory', target],
+            cwd=workdir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            env=dict(os.environ, LC_ALL='C'),
+            timeout=60
+        )
+    except Exception:
+        return 1
+    for line in result.stdout.decode(errors='replace').splitlines():
+        if line.startswith(f"{target}:") and not line.startswith(f"{target}::"):
+            prerequisites = line[len(target) + 1:].split('|')[0].split()
+            if any(name in CLEAN_TARGETS for name in prerequisites):
+                logger.info(f"La cible {target} dépend de {', '.join(sorted(CLEAN_TARGETS & set(prerequisites)))}: "
+                            "make sans -j")
+                return 1
+            return jobs
+    return 1
+
+def run_build(workdir, verbose, logger, jobs=1, tail_bytes=DEFAULT_TAIL_BYTES):
+    """Exécute la commande de build dans le répertoire de travail."""
+    try:
+        if jobs > 1:
+            # "re: fclean all" n'est pas sûr avec -j (fclean et all s'exécuteraient
+            # en parallèle): on enchaîne donc fclean puis la cible par défaut
+            logger.info(f"Lancement de la compilation (make fclean puis make -j{jobs})")
+            ret = run_make(['make', 'fclean'], workdir, verbose, logger, "Échec de la compilation", tail_bytes)
+            if ret == 0:
+                ret = run_make(['make', f'-j{jobs}'], workdir, verbose, logger, "Échec de la compilation", tail_bytes)
+        else:
+            logger.info("Lancement de la compilation (make re)")
+            ret = run_make(['make', 're'], workdir, verbose, logger, "Échec de la compilation", tail_bytes)
 
         if ret != 0:
             return ret, None
@@ -130,104 +559,837 @@ def run_build(workdir, verbose, logger):
         logger.error(f"Erreur lors de la compilation: {e}")
         return 1, None
 
-def run_tests(workdir, verbose, logger):
-    """Exécute les tests dans le répertoire de travail."""
-    logger.info("Lancement des tests (make tests_run)")
-    cmd = ['make', 'tests_run']
-    # Ne jamais utiliser --quiet, même en mode non-verbose
-    try:
-        if verbose:
-            # En mode verbose, afficher tous les logs en temps réel
-            ret = subprocess.call(cmd, cwd=workdir)
+def run_tests(workdir, verbose, logger, jobs=1, tail_bytes=DEFAULT_TAIL_BYTES, shards=0, durations=None,
+              selection=None):
+    """Exécute les tests dans le répertoire de travail.
+
+    selection: tests à exécuter ("suite/nom", analyse d'impact), None pour tous.
+    """
+    if selection is not None and not selection:
+        logger.info("Aucun test concerné par les modifications")
+        return 0
+
+    if shards > 1:
+        result = run_sharded_tests(workdir, verbose, logger, jobs, tail_bytes, shards, durations or {},
+                                   set(selection) if selection is not None else None)
+        if result is not None:
+            return result
+        logger.warning("Tests non découpables en shards, exécution classique de make tests_run")
+
+    env = None
+    if selection is not None:
+        pattern = '@(' + '|'.join(selection) + ')'
+        if len(pattern) > MAX_TEST_PATTERN_BYTES:
+            logger.warning(f"{len(selection)} test(s) concerné(s), filtre trop long: exécution de tous les tests")
         else:
-            # En mode non-verbose, capturer les logs pour les afficher uniquement en cas d'erreur
-            process = subprocess.Popen(
-                cmd,
-                cwd=workdir,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
-            stdout, stderr = process.communicate()
-            ret = process.returncode
-
-            if ret != 0:
-                logger.error("Échec des tests")
-                logger.error(f"STDOUT: {stdout}")
-                logger.error(f"STDERR: {stderr}")
-
-        return ret
+            logger.info(f"{len(selection)} test(s) concerné(s) par les modifications")
+            env = dict(os.environ, CRITERION_TEST_PATTERN=pattern)
+    jobs = get_target_jobs(workdir, 'tests_run', jobs, logger)
+    logger.info(f"Lancement des tests (make -j{jobs} tests_run)")
+    try:
+        return run_make(['make', f'-j{jobs}', 'tests_run'], workdir, verbose, logger, "Échec des tests", tail_bytes,
+                        env)
     except Exception as e:
         logger.error(f"Erreur lors de l'exécution des tests: {e}")
         return 1
 
-def run_clean(workdir, verbose, logger):
-    """Exécute la commande make fclean dans le répertoire de travail."""
-    logger.info("Nettoyage du projet (make fclean)")
+def decode_durations(encoded, logger):
+    """Décode les durées transmises par ci_test (--test-durations)."""
+    if not encoded:
+        return {}
+    try:
+        return json.loads(zlib.decompress(base64.b64decode(encoded)).decode())
+    except Exception as e:
+        logger.warning(f"Durées des tests illisibles, répartition sans historique: {e}")
+        return {}
 
-    cmd = ['make', 'fclean']
-    # Ne jamais utiliser --quiet, même en mode non-verbose
+def find_criterion_binaries(workdir):
+    """Cherche les exécutables liés à Criterion produits par la compilation."""
+    binaries = []
+    for root, dirs, files in os.walk(workdir):
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        for name in files:
+            path = os.path.join(root, name)
+            if '.so' in name or os.path.islink(path) or not os.access(path, os.X_OK):
+                continue
+            try:
+                with open(path, 'rb') as f:
+                    if f.read(4) != b'\x7fELF':
+                        continue
+                    if b'criterion' in f.read():
+                        binaries.append(path)
+            except OSError:
+                continue
+    return sorted(binaries)
+
+def list_criterion_tests(binary, workdir):
+    """Liste les tests d'un binaire Criterion (--list). Retourne ["suite/test"] ou None."""
+    try:
+        result = subprocess.run(
+            [binary, '--list'],
+            cwd=workdir,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            timeout=60
+        )
+    except Exception:
+        return None
+    if result.returncode != 0:
+        return None
+
+    tests = []
+    suite = None
+    for line in result.stdout.decode(errors='replace').splitlines():
+        test = re.match(r'^\s*(?:├──|└──|\|--|`--)\s*(\S+)', line)
+        if test and suite is not None:
+            tests.append(f"{suite}/{test.group(1)}")
+            continue
+        header = re.match(r'^(\S+): \d+ tests?$', line.strip())
+        if header:
+            suite = header.group(1)
+    return tests
+
+def plan_shards(tests, durations, count):
+    """Répartit les tests en shards équilibrés (plus longs d'abord, dans le shard le moins chargé).
+
+    Les tests sans historique reçoivent la durée médiane des tests connus.
+    """
+    known = [durations[test] for test in tests if test in durations]
+    default = statistics.median(known) if known else 1.0
+    shards = [[0.0, index, []] for index in range(count)]
+    for test in sorted(tests, key=lambda t: (-durations.get(t, default), t)):
+        shard = min(shards)
+        shard[0] += durations.get(test, default)
+        shard[2].append(test)
+    return [(load, tests) for load, _, tests in shards if tests]
+
+def parse_criterion_xml(path):
+    """Lit un rapport XML Criterion. Retourne {"suite/test": (statut, durée, message)}."""
+    results = {}
+    for suite in ET.parse(path).getroot().iter('testsuite'):
+        for case in suite.iter('testcase'):
+            name = f"{suite.get('name')}/{case.get('name')}"
+            status = (case.get('status') or '').lower()
+            failure = case.find('failure')
+            error = case.find('error')
+            if case.find('skipped') is not None or status == 'skipped':
+                status = 'skipped'
+            elif error is not None or status == 'errored':
+                status = 'crashed'
+            elif failure is not None or status == 'failed':
+                status = 'failed'
+            else:
+                status = 'passed'
+            detail = failure if failure is not None else error
+            message = ((detail.text or detail.get('message') or '') if detail is not None else '').strip()
+            try:
+                duration = float(case.get('time') or 0)
+            except ValueError:
+                duration = 0.0
+            results[name] = (status, duration, message)
+    return results
+
+def chunk_tests(tests, max_bytes=MAX_FILTER_BYTES):
+    """Découpe une liste de tests en groupes dont le filtre @(t1|t2|...) tient dans max_bytes."""
+    chunks = []
+    chunk = []
+    size = len('--filter=@()')
+    for name in tests:
+        if chunk and size + len(name) + 1 > max_bytes:
+            chunks.append(chunk)
+            chunk = []
+            size = len('--filter=@()')
+        chunk.append(name)
+        size += len(name) + 1
+    if chunk:
+        chunks.append(chunk)
+    return chunks
+
+def run_shard(index, shard, workdir, reports_dir, tail_bytes, outcome):
+    """Exécute un shard: chaque binaire avec un filtre limité à ses tests, un test à la fois.
+
+    Les tests d'un binaire sont passés par groupes (voir chunk_tests). Un appel qui échoue
+    (délai dépassé, binaire impossible à lancer...) compte ses tests comme plantés.
+    """
+    results = {}
+    tail = collections.deque()
+    size = 0
+    ok = True
+    position = 0
+    for binary, binary_tests in shard:
+        for tests in chunk_tests(binary_tests):
+            report = os.path.join(reports_dir, f"{index}-{position}.xml")
+            position += 1
+            pattern = '@(' + '|'.join(tests) + ')'
+            try:
+                process = subprocess.run(
+                    [binary, f'--filter={pattern}', '--jobs=1', f'--xml={report}'],
+                    cwd=workdir,
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.STDOUT,
+                    timeout=SHARD_CHUNK_TIMEOUT
+                )
+                output = process.stdout
+                error = f"code de retour {process.returncode}"
+            except subprocess.TimeoutExpired as e:
+                output = e.output or b''
+                error = f"délai de {SHARD_CHUNK_TIMEOUT}s dépassé"
+            except Exception as e:
+                output = f"{os.path.basename(binary)}: {e}\n".encode()
+                error = str(e)
+            for raw_line in output.splitlines(keepends=True):
+                tail.append(raw_line)
+                size += len(raw_line)
+                while size > tail_bytes and len(tail) > 1:
+                    size -= len(tail.popleft())
+            try:
+                parsed = parse_criterion_xml(report)
+            except Exception:
+                parsed = {}
+            for name in tests:
+                # Un test absent du rapport (binaire planté, timeout...) est compté comme planté
+                status, duration, message = parsed.get(name, ('crashed', 0.0, error))
+                results[(binary, name)] = (status, duration, message)
+                if status in ('failed', 'crashed'):
+                    ok = False
+    outcome[index] = (ok, results, b''.join(tail).decode(errors='replace'))
+
+def run_traced_shard(index, shard, workdir, reports_dir, tail_bytes, outcome):
+    """Exécute un shard en mesurant sa durée."""
+    with trace_span(f"tests:shard-{index + 1}"):
+        run_shard(index, shard, workdir, reports_dir, tail_bytes, outcome)
+
+def run_sharded_tests(workdir, verbose, logger, jobs, tail_bytes, shards, durations, selection=None):
+    """Exécute les tests Criterion répartis sur plusieurs processus.
+
+    make tests_run compile les tests avec un filtre qui n'en sélectionne aucun, puis chaque
+    shard exécute sa part avec --filter. Retourne le code de retour, ou None si les tests ne
+    peuvent pas être découpés (aucun binaire Criterion, liste indisponible, compilation en échec).
+    """
+    jobs = get_target_jobs(workdir, 'tests_run', jobs, logger)
+    logger.info(f"Compilation des tests (make -j{jobs} tests_run, aucun test exécuté)")
+    env = dict(os.environ, CRITERION_TEST_PATTERN=NO_MATCH_PATTERN)
+    if run_make(['make', f'-j{jobs}', 'tests_run'], workdir, verbose, logger,
+                "Échec de la compilation des tests", tail_bytes, env) != 0:
+        return None
+
+    tests = []
+    for binary in find_criterion_binaries(workdir):
+        listed = list_criterion_tests(binary, workdir)
+        if listed is None:
+            return None
+        relative = os.path.relpath(binary, workdir)
+        tests.extend(f"{relative}:{name}" for name in listed
+                     if selection is None or name in selection)
+    if not tests:
+        return None
 
+    plan = plan_shards(tests, durations, min(shards, len(tests)))
+    logger.info(f"{len(tests)} test(s) répartis sur {len(plan)} shard(s), "
+                f"durée estimée du plus long: {max(load for load, _ in plan):.2f}s")
+
+    # Un répertoire par job: plusieurs vérifications peuvent partager /tmp (runner local)
+    reports_dir = tempfile.mkdtemp(prefix=SHARD_REPORTS_PREFIX)
+    outcome = {}
+    workers = []
+    start_time = time.time()
     try:
-        if verbose:
-            # En mode verbose, afficher tous les logs en temps réel
-            ret = subprocess.call(cmd, cwd=workdir)
+        for index, (_, shard_tests) in enumerate(plan):
+            by_binary = collections.OrderedDict()
+            for key in shard_tests:
+                relative, name = key.split(':', 1)
+                by_binary.setdefault(os.path.join(workdir, relative), []).append(name)
+            worker = threading.Thread(target=run_traced_shard,
+                                      args=(index, list(by_binary.items()), workdir, reports_dir, tail_bytes,
+                                            outcome))
+            worker.start()
+            workers.append(worker)
+    finally:
+        for worker in workers:
+            worker.join()
+        shutil.rmtree(reports_dir, ignore_errors=True)
+    elapsed = time.time() - start_time
+
+    counts = collections.Counter()
+    slowest = 0.0
+    success = True
+    for index in range(len(plan)):
+        ok, results, output = outcome.get(index, (False, {}, "Shard interrompu"))
+        shard_time = 0.0
+        for (binary, name), (status, duration, message) in sorted(results.items()):
+            key = f"{os.path.relpath(binary, workdir)}:{name}"
+            counts[status] += 1
+            shard_time += duration
+            emit_marker('test', status, f"{duration:.4f}", key)
+            if status in ('failed', 'crashed'):
+                logger.error(f"{status.upper()}: {key}" + (f"\n{message}" if message else ""))
+        slowest = max(slowest, shard_time)
+        if not ok:
+            success = False
+            if not verbose and output:
+                logger.error(f"SORTIE (shard {index + 1}): {output}")
+        elif verbose and output:
+            print(output, end='', flush=True)
+    emit_marker('test-shards', len(plan), f"{elapsed:.2f}", f"{slowest:.2f}")
+    logger.info(f"Tests: {counts['passed']} réussi(s), {counts['failed']} échoué(s), {counts['crashed']} planté(s), "
+                f"{counts['skipped']} ignoré(s) en {elapsed:.2f}s ({len(plan)} shard(s))")
+    return 0 if success else 1
+
+def split_compiler_args(argv):
+    """Repère les sources et la sortie d'une commande de compilation.
+
+    Retourne (positions des sources dans argv, position de la valeur de -o ou None).
+    """
+    sources = []
+    output = None
+    index = 0
+    while index < len(argv):
+        arg = argv[index]
+        if arg in OPTIONS_WITH_VALUE:
+            if arg == '-o':
+                output = index + 1
+            index += 2
+            continue
+        if not arg.startswith('-') and arg.endswith(SOURCE_EXTENSIONS):
+            sources.append(index)
+        index += 1
+    return sources, output if output is not None and output < len(argv) else None
+
+def find_real_compiler(name):
+    """Compilateur appelé par un compilateur enveloppé: le suivant dans le PATH (ccache compris)."""
+    wrapper_prefix = os.path.basename(DEPS_WRAPPER_DIR.format(pid=''))
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        if os.path.basename(directory.rstrip('/')).startswith(wrapper_prefix):
+            continue
+        candidate = os.path.join(directory, name)
+        if os.path.isfile(candidate) and os.access(candidate, os.X_OK):
+            return candidate
+    return None
+
+def write_dependency_record(records_dir, source, output, deps):
+    """Enregistre une compilation: source, objet produit et fichier de dépendances (-MMD)."""
+    cwd = os.getcwd()
+    record = {
+        "source": os.path.normpath(os.path.join(cwd, source)),
+        "object": os.path.normpath(os.path.join(cwd, output)),
+        "deps": os.path.normpath(os.path.join(cwd, deps)),
+        "cwd": cwd,
+    }
+    fd, _ = tempfile.mkstemp(suffix='.json', dir=records_dir)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(record, f)
+
+def new_deps_path(records_dir, source):
+    """Fichier -MF où le compilateur écrit les dépendances d'une source."""
+    fd, path = tempfile.mkstemp(prefix=os.path.splitext(os.path.basename(source))[0] + '-', suffix='.d',
+                                dir=records_dir)
+    os.close(fd)
+    return path
+
+def compile_recorded(compiler, argv, source_index, output_index, records_dir):
+    """Compile une source (-c) en ajoutant -MMD si la commande ne produit pas déjà ses dépendances."""
+    source = argv[source_index]
+    output = argv[output_index] if output_index is not None else os.path.splitext(os.path.basename(source))[0] + '.o'
+    extra = []
+    if '-MD' not in argv and '-MMD' not in argv:
+        deps = new_deps_path(records_dir, source)
+        extra = ['-MMD', '-MF', deps]
+    elif '-MF' in argv and argv.index('-MF') + 1 < len(argv):
+        deps = argv[argv.index('-MF') + 1]
+    else:
+        deps = os.path.splitext(output)[0] + '.d'
+    ret = subprocess.call([compiler] + argv + extra)
+    if ret == 0:
+        write_dependency_record(records_dir, source, output, deps)
+    return ret
+
+def compile_and_link(compiler, argv, source_indexes, output_index, records_dir):
+    """Découpe une commande qui compile et lie des sources: une compilation par source, puis l'édition de liens.
+
+    Les objets sont nommés comme les fichiers auxiliaires de gcc (<sortie>-<source>.o, à côté
+    de la sortie): les fichiers de couverture (.gcno, .gcda) restent là où gcov les attend.
+    """
+    output = argv[output_index] if output_index is not None else 'a.out'
+    prefix = os.path.join(os.path.dirname(output), os.path.basename(output) + '-')
+
+    # Options de compilation: tout sauf les sources, la sortie, les entrées et options de l'édition de liens
+    compile_args = []
+    skip = set(source_indexes)
+    index = 0
+    while index < len(argv):
+        arg = argv[index]
+        if index in skip:
+            index += 1
+        elif arg in ('-o', '-l', '-L', '-Xlinker', '-T', '-u', '-MF', '-MT', '-MQ'):
+            index += 2
+        elif arg.startswith(('-l', '-L', '-Wl,')) or arg in ('-static', '-rdynamic', '-pie', '-no-pie', '-MD', '-MMD',
+                                                              '-MP') \
+                or (not arg.startswith('-') and arg.endswith(('.o', '.a', '.so'))):
+            index += 1
         else:
-            # En mode non-verbose, capturer les logs pour les afficher uniquement en cas d'erreur
-            process = subprocess.Popen(
-                cmd,
-                cwd=workdir,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                universal_newlines=True
-            )
-            stdout, stderr = process.communicate()
-            ret = process.returncode
-
-            if ret != 0:
-                logger.error("Échec du nettoyage")
-                logger.error(f"STDOUT: {stdout}")
-                logger.error(f"STDERR: {stderr}")
-
-        return ret
+            compile_args.append(arg)
+            index += 1
+
+    link_argv = list(argv)
+    used = set()
+    for source_index in source_indexes:
+        source = argv[source_index]
+        base = os.path.splitext(os.path.basename(source))[0]
+        obj = f"{prefix}{base}.o"
+        suffix = 1
+        while obj in used:
+            suffix += 1
+            obj = f"{prefix}{base}-{suffix}.o"
+        used.add(obj)
+        deps = new_deps_path(records_dir, source)
+        ret = subprocess.call([compiler] + compile_args + ['-c', source, '-o', obj, '-MMD', '-MF', deps])
+        if ret != 0:
+            return ret
+        write_dependency_record(records_dir, source, obj, deps)
+        link_argv[source_index] = obj
+    return subprocess.call([compiler] + link_argv)
+
+def wrap_compiler(name, argv):
+    """Compilateur enveloppé (--record-deps): enregistre les dépendances de chaque source compilée.
+
+    Une commande qui compile et lie plusieurs sources est découpée en une compilation
+    par source puis une édition de liens, pour disposer d'un objet par source (nm).
+    """
+    compiler = find_real_compiler(name)
+    if compiler is None:
+        print(f"ci_test: compilateur {name} introuvable", file=sys.stderr)
+        return 127
+    records_dir = os.environ.get(DEPS_DIR_ENV)
+    source_indexes, output_index = split_compiler_args(argv)
+    if not records_dir or not os.path.isdir(records_dir) or not source_indexes \
+            or any(arg in WRAPPER_PASSTHROUGH or arg.startswith(('@', '-save-temps')) for arg in argv):
+        os.execv(compiler, [compiler] + argv)
+    try:
+        if '-c' in argv:
+            if len(source_indexes) != 1:
+                os.execv(compiler, [compiler] + argv)
+            return compile_recorded(compiler, argv, source_indexes[0], output_index, records_dir)
+        return compile_and_link(compiler, argv, source_indexes, output_index, records_dir)
+    except OSError as e:
+        print(f"ci_test: {name}: {e}", file=sys.stderr)
+        return 1
+
+def setup_deps_recording(logger):
+    """Enveloppe les compilateurs du Makefile pour enregistrer les dépendances. Retourne le répertoire des
+    enregistrements, ou None."""
+    wrapper_dir = DEPS_WRAPPER_DIR.format(pid=os.getpid())
+    records_dir = DEPS_RECORDS_DIR.format(pid=os.getpid())
+    try:
+        for directory in (wrapper_dir, records_dir):
+            shutil.rmtree(directory, ignore_errors=True)
+            os.makedirs(directory)
+        entrypoint = os.path.abspath(__file__)
+        for compiler in WRAPPED_COMPILERS:
+            path = os.path.join(wrapper_dir, compiler)
+            with open(path, 'w') as f:
+                f.write(f"#!/bin/sh\nexec {shlex.quote(sys.executable)} {shlex.quote(entrypoint)} "
+                        f"{WRAP_COMPILER_FLAG} {compiler} \"$@\"\n")
+            os.chmod(path, 0o755)
+        os.environ[DEPS_DIR_ENV] = records_dir
+        # Avec ccache, le compilateur enveloppé appelle le lien ccache, qui cherche à son tour le
+        # compilateur dans le PATH: sans le répertoire des enveloppes, il ne se rappelle pas lui-même
+        os.environ.setdefault('CCACHE_PATH', os.environ.get('PATH', ''))
+        os.environ['PATH'] = wrapper_dir + os.pathsep + os.environ.get('PATH', '')
+        logger.info("Enregistrement des dépendances des tests activé")
+        return records_dir
+    except OSError as e:
+        logger.warning(f"Impossible d'enregistrer les dépendances des tests: {e}")
+        return None
+
+def parse_test_names(text):
+    """Noms ("suite/nom") des tests Criterion déclarés dans un fichier source."""
+    names = []
+    for match in TEST_MACRO_PATTERN.finditer(text):
+        # Arguments de premier niveau de la macro
+        args = []
+        depth = 0
+        current = ''
+        for char in text[match.end():match.end() + 2000]:
+            if char in '([{':
+                depth += 1
+            elif char in ')]}':
+                if depth == 0:
+                    args.append(current.strip())
+                    break
+                depth -= 1
+            elif char == ',' and depth == 0:
+                args.append(current.strip())
+                current = ''
+                continue
+            current += char
+        first = 0 if match.group(1) == 'Test' else 1
+        if len(args) > first + 1 and re.match(r'^\w+$', args[first]) and re.match(r'^\w+$', args[first + 1]):
+            names.append(f"{args[first]}/{args[first + 1]}")
+    return names
+
+def read_source(path):
+    try:
+        with open(path, errors='replace') as f:
+            return f.read()
+    except OSError:
+        return ''
+
+def select_tests(workdir, files, logger):
+    """Tests déclarés dans les fichiers de tests sélectionnés par l'analyse d'impact, ou None pour tous.
+
+    Un fichier sélectionné sans test reconnaissable entraîne l'exécution de tous les tests.
+    """
+    selection = []
+    for path in files:
+        names = parse_test_names(read_source(os.path.join(workdir, path)))
+        if not names:
+            logger.warning(f"Aucun test reconnu dans {path}, exécution de tous les tests")
+            return None
+        selection.extend(names)
+    return selection
+
+def read_dependencies(path, cwd):
+    """Prérequis de la première règle d'un fichier de dépendances (-MMD), en chemins absolus."""
+    try:
+        with open(path, errors='replace') as f:
+            content = f.read().replace('\\\n', ' ').replace('\\ ', '\0')
+    except OSError:
+        return None
+    rule = content.split('\n', 1)[0]
+    if ':' not in rule:
+        return []
+    prerequisites = rule.split(':', 1)[1].split()
+    return [os.path.normpath(os.path.join(cwd, prerequisite.replace('\0', ' '))) for prerequisite in prerequisites]
+
+def read_symbols(path):
+    """Symboles globaux définis et non définis d'un objet (nm). Retourne (définis, non définis) ou None."""
+    try:
+        result = subprocess.run(['nm', '-P', path], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    except OSError:
+        return None
+    if result.returncode != 0:
+        return None
+    defined = set()
+    undefined = set()
+    for line in result.stdout.decode(errors='replace').splitlines():
+        fields = line.split()
+        if len(fields) < 2:
+            continue
+        if fields[1] in ('U', 'w', 'v'):
+            undefined.add(fields[0])
+        elif fields[1].isupper():
+            defined.add(fields[0])
+    return defined, undefined
+
+def collect_test_dependencies(records_dir, workdir, logger):
+    """Fermeture des dépendances de chaque fichier de tests, d'après les compilations enregistrées.
+
+    Les objets qui définissent les symboles utilisés par un objet de tests (nm) sont ajoutés
+    de proche en proche; la fermeture regroupe leurs sources et les headers qu'elles incluent.
+    Retourne {fichier de tests: [fichiers]} (chemins relatifs à workdir), ou None si incomplète.
+    """
+    workdir = os.path.realpath(workdir)
+    records = {}
+    for name in sorted(os.listdir(records_dir)):
+        if name.endswith('.json'):
+            with open(os.path.join(records_dir, name)) as f:
+                record = json.load(f)
+            records[record['object']] = record
+
+    # Un objet supprimé depuis (fclean) n'est ignoré que si sa source a été recompilée ailleurs
+    existing = {obj: record for obj, record in records.items() if os.path.exists(obj)}
+    compiled_sources = set(record['source'] for record in existing.values())
+    missing = [record['source'] for obj, record in records.items()
+               if obj not in existing and record['source'] not in compiled_sources]
+    if missing:
+        logger.warning(f"Objets introuvables pour {len(missing)} source(s), dépendances des tests non enregistrées")
+        return None
+
+    objects = list(existing)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=get_available_cpus()) as executor:
+        symbols = dict(zip(objects, executor.map(read_symbols, objects)))
+    if any(value is None for value in symbols.values()):
+        logger.warning("nm a échoué, dépendances des tests non enregistrées")
+        return None
+    definitions = collections.defaultdict(set)
+    for obj, (defined, _) in symbols.items():
+        for symbol in defined:
+            definitions[symbol].add(obj)
+
+    def relative(path):
+        path = os.path.relpath(os.path.realpath(path), workdir)
+        return None if path.startswith('..') else path
+
+    closures = {}
+    for obj, record in existing.items():
+        test_file = relative(record['source'])
+        if test_file is None or not parse_test_names(read_source(record['source'])):
+            continue
+        reached = {obj}
+        pending = [obj]
+        while pending:
+            for symbol in symbols[pending.pop()][1]:
+                for definition in definitions.get(symbol, ()):
+                    if definition not in reached:
+                        reached.add(definition)
+                        pending.append(definition)
+        files = set(closures.get(test_file, []))
+        for reached_obj in reached:
+            dependencies = read_dependencies(existing[reached_obj]['deps'], existing[reached_obj]['cwd'])
+            if dependencies is None:
+                logger.warning(f"Dépendances de {existing[reached_obj]['source']} introuvables")
+                return None
+            for path in [existing[reached_obj]['source']] + dependencies:
+                path = relative(path)
+                if path is not None:
+                    files.add(path)
+        closures[test_file] = sorted(files)
+    if not closures:
+        logger.warning("Aucun fichier de tests compilé, dépendances des tests non enregistrées")
+        return None
+    logger.info(f"Dépendances de {len(closures)} fichier(s) de tests enregistrées")
+    return closures
+
+def emit_test_dependencies(records_dir, workdir, logger):
+    """Transmet à ci_test les dépendances des fichiers de tests (marqueur test-deps, "-" si indisponibles)."""
+    with trace_span('tests:deps'):
+        try:
+            closures = collect_test_dependencies(records_dir, workdir, logger)
+        except Exception as e:
+            logger.warning(f"Analyse des dépendances des tests impossible: {e}")
+            closures = None
+    if closures is None:
+        emit_marker('test-deps', '-')
+        return
+    emit_marker('test-deps', base64.b64encode(zlib.compress(json.dumps(closures).encode())).decode())
+
+def run_clean(workdir, verbose, logger, tail_bytes=DEFAULT_TAIL_BYTES):
+    """Exécute la commande make fclean dans le répertoire de travail."""
+    logger.info("Nettoyage du projet (make fclean)")
+    try:
+        # Sans -j: les cibles de nettoyage ne sont pas sûres en parallèle (fclean: clean libclean...)
+        return run_make(['make', 'fclean'], workdir, verbose, logger, "Échec du nettoyage", tail_bytes)
     except Exception as e:
         logger.error(f"Erreur lors du nettoyage: {e}")
         return 1
 
-def main():
-    """Fonction principale du script."""
-    args = parse_arguments()
-    logger = setup_logging(args.verbose)
+def setup_ccache(cache_dir, max_size, logger):
+    """Configure ccache pour envelopper les compilateurs appelés par le Makefile."""
+    logger.info(f"Activation de ccache ({cache_dir}, taille maximale {max_size})")
+    ccache_path = shutil.which('ccache')
+    if ccache_path is None:
+        logger.warning("ccache introuvable dans l'image, compilation sans cache")
+        return False
 
-    logger.info("Démarrage du processus CI")
-    # Extraction du tarball
-    if not extract_tarball('/mnt/project.tar', args.workdir, logger):
-        return 1
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        os.environ['CCACHE_DIR'] = cache_dir
 
-    if args.type == 'build':
-        # Exécution de la compilation
-        build_result, binary_names = run_build(args.workdir, args.verbose, logger)
+        # Les liens gcc/g++/cc/c++ -> ccache placés en tête du PATH interceptent
+        # aussi les Makefiles qui appellent le compilateur directement
+        wrapper_dir = '/usr/lib/ccache'
+        if not os.path.isdir(wrapper_dir):
+            wrapper_dir = '/tmp/ccache-bin'
+            os.makedirs(wrapper_dir, exist_ok=True)
+            for compiler in ('gcc', 'g++', 'cc', 'c++'):
+                link = os.path.join(wrapper_dir, compiler)
+                if not os.path.exists(link):
+                    os.symlink(ccache_path, link)
+        os.environ['PATH'] = wrapper_dir + os.pathsep + os.environ.get('PATH', '')
 
-        if build_result != 0:
-            logger.error("La compilation a échoué")
-            return build_result
+        subprocess.run(['ccache', '--max-size', max_size],
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+        return True
+    except Exception as e:
+        logger.warning(f"Impossible d'activer ccache: {e}")
+        return False
 
-        if len(binary_names) == 1:
-            logger.info(f"Compilation réussie, binaire '{binary_names[0]}' créé")
-        else:
-            logger.info(f"Compilation réussie, binaires '{', '.join(binary_names)}' créés")
+def get_ccache_stats():
+    """Lit les compteurs ccache. Retourne (hits, misses) ou None."""
+    try:
+        result = subprocess.run(
+            ['ccache', '--print-stats'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=False,
+            universal_newlines=True
+        )
+        if result.returncode != 0:
+            return None
+        counters = {}
+        for line in result.stdout.splitlines():
+            parts = line.split('\t')
+            if len(parts) == 2 and parts[1].strip().isdigit():
+                counters[parts[0]] = int(parts[1])
+        hits = counters.get('direct_cache_hit', 0) + counters.get('preprocessed_cache_hit', 0)
+        return hits, counters.get('cache_miss', 0)
+    except Exception:
+        return None
+
+def get_tree_state_path(workdir):
+    """Fichier (hors de l'espace de travail) mémorisant l'arbre synchronisé."""
+    return os.path.normpath(workdir) + '.tree'
+
+def get_file_signature(path):
+    """Taille et date de modification (ns) d'un fichier, sans suivre les liens symboliques."""
+    stat = os.lstat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+def list_workspace_files(workdir):
+    """Liste les fichiers (chemin relatif -> signature) et répertoires présents (chemins relatifs)."""
+    files = {}
+    directories = set()
+    for dirpath, dirnames, filenames in os.walk(workdir):
+        relative_dir = os.path.relpath(dirpath, workdir)
+        for name in dirnames:
+            path = os.path.normpath(os.path.join(relative_dir, name))
+            if os.path.islink(os.path.join(dirpath, name)):
+                files[path] = get_file_signature(os.path.join(dirpath, name))
+            else:
+                directories.add(path)
+        for name in filenames:
+            files[os.path.normpath(os.path.join(relative_dir, name))] = get_file_signature(os.path.join(dirpath, name))
+    return files, directories
+
+def restore_workspace(workdir, snapshot, logger):
+    """Supprime tout ce que le job a ajouté depuis la synchronisation (objets, binaires, couverture...).
+
+    Retourne False si un fichier synchronisé a été modifié ou supprimé par le job (fichier suivi
+    réécrit par le build, supprimé par fclean...): l'espace de travail ne correspond plus à
+    l'arbre synchronisé et le prochain job devra le resynchroniser entièrement.
+    """
+    files, directories = snapshot
+    remaining = set(files)
+    changed = []
+    try:
+        for dirpath, dirnames, filenames in os.walk(workdir, topdown=False):
+            relative_dir = os.path.relpath(dirpath, workdir)
+            for name in filenames + [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))]:
+                path = os.path.normpath(os.path.join(relative_dir, name))
+                if path not in files:
+                    os.remove(os.path.join(dirpath, name))
+                    continue
+                remaining.discard(path)
+                if get_file_signature(os.path.join(dirpath, name)) != files[path]:
+                    changed.append(path)
+            for name in dirnames:
+                path = os.path.join(dirpath, name)
+                if not os.path.islink(path) and os.path.normpath(os.path.join(relative_dir, name)) not in directories:
+                    shutil.rmtree(path)
+        changed.extend(sorted(remaining))
+        if changed:
+            logger.warning(f"{len(changed)} fichier(s) synchronisé(s) modifié(s) ou supprimé(s) par le job "
+                           f"({', '.join(changed[:5])}{'...' if len(changed) > 5 else ''}): "
+                           "resynchronisation complète au prochain job")
+            return False
+        return True
+    except Exception as e:
+        logger.error(f"Erreur lors de la restauration de l'espace de travail: {e}")
+        return False
+
+def sync_workspace(args, logger):
+    """Synchronise l'espace de travail persistant. Retourne (code de retour, instantané des fichiers)."""
+    state_path = get_tree_state_path(args.workdir)
+    synced_tree = None
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            synced_tree = f.read().strip() or None
+        # Invalider l'état pendant le job: un conteneur interrompu forcera une resynchronisation complète
+        os.remove(state_path)
+
+    if args.sync == 'delta':
+        if synced_tree is None or synced_tree != args.base_tree:
+            logger.warning(f"Espace de travail sur {synced_tree or 'aucun arbre'}, {args.base_tree} attendu")
+            emit_marker('sync-mismatch', synced_tree or 'none')
+            return SYNC_MISMATCH_EXIT, None
+        logger.info(f"Synchronisation delta {args.base_tree[:12]} -> {args.target_tree[:12]}")
+    elif not reset_workdir(args.workdir, logger):
+        return 1, None
+
+    os.makedirs(args.workdir, exist_ok=True)
+    if not extract_tarball(args.archive, args.workdir, logger, args.compression):
+        return 1, None
+    return 0, list_workspace_files(args.workdir)
+
+def run_job(args, logger):
+    """Exécute les étapes demandées sur l'arbre extrait."""
+    jobs = args.jobs if args.jobs > 0 else get_available_cpus()
+    tail_bytes = max(1, args.log_tail_kb) * 1024
+    shards = jobs if args.test_shards == 'auto' else int(args.test_shards)
+    logger.info(f"Compilation avec {jobs} job(s) en parallèle")
 
-    elif args.type == 'tests':
-        # Exécution des tests
-        tests_result = run_tests(args.workdir, args.verbose, logger)
-        if tests_result != 0:
-            logger.error("Les tests ont échoué")
-            return tests_result
+    ccache_before = None
+    if args.ccache:
+        with trace_span('ccache:setup'):
+            if setup_ccache(args.ccache_dir, args.ccache_max_size, logger):
+                ccache_before = get_ccache_stats()
+
+    # Les compilateurs sont enveloppés après ccache, qu'ils appellent à leur tour
+    records_dir = setup_deps_recording(logger) if args.record_deps else None
+
+    try:
+        if args.type in ('build', 'all'):
+            # Exécution de la compilation
+            emit_marker('stage-begin', 'build')
+            with trace_span('stage:build'):
+                build_result, binary_names = 0, None
+                if args.syntax_check:
+                    # Pré-vérification des fichiers modifiés: une erreur est signalée sans make re
+                    with trace_span('syntax'):
+                        build_result = run_syntax_check(args.workdir,
+                                                        decode_file_list(args.syntax_check, logger) or [],
+                                                        logger, jobs, tail_bytes)
+                if build_result == 0:
+                    build_result, binary_names = run_build(args.workdir, args.verbose, logger, jobs, tail_bytes)
+            emit_marker('stage-end', 'build', 'ok' if build_result == 0 else 'failed')
+
+            if build_result != 0:
+                logger.error("La compilation a échoué")
+                return build_result
+
+            if len(binary_names) == 1:
+                logger.info(f"Compilation réussie, binaire '{binary_names[0]}' créé")
+            else:
+                logger.info(f"Compilation réussie, binaires '{', '.join(binary_names)}' créés")
 
-        logger.info("Tous les tests ont réussi")
+        if args.type in ('tests', 'all'):
+            # Exécution des tests, sur l'arbre déjà compilé en mode all
+            emit_marker('stage-begin', 'tests')
+            with trace_span('stage:tests'):
+                selection = None
+                if args.test_impact is not None:
+                    files = decode_file_list(args.test_impact, logger)
+                    selection = select_tests(args.workdir, files, logger) if files is not None else None
+                tests_result = run_tests(args.workdir, args.verbose, logger, jobs, tail_bytes, shards,
+                                         decode_durations(args.test_durations, logger), selection)
+            emit_marker('stage-end', 'tests', 'ok' if tests_result == 0 else 'failed')
+            if tests_result != 0:
+                logger.error("Les tests ont échoué")
+                return tests_result
+            if records_dir is not None and selection != []:
+                emit_test_dependencies(records_dir, args.workdir, logger)
+
+            logger.info("Tous les tests ont réussi")
+    finally:
+        # Statistiques du cache sur ce job uniquement (le volume est partagé entre jobs)
+        ccache_after = get_ccache_stats() if ccache_before is not None else None
+        if ccache_after is not None:
+            hits = ccache_after[0] - ccache_before[0]
+            misses = ccache_after[1] - ccache_before[1]
+            logger.info(f"ccache: {hits} hit(s), {misses} miss(es)")
+            emit_marker('ccache', hits, misses)
+        if records_dir is not None:
+            shutil.rmtree(records_dir, ignore_errors=True)
+            shutil.rmtree(DEPS_WRAPPER_DIR.format(pid=os.getpid()), ignore_errors=True)
+
+    if args.skip_clean:
+        # Le répertoire de travail est supprimé avec le conteneur, vidé avant le job suivant,
+        # ou restauré dans l'état synchronisé (espace de travail persistant)
+        logger.info("Nettoyage ignoré (répertoire de travail jetable ou restauré)")
+        return 0
 
     # Exécution du nettoyage
-    clean_result = run_clean(args.workdir, args.verbose, logger)
+    clean_result = run_clean(args.workdir, args.verbose, logger, tail_bytes)
 
     if clean_result != 0:
         logger.warning("Le nettoyage a échoué, mais la compilation a réussi")
@@ -235,5 +1397,40 @@ def main():
 
     return 0
 
+def main():
+    """Fonction principale du script."""
+    global TRACE_SPANS
+    if len(sys.argv) > 2 and sys.argv[1] == WRAP_COMPILER_FLAG:
+        return wrap_compiler(sys.argv[2], sys.argv[3:])
+    args = parse_arguments()
+    logger = setup_logging(args.verbose)
+    TRACE_SPANS = args.trace
+
+    logger.info("Démarrage du processus CI")
+    if args.sync == 'none':
+        with trace_span('extract'):
+            if args.reset and not reset_workdir(args.workdir, logger):
+                return 1
+
+            # Extraction du tarball
+            if not extract_tarball(args.archive, args.workdir, logger, args.compression):
+                return 1
+        return run_job(args, logger)
+
+    # Espace de travail persistant: seuls les fichiers modifiés sont transmis
+    with trace_span('sync'):
+        sync_result, snapshot = sync_workspace(args, logger)
+    if sync_result != 0:
+        return sync_result
+    try:
+        return run_job(args, logger)
+    finally:
+        with trace_span('restore'):
+            restored = restore_workspace(args.workdir, snapshot, logger)
+        if restored:
+            with open(get_tree_state_path(args.workdir), 'w') as f:
+                f.write(args.target_tree)
+            emit_marker('sync-done', args.target_tree)
+
 if __name__ == "__main__":
     sys.exit(main())
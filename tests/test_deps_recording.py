@@ -0,0 +1,84 @@
+"""
+Enregistrement des dépendances des tests (--record-deps) combiné à ccache
+"""
+
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import entrypoint  # noqa: E402
+
+# Substitut de ccache lorsqu'il n'est pas installé: comme ccache, il cherche le compilateur
+# dans CCACHE_PATH (sinon PATH) en ignorant les liens vers lui-même
+FAKE_CCACHE = """#!/bin/sh
+self=$(readlink -f "$0")
+name=$(basename "$0")
+if [ "$name" = ccache ]; then
+    case "$1" in -*) exit 0;; esac
+    name=$1; shift
+fi
+IFS=:
+for directory in ${CCACHE_PATH:-$PATH}; do
+    candidate="$directory/$name"
+    [ -x "$candidate" ] || continue
+    [ "$(readlink -f "$candidate")" = "$self" ] && continue
+    exec "$candidate" "$@"
+done
+echo "ccache: $name introuvable" >&2
+exit 127
+"""
+
+@unittest.skipIf(shutil.which('gcc') is None or shutil.which('make') is None, "gcc et make requis")
+class DepsRecordingWithCcacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp(prefix='ci_test_deps_test-')
+        self.workdir = os.path.join(self.tmp, 'project')
+        os.makedirs(os.path.join(self.workdir, 'src'))
+        with open(os.path.join(self.workdir, 'src', 'add.h'), 'w') as f:
+            f.write("int add(int a, int b);\n")
+        with open(os.path.join(self.workdir, 'src', 'add.c'), 'w') as f:
+            f.write('#include "add.h"\nint add(int a, int b) { return a + b; }\n')
+        with open(os.path.join(self.workdir, 'Makefile'), 'w') as f:
+            f.write("all: src/add.o\nsrc/add.o: src/add.c\n\tgcc -c -o src/add.o src/add.c\n")
+        self.logger = logging.getLogger('test')
+        self.wrapper_dir = entrypoint.DEPS_WRAPPER_DIR.format(pid=os.getpid())
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+        shutil.rmtree(self.wrapper_dir, ignore_errors=True)
+        shutil.rmtree(entrypoint.DEPS_RECORDS_DIR.format(pid=os.getpid()), ignore_errors=True)
+
+    def test_ccache_and_record_deps(self):
+        """ccache=true et test_impact=true: la compilation aboutit et les dépendances sont enregistrées."""
+        environment = {key: value for key, value in os.environ.items() if not key.startswith('CCACHE_')}
+        with mock.patch.dict(os.environ, environment, clear=True):
+            if shutil.which('ccache') is None:
+                fake_bin = os.path.join(self.tmp, 'bin')
+                os.makedirs(fake_bin)
+                with open(os.path.join(fake_bin, 'ccache'), 'w') as f:
+                    f.write(FAKE_CCACHE)
+                os.chmod(os.path.join(fake_bin, 'ccache'), 0o755)
+                os.environ['PATH'] = fake_bin + os.pathsep + os.environ['PATH']
+                # Liens créés par setup_ccache vers le substitut (hors image, /usr/lib/ccache n'existe pas)
+                shutil.rmtree('/tmp/ccache-bin', ignore_errors=True)
+                self.addCleanup(shutil.rmtree, '/tmp/ccache-bin', True)
+            self.assertTrue(entrypoint.setup_ccache(os.path.join(self.tmp, 'cache'), '1G', self.logger))
+            records_dir = entrypoint.setup_deps_recording(self.logger)
+            self.assertIsNotNone(records_dir)
+
+            result = subprocess.run(['make'], cwd=self.workdir, stdout=subprocess.PIPE,
+                                    stderr=subprocess.STDOUT, timeout=30)
+            self.assertEqual(result.returncode, 0, result.stdout.decode(errors='replace'))
+            self.assertTrue(os.path.exists(os.path.join(self.workdir, 'src', 'add.o')))
+            records = [name for name in os.listdir(records_dir) if name.endswith('.json')]
+            self.assertEqual(len(records), 1)
+
+if __name__ == '__main__':
+    unittest.main()